@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from question_processor import QuestionProcessor, ProcessedQuestion, init_worker, classify_in_worker
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncClassifier:
+    """
+    Классификация вопросов без блокировки цикла событий: длинные тексты уходят в пул процессов
+
+    Процессы пула получают снимок словарей основного процесса. Когда словари перезагружены,
+    следующий длинный текст уходит уже в новый пул с новым снимком, а старый пул
+    дорабатывает принятые задачи и закрывается - версия словарей везде одна.
+    """
+
+    def __init__(self, processor: QuestionProcessor, inline_max_chars: int = 2000,
+                 workers: int = 2, lag_interval: float = 0.5):
+        """
+        :param processor: Обработчик вопросов (используется для коротких текстов прямо в цикле)
+        :param inline_max_chars: Тексты не длиннее этого обрабатываются в цикле событий
+        :param workers: Число процессов пула (0 - всё обрабатывается в цикле событий)
+        :param lag_interval: Период проверки задержки цикла событий, с
+        """
+        self.processor = processor
+        self.inline_max_chars = inline_max_chars
+        self.workers = workers
+        self.lag_interval = lag_interval
+
+        self._executor = None
+        self._executor_fingerprint = None  # Версия словарей, с которой собраны процессы пула
+        self._lag_task = None
+
+        # Метрики
+        self.pool_restarts = 0
+        self.inline_calls = 0
+        self.offloaded_calls = 0
+        self.queue_depth = 0
+        self.queue_depth_max = 0
+        self.inline_blocked_seconds = 0.0
+        self.inline_blocked_max = 0.0
+        self.loop_lag_last = 0.0
+        self.loop_lag_max = 0.0
+
+    async def start(self):
+        """Запускает пул процессов (сразу прогретый) и мониторинг задержки цикла"""
+        if self.workers > 0 and self._executor is None:
+            self._start_pool()
+            # Прогрев: каждый процесс компилирует словари до первого настоящего вопроса
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(
+                loop.run_in_executor(self._executor, classify_in_worker, "")
+                for _ in range(self.workers)
+            ))
+            logger.info(f"Пул классификатора запущен: {self.workers} процесс(ов)")
+
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+
+    def _start_pool(self):
+        """Создает пул процессов со снимком словарей основного процесса"""
+        initargs = self.processor.worker_initargs()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=init_worker,
+            initargs=initargs
+        )
+        self._executor_fingerprint = initargs[2][1]
+
+    def _restart_pool(self):
+        """Словари перезагружены: новые задачи - в новый пул, старый дорабатывает принятые"""
+        self._executor.shutdown(wait=False)
+        self._start_pool()
+        self.pool_restarts += 1
+        logger.info(f"Пул классификатора пересоздан для версии словарей {self.processor.vocabulary_version}")
+
+    async def close(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def process(self, question: str) -> ProcessedQuestion:
+        """Обрабатывает вопрос: короткий - в цикле событий, длинный - в пуле процессов"""
+        if self._executor is None or len(question) <= self.inline_max_chars:
+            started = time.perf_counter()
+            result = self.processor.process(question)
+            elapsed = time.perf_counter() - started
+
+            self.inline_calls += 1
+            self.inline_blocked_seconds += elapsed
+            self.inline_blocked_max = max(self.inline_blocked_max, elapsed)
+            return result
+
+        self.offloaded_calls += 1
+        self.queue_depth += 1
+        self.queue_depth_max = max(self.queue_depth_max, self.queue_depth)
+        try:
+            if self._executor_fingerprint != self.processor.fingerprint:
+                self._restart_pool()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, classify_in_worker, question)
+        finally:
+            self.queue_depth -= 1
+
+        logger.info(f"Длинный вопрос ({len(question)} символов) обработан в пуле: медицинский={result.is_medical}")
+        return result
+
+    async def _monitor_loop_lag(self):
+        """Измеряет, насколько позже запланированного просыпается цикл событий"""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, loop.time() - expected)
+            self.loop_lag_last = lag
+            self.loop_lag_max = max(self.loop_lag_max, lag)
+
+    def stats(self) -> dict:
+        return {
+            "pool_restarts": self.pool_restarts,
+            "inline_calls": self.inline_calls,
+            "offloaded_calls": self.offloaded_calls,
+            "queue_depth": self.queue_depth,
+            "queue_depth_max": self.queue_depth_max,
+            "inline_blocked_seconds_total": round(self.inline_blocked_seconds, 6),
+            "inline_blocked_seconds_max": round(self.inline_blocked_max, 6),
+            "loop_lag_seconds_last": round(self.loop_lag_last, 6),
+            "loop_lag_seconds_max": round(self.loop_lag_max, 6),
+        }
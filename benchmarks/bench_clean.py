@@ -0,0 +1,98 @@
+"""Бенчмарк очистки вопроса: деревья фраз против прежних вложенных циклов"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_processor import QuestionProcessor
+
+
+SHORT_QUESTIONS = [
+    "Добрый день, Татьяна Николаевна! Болит голова третий день, что делать?",
+    "Здравствуйте! Как принимать VMG+?",
+    "Уважаемый доктор, подскажите, можно ли ЭМ детям?",
+]
+
+FORWARDED_PART = (
+    "Здравствуйте, Татьяна Николаевна! Пересылаю переписку с врачом. "
+    "Доктор написал, что анализ крови в норме, но специалист по УЗИ советует "
+    "повторить обследование через месяц. Администратор клиники просила уточнить "
+    "у эксперта, можно ли до этого принимать витамин D и омега-3 вместе с завтраком. "
+)
+
+# Длинные пересланные сообщения - частый случай в реальной переписке
+LONG_QUESTIONS = [FORWARDED_PART * 10, FORWARDED_PART * 50]
+
+
+def legacy_clean(processor: QuestionProcessor, question: str) -> str:
+    """Прежняя логика: каждое слово сравнивается с каждым приветствием и обращением"""
+    words = question.split()
+    cleaned_words = []
+    skip_greetings = True
+
+    for word in words:
+        word_lower = word.lower().strip(' ,:;.!?')
+
+        if skip_greetings:
+            is_greeting = False
+            for greeting in processor.snapshot.greetings:
+                if (greeting == word_lower or
+                        word_lower.startswith(greeting + ",") or
+                        word_lower.startswith(greeting + "!") or
+                        word_lower.startswith(greeting + ".")):
+                    is_greeting = True
+                    break
+
+            if is_greeting:
+                continue
+            else:
+                skip_greetings = False
+
+        is_address = False
+        for address in processor.snapshot.addresses:
+            if address == word_lower:
+                is_address = True
+                break
+
+        if is_address and len(word_lower) <= 15:
+            continue
+
+        cleaned_words.append(word)
+
+    cleaned = ' '.join(cleaned_words)
+    if not cleaned.strip():
+        return question
+
+    cleaned = re.sub(r'^[,\:\-\!\?\s]+', '', cleaned)
+    cleaned = re.sub(r'[,\:\-\!\?\s]+$', '', cleaned)
+    if cleaned:
+        cleaned = cleaned[0].upper() + cleaned[1:]
+    return cleaned
+
+
+def run(label: str, questions: list, number: int):
+    processor = QuestionProcessor()
+
+    legacy = timeit.timeit(lambda: [legacy_clean(processor, q) for q in questions], number=number)
+    trie = timeit.timeit(lambda: [processor.clean_question(q) for q in questions], number=number)
+
+    calls = number * len(questions)
+    print(f"{label}:")
+    print(f"  Вложенные циклы: {legacy / calls * 1e6:9.1f} мкс/сообщение")
+    print(f"  Деревья фраз:    {trie / calls * 1e6:9.1f} мкс/сообщение")
+    print(f"  Ускорение:       {legacy / trie:9.1f}x")
+
+
+def main():
+    print("=" * 50)
+    print("Бенчмарк очистки вопросов QuestionProcessor")
+    print("=" * 50)
+    run("Короткие вопросы", SHORT_QUESTIONS, number=5000)
+    for question in LONG_QUESTIONS:
+        run(f"Пересланное сообщение ({len(question.split())} слов)", [question], number=200)
+
+
+if __name__ == "__main__":
+    main()
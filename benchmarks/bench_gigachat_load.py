@@ -0,0 +1,102 @@
+"""
+Нагрузочный прогон GigaChatScheduler против заглушки GigaChat (без расхода квоты)
+
+Одновременно отправляет серию вопросов через очередь (лимит частоты, параллельность, повторы,
+выключатель, дублирование медленных запросов) в gigachat_stub.py с заданной задержкой и долей
+ошибок; печатает задержки, пропускную способность и метрики очереди и заглушки.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gigachat_client import GigaChatClient, GigaChatError
+from gigachat_scheduler import GigaChatScheduler
+from gigachat_stub import GigaChatStub
+
+
+async def ask(scheduler: GigaChatScheduler, question: str, stream: bool, delay: float = 0.0) -> float:
+    await asyncio.sleep(delay)
+    started = time.perf_counter()
+    if stream:
+        async for _ in scheduler.stream(question):
+            pass
+    else:
+        await scheduler.generate(question)
+    return time.perf_counter() - started
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=100, help="Сколько вопросов отправить")
+    parser.add_argument("--latency", default="lognormal:0.3:0.5", help="Задержка заглушки (см. gigachat_stub.py)")
+    parser.add_argument("--error-429", type=float, default=0.05, help="Доля ответов 429")
+    parser.add_argument("--error-5xx", type=float, default=0.02, help="Доля ответов 5xx")
+    parser.add_argument("--stream-break", type=float, default=0.0, help="Доля оборванных потоков")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Доля зависших запросов")
+    parser.add_argument("--request-timeout", type=float, default=5.0, help="Таймаут запроса клиента, с")
+    parser.add_argument("--hedging", action="store_true", help="Дублировать запросы, не уложившиеся в p95")
+    parser.add_argument("--hedge-min-delay", type=float, default=0.1, help="Минимальная задержка дубля, с")
+    parser.add_argument("--rps", type=float, default=10, help="Лимит запросов в секунду (0 - без лимита)")
+    parser.add_argument("--burst", type=float, default=5, help="Допустимый всплеск запросов")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="Одновременных запросов к API")
+    parser.add_argument("--retries", type=int, default=3, help="Повторов при 429/5xx")
+    parser.add_argument("--stream", action="store_true", help="Потоковые ответы")
+    parser.add_argument("--arrival-rate", type=float, default=0,
+                        help="Вопросов в секунду (пуассоновский поток); 0 - все вопросы сразу")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    stub = GigaChatStub(latency=args.latency, error_429=args.error_429, error_5xx=args.error_5xx,
+                        stream_break_rate=args.stream_break, timeout_rate=args.timeout_rate,
+                        hang_seconds=args.request_timeout * 2, retry_after=0.2, stream_chunk_delay=0.005,
+                        seed=args.seed)
+    base_url = await stub.start()
+
+    client = GigaChatClient(auth_key="local", base_url=base_url, request_timeout=args.request_timeout,
+                            stream_read_timeout=args.request_timeout)
+    scheduler = GigaChatScheduler(client, rate=args.rps, burst=args.burst, max_concurrency=args.max_concurrency,
+                                  max_retries=args.retries, base_delay=0.2, max_delay=2.0,
+                                  hedging=args.hedging, hedge_min_delay=args.hedge_min_delay)
+
+    questions = [f"Вопрос номер {i}: что делать при головной боли?" for i in range(args.questions)]
+    arrivals = [0.0] * len(questions)
+    if args.arrival_rate > 0:
+        moment = 0.0
+        for i in range(len(arrivals)):
+            moment += random.expovariate(args.arrival_rate)
+            arrivals[i] = moment
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(ask(scheduler, q, args.stream, delay) for q, delay in zip(questions, arrivals)),
+                                       return_exceptions=True)
+    finally:
+        elapsed = time.perf_counter() - started
+        await client.close()
+        await stub.stop()
+
+    latencies = [r for r in results if isinstance(r, float)]
+    errors = [r for r in results if isinstance(r, GigaChatError)]
+    print(f"Заглушка: {base_url}, задержка {args.latency}, 429: {args.error_429:.0%}, 5xx: {args.error_5xx:.0%}")
+    print(f"  Вопросов: {len(results)}, успешно: {len(latencies)}, ошибок: {len(errors)}, "
+          f"за {elapsed:.2f} с ({len(latencies) / elapsed:.1f} ответов/с)")
+    if latencies:
+        print(f"  Задержка: p50 {statistics.median(latencies) * 1000:.0f} мс, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f} мс, p99 {percentile(latencies, 0.99) * 1000:.0f} мс")
+    print(f"  Очередь:  {scheduler.stats()}")
+    print(f"  Заглушка: {stub.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Бенчмарк: новая сессия aiohttp на каждый запрос против общей сессии с пулом соединений
+
+Поднимает заглушку GigaChat (gigachat_stub.py) по HTTPS (самоподписанный сертификат создается
+через openssl) и прогоняет через GigaChatClient одинаковую серию запросов.
+"""
+import argparse
+import asyncio
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gigachat_client import GigaChatClient
+from gigachat_stub import GigaChatStub
+
+
+def make_ssl_context(directory: str):
+    """Самоподписанный сертификат для localhost (None - openssl недоступен, работаем по HTTP)"""
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    try:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+            check=True, capture_output=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context
+
+
+async def run_series(base_url: str, requests: int, pooled: bool) -> list:
+    """Последовательные запросы; без пула сессия закрывается после каждого запроса"""
+    client = GigaChatClient(auth_key="local", scope="GIGACHAT_API_PERS", base_url=base_url)
+
+    latencies = []
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            await client.generate_response("Что делать при головной боли?")
+            latencies.append(time.perf_counter() - started)
+            if not pooled:
+                await client.close()
+    finally:
+        await client.close()
+    return latencies
+
+
+def report(name: str, latencies: list, connections: int):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"  {name:<24} p50 {p50:7.2f} мс   p95 {p95:7.2f} мс   соединений: {connections}")
+    return p50
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов в серии")
+    parser.add_argument("--delay", type=float, default=0.0, help="Задержка ответа сервера, с")
+    parser.add_argument("--http", action="store_true", help="Без TLS (только стоимость TCP-соединения)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        ssl_context = None if args.http else make_ssl_context(directory)
+        if not args.http and ssl_context is None:
+            print("openssl недоступен - сравнение без TLS")
+
+        server = GigaChatStub(latency=f"fixed:{args.delay}")
+        base_url = await server.start(ssl_context=ssl_context)
+
+        try:
+            print(f"Сервер: {base_url}, запросов в серии: {args.requests}")
+            results = {}
+            for name, pooled in (("Сессия на запрос", False), ("Общая сессия (пул)", True)):
+                server.connections.clear()
+                latencies = await run_series(base_url, args.requests, pooled)
+                results[name] = report(name, latencies, len(server.connections))
+
+            per_call, pooled = results.values()
+            print(f"  Экономия на запросе:      {per_call - pooled:7.2f} мс (p50), ускорение {per_call / pooled:.1f}x")
+        finally:
+            await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Микробенчмарк: объединенное регулярное выражение триггеров против цикла re.search"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_processor import QuestionProcessor
+
+
+SHORT_QUESTIONS = [
+    "Добрый день! Прокомментируйте, пожалуйста, турецкую схему приема вит Д: одна ампула в месяц",
+    "Какой уровень pH воды безопасен для ежедневного питья?",
+    "Можно ли использовать ЭМ для ребенка 4 лет при насморке?",
+    "Завтра иду на МРТ головы, чем себя защитить?",
+    "Можно ли принимать БАДы при онкологии молочной железы?",
+    "Как лучше подготовиться к поездке на море?",
+]
+
+# Длинное пересланное сообщение - частый случай в реальной переписке
+LONG_QUESTION = " ".join(SHORT_QUESTIONS * 20)
+
+
+def legacy_triggers(processor: QuestionProcessor, question_lower: str):
+    """Прежняя логика: по одному re.search на паттерн, в extract_keywords - дважды"""
+    fired = [p for p in processor.snapshot.trigger_patterns if re.search(p, question_lower)]
+    keywords = []
+    for pattern in processor.snapshot.trigger_patterns:
+        if re.search(pattern, question_lower):
+            match = re.search(pattern, question_lower)
+            if match:
+                keywords.append(match.group())
+    special = [case for case in processor.snapshot.special_cases if re.search(case, question_lower)]
+    return fired, keywords, special
+
+
+def combined_triggers(processor: QuestionProcessor, question_lower: str):
+    """Новая логика: объединенное выражение как отсев, паттерны - только на найденных позициях"""
+    return list(processor.iter_triggers(question_lower))
+
+
+def run(label: str, questions: list, number: int):
+    processor = QuestionProcessor()
+    lowered = [q.lower() for q in questions]
+
+    legacy = timeit.timeit(lambda: [legacy_triggers(processor, q) for q in lowered], number=number)
+    combined = timeit.timeit(lambda: [combined_triggers(processor, q) for q in lowered], number=number)
+
+    calls = number * len(lowered)
+    print(f"{label}:")
+    print(f"  Цикл re.search:        {legacy / calls * 1e6:8.1f} мкс/вопрос")
+    print(f"  Объединенный отсев:    {combined / calls * 1e6:8.1f} мкс/вопрос")
+    print(f"  Ускорение:             {legacy / combined:8.1f}x")
+
+
+def main():
+    print("=" * 50)
+    print("Бенчмарк триггеров QuestionProcessor")
+    print("=" * 50)
+    run("Короткие вопросы", SHORT_QUESTIONS, number=2000)
+    run(f"Длинное сообщение ({len(LONG_QUESTION)} символов)", [LONG_QUESTION], number=200)
+
+
+if __name__ == "__main__":
+    main()
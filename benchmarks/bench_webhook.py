@@ -0,0 +1,135 @@
+"""
+Пропускная способность приема обновлений через вебхук (без Telegram)
+
+Поднимает aiohttp-сервер с обработчиком вебхука и отправляет ему синтетические обновления
+с секретным заголовком; обработчик сообщений диспетчера имитирует работу паузой.
+Режимы: queue - QueuedRequestHandler (очередь и воркеры), task - задача на каждое обновление
+(поведение aiogram по умолчанию), inline - ответ Telegram после обработки обновления.
+Печатает время ответа на запрос, скорость приема и время до обработки всех обновлений.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+from aiogram import Bot, Dispatcher, types
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from webhook import QueuedRequestHandler, new_secret_token
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def make_update(update_id: int) -> dict:
+    user = {"id": 1000 + update_id % 50, "is_bot": False, "first_name": "Тест"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": f"Вопрос номер {update_id}: что делать при головной боли?",
+        },
+    }
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def post(session: aiohttp.ClientSession, url: str, secret: str, update: dict, results: list):
+    started = time.perf_counter()
+    async with session.post(url, json=update, headers={SECRET_HEADER: secret}) as response:
+        await response.read()
+        results.append((response.status, time.perf_counter() - started))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=2000, help="Сколько обновлений отправить")
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных запросов клиента")
+    parser.add_argument("--handler-ms", type=float, default=20, help="Длительность обработки обновления, мс")
+    parser.add_argument("--mode", choices=("queue", "task", "inline"), default="queue")
+    parser.add_argument("--queue-size", type=int, default=1000, help="Размер очереди (режим queue)")
+    parser.add_argument("--workers", type=int, default=32, help="Воркеров (режим queue)")
+    args = parser.parse_args()
+
+    dp = Dispatcher()
+    processed = 0
+    all_processed = asyncio.Event()
+
+    @dp.message()
+    async def on_message(message: types.Message):
+        nonlocal processed
+        await asyncio.sleep(args.handler_ms / 1000)
+        processed += 1
+        if processed == accepted_total():
+            all_processed.set()
+
+    bot = Bot(token="123456:" + "A" * 35)
+    secret = new_secret_token()
+    if args.mode == "queue":
+        handler = QueuedRequestHandler(dp, bot, secret_token=secret, queue_size=args.queue_size,
+                                       workers=args.workers)
+    else:
+        handler = SimpleRequestHandler(dp, bot, handle_in_background=args.mode == "task", secret_token=secret)
+
+    results = []
+
+    def accepted_total() -> int:
+        return sum(1 for status, _ in results if status == 200) if len(results) == args.updates else -1
+
+    app = web.Application()
+    handler.register(app, path="/webhook")
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/webhook"
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def send(update_id: int):
+        async with semaphore:
+            await post(session, url, secret, make_update(update_id), results)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(send(i) for i in range(args.updates)))
+        ingest_elapsed = time.perf_counter() - started
+        # Проверка секрета: запрос без заголовка должен получить 401
+        async with session.post(url, json=make_update(-1)) as response:
+            unauthorized_status = response.status
+
+    if processed >= accepted_total():
+        all_processed.set()
+    await asyncio.wait_for(all_processed.wait(), timeout=300)
+    total_elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _ in results)
+    latencies = [latency for status, latency in results if status == 200]
+    print(f"Режим {args.mode}: {args.updates} обновлений, {args.concurrency} одновременно, "
+          f"обработка {args.handler_ms:g} мс")
+    print(f"  Ответы: {dict(statuses)}, без секрета: {unauthorized_status}")
+    print(f"  Прием:     {ingest_elapsed:.2f} с ({len(results) / ingest_elapsed:.0f} обновлений/с)")
+    if latencies:
+        print(f"  Ответ 200: p50 {statistics.median(latencies) * 1000:.1f} мс, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, p99 {percentile(latencies, 0.99) * 1000:.1f} мс")
+    print(f"  Обработано {processed} за {total_elapsed:.2f} с")
+    if isinstance(handler, QueuedRequestHandler):
+        print(f"  Метрики:   {handler.stats()}")
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
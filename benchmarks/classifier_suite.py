@@ -0,0 +1,219 @@
+"""Офлайн-бенчмарк QuestionProcessor: скорость по этапам и точность на размеченном корпусе"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_processor import QuestionProcessor
+from model_router import ModelRouter, parse_tiers, DEFAULT_TIERS
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "classifier_corpus.json")
+
+
+def load_corpus(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure_stage(func, inputs: list, repeat: int) -> dict:
+    """Время каждого вызова (для p50/p99), пропускная способность и память на вызов"""
+    for text in inputs:  # прогрев (в том числе кэши стеммера)
+        func(text)
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in inputs:
+            call_started = time.perf_counter_ns()
+            func(text)
+            latencies.append(time.perf_counter_ns() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    # Пиковая память, выделенная за один вызов
+    peaks = []
+    tracemalloc.start()
+    for text in inputs:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        func(text)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+
+    return {
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "memory_bytes": sum(peaks) / len(peaks) if peaks else 0.0,
+    }
+
+
+def evaluate(processor: QuestionProcessor, corpus: list) -> dict:
+    """Точность классификации: precision/recall для класса 'медицинский'"""
+    tp = fp = fn = tn = 0
+    errors = []
+    for item in corpus:
+        predicted = processor.classify(item["text"]).is_medical
+        expected = item["medical"]
+        if predicted and expected:
+            tp += 1
+        elif predicted and not expected:
+            fp += 1
+            errors.append(("ложное срабатывание", item))
+        elif not predicted and expected:
+            fn += 1
+            errors.append(("пропуск", item))
+        else:
+            tn += 1
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "accuracy": (tp + tn) / len(corpus) if corpus else 0.0,
+        "errors": errors,
+    }
+
+
+def trigger_parity(processor: QuestionProcessor, corpus: list) -> list:
+    """Расхождения iter_triggers с отдельным re.search по каждому паттерну: [(вопрос, ожидалось, получено)]"""
+    snapshot = processor.snapshot
+    patterns = [('trigger', p) for p in snapshot.trigger_patterns] + [('special', p) for p in snapshot.special_cases]
+    mismatches = []
+    for item in corpus:
+        text = processor.clean_question(item["text"]).lower()
+        expected = {}
+        for kind, pattern in patterns:
+            match = re.search(pattern, text)
+            if match:
+                expected.setdefault((kind, pattern), match.group())
+        actual = {}
+        for kind, pattern, _, matched in processor.iter_triggers(text):
+            actual.setdefault((kind, pattern), matched)
+        if actual != expected:
+            mismatches.append((item["text"], expected, actual))
+    return mismatches
+
+
+def evaluate_routing(processor: QuestionProcessor, corpus: list) -> list:
+    """Ошибки определения критических тем ModelRouter на вопросах корпуса с полем critical"""
+    router = ModelRouter(parse_tiers(DEFAULT_TIERS))
+    critical_model = router.tiers[-1].model
+    errors = []
+    for item in corpus:
+        if "critical" not in item:
+            continue
+        decision = router.route(processor.classify(item["text"]))
+        critical = decision.model == critical_model and decision.reason.startswith("критическая тема")
+        if critical != item["critical"]:
+            errors.append((decision.reason, item))
+    return errors
+
+
+def run_engine(engine: str, corpus: list, repeat: int) -> dict:
+    processor = QuestionProcessor(cache_size=0, engine=engine)
+    texts = [item["text"] for item in corpus]
+    cleaned = [processor.clean_question(text) for text in texts]
+
+    stages = {
+        "clean": measure_stage(processor.clean_question, texts, repeat),
+        "classify": measure_stage(processor.is_health_related, cleaned, repeat),
+        "keywords": measure_stage(processor.extract_keywords, cleaned, repeat),
+        "process": measure_stage(processor.classify, texts, repeat),
+    }
+    return {
+        "stages": stages,
+        "quality": evaluate(processor, corpus),
+        "routing_errors": evaluate_routing(processor, corpus),
+        "trigger_mismatches": trigger_parity(processor, corpus),
+    }
+
+
+def print_report(engine: str, report: dict, show_errors: bool):
+    print(f"\nДвижок: {engine}")
+    print("-" * 72)
+    print(f"{'Этап':<10}{'вызовов/с':>14}{'p50, мкс':>12}{'p99, мкс':>12}{'память/вызов, Б':>20}")
+    for stage, values in report["stages"].items():
+        print(f"{stage:<10}{values['throughput']:>14.0f}{values['p50_us']:>12.1f}"
+              f"{values['p99_us']:>12.1f}{values['memory_bytes']:>20.0f}")
+
+    quality = report["quality"]
+    print("-" * 72)
+    print(f"Precision: {quality['precision']:.3f}  Recall: {quality['recall']:.3f}  "
+          f"F1: {quality['f1']:.3f}  Accuracy: {quality['accuracy']:.3f}")
+    print(f"TP={quality['tp']} FP={quality['fp']} FN={quality['fn']} TN={quality['tn']}")
+
+    trigger_mismatches = report["trigger_mismatches"]
+    print(f"Триггеры: расхождений с re.search {len(trigger_mismatches)}")
+    for text, expected, actual in trigger_mismatches:
+        print(f"  {text[:80]}\n    ожидалось {sorted(expected.values())}, получено {sorted(actual.values())}")
+
+    routing_errors = report["routing_errors"]
+    print(f"Критические темы: ошибок {len(routing_errors)}")
+    for reason, item in routing_errors:
+        print(f"  [{reason}] {item['text'][:80]}")
+
+    if show_errors and quality["errors"]:
+        print("Ошибки:")
+        for kind, item in quality["errors"]:
+            print(f"  [{kind}] ({item['topic']}) {item['text'][:80]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк скорости и точности классификатора")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="JSON-корпус: [{text, medical, topic}]")
+    parser.add_argument("--engine", choices=QuestionProcessor.ENGINES + ("all",), default="all")
+    parser.add_argument("--repeat", type=int, default=50, help="Повторов корпуса при замере скорости")
+    parser.add_argument("--errors", action="store_true", help="Показать ошибочно классифицированные вопросы")
+    parser.add_argument("--json", dest="json_path", help="Сохранить отчет в JSON (для сравнения изменений словарей)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    engines = QuestionProcessor.ENGINES if args.engine == "all" else (args.engine,)
+
+    print("=" * 72)
+    print(f"БЕНЧМАРК КЛАССИФИКАТОРА: {len(corpus)} вопросов, "
+          f"{sum(item['medical'] for item in corpus)} медицинских")
+    print("=" * 72)
+
+    reports = {}
+    for engine in engines:
+        reports[engine] = run_engine(engine, corpus, args.repeat)
+        print_report(engine, reports[engine], args.errors)
+
+    if args.json_path:
+        for report in reports.values():
+            report["quality"]["errors"] = [
+                {"kind": kind, "text": item["text"]} for kind, item in report["quality"]["errors"]
+            ]
+            report["trigger_mismatches"] = [
+                {"text": text, "expected": sorted(expected.values()), "actual": sorted(actual.values())}
+                for text, expected, actual in report["trigger_mismatches"]
+            ]
+            report["routing_errors"] = [
+                {"reason": reason, "text": item["text"]} for reason, item in report["routing_errors"]
+            ]
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\nОтчет сохранен: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Отчет о совпадении решений: движок token против текущего substring"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from question_processor import QuestionProcessor
+
+
+SAMPLE_QUESTIONS = [
+    "Добрый день! Прокомментируйте, пожалуйста, турецкую схему приема вит Д: одна ампула в месяц",
+    "Какой уровень pH воды безопасен для ежедневного питья?",
+    "Можно ли использовать ЭМ для ребенка 4 лет при насморке?",
+    "Завтра иду на МРТ головы, чем себя защитить?",
+    "Можно ли принимать БАДы при онкологии молочной железы?",
+    "Когда лучше принимать VMG+, до еды или после?",
+    "После ковида остался свист в легких и кашель, что делать?",
+    "У ребенка атопический дерматит, кожа шершавая, чем помочь?",
+    "Болит голова уже третий день",
+    "Какие анализы сдать при подозрении на миому?",
+    "Как правильно оформить налоговый вычет?",
+    "Подскажите, как дозвониться в поликлинику",
+    "Посоветуйте хороший смартфон до 30 тысяч",
+    "Какой фильм посмотреть вечером?",
+    "Где купить билеты на концерт?",
+    "Проблема с кредитом в банке, что делать?",
+    "Хочу поехать на отдых на море, какой отель выбрать?",
+    "Можно ли сочетать кальций и витамин D3?",
+    "Сколько капель эфирного масла лаванды добавлять в диффузор?",
+    "Что такое эмпатия и как ее развить?",
+]
+
+
+def load_questions(args) -> list:
+    questions = list(SAMPLE_QUESTIONS)
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip())
+
+    if args.db:
+        from database import Session, UserRequest
+        db = Session()
+        try:
+            rows = db.query(UserRequest.question, UserRequest.original_question).all()
+            questions.extend(row.original_question or row.question for row in rows)
+        finally:
+            db.close()
+
+    return questions
+
+
+def timed_scan(processor: QuestionProcessor, lowered: list) -> float:
+    started = time.perf_counter()
+    for text in lowered:
+        processor.snapshot.matcher.find(text)
+    return (time.perf_counter() - started) / max(len(lowered), 1) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение движков классификатора")
+    parser.add_argument("--file", help="Файл с вопросами (по одному в строке)")
+    parser.add_argument("--db", action="store_true", help="Добавить вопросы из таблицы requests")
+    parser.add_argument("--show", type=int, default=30, help="Сколько расхождений показать")
+    args = parser.parse_args()
+
+    questions = load_questions(args)
+    substring = QuestionProcessor(cache_size=0, engine="substring")
+    token = QuestionProcessor(cache_size=0, engine="token")
+
+    counts = {"both": 0, "neither": 0, "substring_only": 0, "token_only": 0}
+    differences = []
+
+    for question in questions:
+        old = substring.classify(question)
+        new = token.classify(question)
+
+        if old.is_medical and new.is_medical:
+            counts["both"] += 1
+        elif not old.is_medical and not new.is_medical:
+            counts["neither"] += 1
+        else:
+            counts["substring_only" if old.is_medical else "token_only"] += 1
+            lowered = old.cleaned.lower()
+            old_hits = substring.snapshot.matcher.find(lowered)
+            new_hits = token.snapshot.matcher.find(lowered)
+            differences.append((question, old.is_medical, {
+                category: (sorted(old_hits[category] - new_hits[category]),
+                           sorted(new_hits[category] - old_hits[category]))
+                for category in old_hits
+                if old_hits[category] != new_hits[category]
+            }))
+
+    total = len(questions)
+    agreed = counts["both"] + counts["neither"]
+    lowered = [substring.classify(q).cleaned.lower() for q in questions]
+
+    print("=" * 50)
+    print("📊 ПАРИТЕТ ДВИЖКОВ КЛАССИФИКАТОРА")
+    print("=" * 50)
+    print(f"Вопросов: {total}")
+    print(f"Совпадение решений: {agreed}/{total} ({agreed / max(total, 1):.1%})")
+    print(f"  оба медицинский:       {counts['both']}")
+    print(f"  оба не медицинский:    {counts['neither']}")
+    print(f"  только substring:      {counts['substring_only']}")
+    print(f"  только token:          {counts['token_only']}")
+    print(f"Поиск шаблонов substring: {timed_scan(substring, lowered):.1f} мкс/вопрос")
+    print(f"Поиск шаблонов token:     {timed_scan(token, lowered):.1f} мкс/вопрос")
+
+    if differences:
+        print("\nРасхождения (категория: только substring / только token):")
+        for question, old_decision, diff in differences[:args.show]:
+            print(f"- [{'substring' if old_decision else 'token'}] {question[:90]}")
+            for category, (only_old, only_new) in diff.items():
+                print(f"    {category}: {only_old} / {only_new}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,42 +2,260 @@ import asyncio
 import logging
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton
 import aiohttp
 import json
 from datetime import datetime
 
-from config import BOT_TOKEN, GIGACHAT_AUTH_KEY, GIGACHAT_SCOPE
-from database import session, UserRequest, DraftAnswer
-from keyboards import get_expert_keyboard
+from config import (BOT_TOKEN, BOT_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+                    WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS,
+                    TELEGRAM_GLOBAL_RATE, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, TELEGRAM_MAX_RETRIES,
+                    STATE_BACKEND, STATE_REDIS_URL, STATE_MEMORY_SIZE, STATE_TTL,
+                    GIGACHAT_AUTH_KEY, GIGACHAT_SCOPE, GIGACHAT_BASE_URL,
+                    GIGACHAT_CONNECTION_LIMIT, GIGACHAT_LIMIT_PER_HOST, GIGACHAT_KEEPALIVE_TIMEOUT,
+                    GIGACHAT_STREAMING, EXPERT_EDIT_INTERVAL,
+                    GIGACHAT_RPS, GIGACHAT_BURST, GIGACHAT_MAX_CONCURRENCY, GIGACHAT_MAX_RETRIES,
+                    GIGACHAT_ROUTING, GIGACHAT_ROUTING_TIERS, GIGACHAT_PROMPT_SECTIONS,
+                    GIGACHAT_REQUEST_TIMEOUT, GIGACHAT_CONNECT_TIMEOUT, GIGACHAT_STREAM_READ_TIMEOUT,
+                    GIGACHAT_BREAKER_THRESHOLD, GIGACHAT_BREAKER_WINDOW, GIGACHAT_BREAKER_MIN_CALLS,
+                    GIGACHAT_BREAKER_OPEN_SECONDS, GIGACHAT_HEDGING, GIGACHAT_HEDGE_MIN_DELAY,
+                    REGENERATE_CANDIDATES, REGENERATE_TEMPERATURES,
+                    GENERATION_WORKERS, GENERATION_VISIBILITY_TIMEOUT, GENERATION_MAX_ATTEMPTS,
+                    GENERATION_RETRY_DELAY,
+                    GIGACHAT_CACHE_ENABLED, GIGACHAT_CACHE_SIZE, GIGACHAT_CACHE_TTL, GIGACHAT_CACHE_PERSISTENT,
+                    CLASSIFIER_CACHE_SIZE, CLASSIFIER_CACHE_TTL, CLASSIFIER_ENGINE,
+                    CLASSIFIER_INLINE_MAX_CHARS, CLASSIFIER_POOL_WORKERS,
+                    VOCABULARY_PATH, VOCABULARY_WATCH_INTERVAL)
+from database import (session, UserRequest, DraftAnswer, get_active_draft, get_drafts, select_draft,
+                      transition_request)
+from keyboards import get_expert_keyboard, get_candidates_keyboard
 from gigachat_client import GigaChatClient
+from gigachat_scheduler import GigaChatScheduler, PRIORITY_EXPERT, PRIORITY_USER
+from circuit_breaker import CircuitBreaker
+from response_cache import ResponseCache
+from model_router import ModelRouter, parse_tiers
+from prompts import PromptBuilder
+from job_queue import JobQueue
+from webhook import QueuedRequestHandler, run_webhook, check_webhook_settings
+from telegram_sender import TelegramSender
+from state_store import create_state_store
+from keyed_lock import KeyedLock
+import metrics
 
 from question_processor import QuestionProcessor
-question_processor = QuestionProcessor()
+from async_classifier import AsyncClassifier
+question_processor = QuestionProcessor(
+    cache_size=CLASSIFIER_CACHE_SIZE,
+    cache_ttl=CLASSIFIER_CACHE_TTL,
+    engine=CLASSIFIER_ENGINE,
+    vocabulary_path=VOCABULARY_PATH
+)
+metrics.register("classifier_cache", question_processor.cache.stats)
+metrics.register("classifier_vocabulary", question_processor.vocabulary_stats)
+
+# Длинные тексты классифицируются в пуле процессов, чтобы не блокировать цикл событий
+async_classifier = AsyncClassifier(
+    question_processor,
+    inline_max_chars=CLASSIFIER_INLINE_MAX_CHARS,
+    workers=CLASSIFIER_POOL_WORKERS
+)
+metrics.register("classifier_executor", async_classifier.stats)
+
+# Повторные вопросы получают сохраненный ответ без обращения к GigaChat
+response_cache = None
+if GIGACHAT_CACHE_ENABLED:
+    response_cache = ResponseCache(
+        maxsize=GIGACHAT_CACHE_SIZE,
+        ttl=GIGACHAT_CACHE_TTL,
+        persistent=GIGACHAT_CACHE_PERSISTENT
+    )
+    metrics.register("gigachat_response_cache", response_cache.stats)
 
 giga_client = GigaChatClient(
     auth_key=GIGACHAT_AUTH_KEY,
-    scope=GIGACHAT_SCOPE
+    scope=GIGACHAT_SCOPE,
+    connection_limit=GIGACHAT_CONNECTION_LIMIT,
+    limit_per_host=GIGACHAT_LIMIT_PER_HOST,
+    keepalive_timeout=GIGACHAT_KEEPALIVE_TIMEOUT,
+    response_cache=response_cache,
+    base_url=GIGACHAT_BASE_URL,
+    request_timeout=GIGACHAT_REQUEST_TIMEOUT,
+    connect_timeout=GIGACHAT_CONNECT_TIMEOUT,
+    stream_read_timeout=GIGACHAT_STREAM_READ_TIMEOUT
 )
+metrics.register("gigachat_client", giga_client.stats)
+
+# Все запросы к GigaChat идут через очередь: лимит частоты и параллельности,
+# приоритет для экспертов, повторы при 429/5xx, быстрый отказ при сбое GigaChat
+giga_scheduler = GigaChatScheduler(
+    giga_client,
+    rate=GIGACHAT_RPS,
+    burst=GIGACHAT_BURST,
+    max_concurrency=GIGACHAT_MAX_CONCURRENCY,
+    max_retries=GIGACHAT_MAX_RETRIES,
+    breaker=CircuitBreaker(
+        failure_threshold=GIGACHAT_BREAKER_THRESHOLD,
+        window=GIGACHAT_BREAKER_WINDOW,
+        min_calls=GIGACHAT_BREAKER_MIN_CALLS,
+        open_seconds=GIGACHAT_BREAKER_OPEN_SECONDS
+    ),
+    hedging=GIGACHAT_HEDGING,
+    hedge_min_delay=GIGACHAT_HEDGE_MIN_DELAY
+)
+metrics.register("gigachat_scheduler", giga_scheduler.stats)
+
+# Простые вопросы - быстрой модели с коротким ответом, сложные и критические - старшей
+model_router = ModelRouter(
+    parse_tiers(GIGACHAT_ROUTING_TIERS),
+    enabled=GIGACHAT_ROUTING,
+    default_model="GigaChat-2-Pro",
+    default_max_tokens=giga_client.max_tokens
+)
+metrics.register("gigachat_router", model_router.stats)
+
+# В системный промпт попадают только основные правила и разделы по темам вопроса
+prompt_builder = PromptBuilder(enabled=GIGACHAT_PROMPT_SECTIONS)
+metrics.register("gigachat_prompt", prompt_builder.stats)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
+if REGENERATE_CANDIDATES > min(GIGACHAT_MAX_CONCURRENCY, GIGACHAT_BURST):
+    logging.warning(f"REGENERATE_CANDIDATES={REGENERATE_CANDIDATES} больше GIGACHAT_MAX_CONCURRENCY "
+                    f"или GIGACHAT_BURST: варианты ответа будут генерироваться в несколько заходов")
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+# Все исходящие сообщения и правки - через общий отправитель с лимитами Telegram
+telegram_sender = TelegramSender(
+    bot,
+    global_rate=TELEGRAM_GLOBAL_RATE,
+    chat_rate=TELEGRAM_CHAT_RATE,
+    chat_burst=TELEGRAM_CHAT_BURST,
+    max_retries=TELEGRAM_MAX_RETRIES
+)
+metrics.register("telegram_sender", telegram_sender.stats)
+
 # Список ID экспертов
 EXPERT_IDS = [753655653] #Даша 982232323, Оля 1552323966, Татьяна Николаевна Бобышева 753655653
 
-# Глобальный словарь для отслеживания редактирования
-editing_sessions = {}
+# Сессии редактирования и message_id сообщений с кнопками
+# хранятся в общем хранилище: у записей есть срок жизни, а с sqlite/redis они переживают
+# перезапуск и видны всем процессам бота
+state_store = create_state_store(STATE_BACKEND, redis_url=STATE_REDIS_URL, maxsize=STATE_MEMORY_SIZE)
+metrics.register("state_store", state_store.stats)
+
+
+async def get_editing_session(expert_id: int):
+    """ID запроса, который эксперт сейчас редактирует, или None"""
+    request_id = await state_store.get(f"editing:{expert_id}")
+    return int(request_id) if request_id is not None else None
+
+
+async def start_editing_session(expert_id: int, request_id: int):
+    await state_store.set(f"editing:{expert_id}", request_id, ttl=STATE_TTL)
 
-# Новый словарь для хранения message_id сообщений с кнопками
-expert_messages = {}  # ключ: (expert_id, request_id), значение: message_id
 
-# Защита от множественных нажатий
-processing_requests = set()
+async def end_editing_session(expert_id: int):
+    await state_store.delete(f"editing:{expert_id}")
+
+
+async def remember_expert_message(expert_id: int, request_id: int, message_id: int):
+    """Сохраняет message_id сообщения эксперта с кнопками (для последующего редактирования)"""
+    await state_store.set(f"message:{expert_id}:{request_id}", message_id, ttl=STATE_TTL)
+
+
+async def get_expert_message(expert_id: int, request_id: int):
+    message_id = await state_store.get(f"message:{expert_id}:{request_id}")
+    return int(message_id) if message_id is not None else None
+
+
+# Действия с одним запросом выполняются по одному; смена статуса - условным UPDATE в базе
+request_locks = KeyedLock()
+metrics.register("request_locks", request_locks.stats)
+
+
+class ThrottledMessageEditor:
+    """
+    Постепенное обновление сообщения по мере генерации ответа
+
+    Промежуточные правки отправляются не чаще min_interval секунд (лишние пропускаются),
+    после RetryAfter от Telegram - не раньше указанного им времени; неудачная промежуточная
+    правка пропускается. Финальная правка отправляется всегда.
+    """
+
+    def __init__(self, chat_id: int, message_id: int, min_interval: float = EXPERT_EDIT_INTERVAL):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.min_interval = min_interval
+        self._next_edit_at = 0.0
+        self._last_text = None
+
+    async def update(self, text: str) -> bool:
+        """Промежуточная правка; возвращает True, если сообщение изменено"""
+        loop = asyncio.get_running_loop()
+        if loop.time() < self._next_edit_at or text == self._last_text:
+            return False
+
+        try:
+            await telegram_sender.edit_message_text(self.chat_id, self.message_id, text, retries=0)
+            self._last_text = text
+            self._next_edit_at = loop.time() + self.min_interval
+            return True
+        except TelegramRetryAfter as e:
+            # Промежуточные правки не обязательны - просто откладываем следующую
+            self._next_edit_at = loop.time() + e.retry_after
+        except TelegramBadRequest as e:
+            logging.debug(f"Промежуточная правка сообщения {self.message_id} не применена: {e}")
+            self._next_edit_at = loop.time() + self.min_interval
+        except Exception as e:
+            # Сбой промежуточной правки не прерывает генерацию; ошибкой считается только сбой finish
+            logging.warning(f"Промежуточная правка сообщения {self.message_id} в чате {self.chat_id} не удалась: {e!r}")
+            self._next_edit_at = loop.time() + self.min_interval
+        return False
+
+    async def finish(self, text: str, reply_markup=None, attempts: int = 3):
+        """Финальная правка с кнопками: дожидается разрешенного времени и повторяет после RetryAfter"""
+        loop = asyncio.get_running_loop()
+        for _ in range(attempts):
+            delay = self._next_edit_at - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await telegram_sender.edit_message_text(
+                    self.chat_id,
+                    self.message_id,
+                    text,
+                    reply_markup=reply_markup,
+                    retries=0
+                )
+                self._last_text = text
+                return
+            except TelegramRetryAfter as e:
+                self._next_edit_at = loop.time() + e.retry_after
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    return
+                raise
+        logging.error(f"Не удалось обновить сообщение {self.message_id} в чате {self.chat_id}")
+
+
+async def stream_response(question: str, editors: list, header: str, priority: int = PRIORITY_USER,
+                          bypass_cache: bool = False, **options) -> str:
+    """
+    Генерирует ответ потоком и по мере поступления дописывает его в сообщения экспертов
+
+    :param options: Параметры генерации для giga_scheduler.stream (model, max_tokens, system_prompt)
+    """
+    chunks = []
+    async for chunk in giga_scheduler.stream(question, priority=priority, bypass_cache=bypass_cache, **options):
+        chunks.append(chunk)
+        text = f"{header}{''.join(chunks)} ▌"
+        for editor in editors:
+            await editor.update(text)
+    return ''.join(chunks)
 
 @dp.message(Command("start"))
 async def cmd_start(message: types.Message):
@@ -71,7 +289,7 @@ async def cmd_start(message: types.Message):
         """
         # Для экспертов можно сразу показать статистику или доступные вопросы
         # Например, добавить кнопку "Показать ожидающие вопросы"
-        await message.answer(welcome_text, reply_markup=ReplyKeyboardRemove())
+        await telegram_sender.send_message(message.chat.id, welcome_text, reply_markup=ReplyKeyboardRemove())
 
     else:
         # Приветствие для обычного пользователя
@@ -89,7 +307,33 @@ async def cmd_start(message: types.Message):
 
 📝 Просто напишите ваш вопрос о здоровье, и мы поможем!
         """
-        await message.answer(welcome_text, reply_markup=ReplyKeyboardRemove())
+        await telegram_sender.send_message(message.chat.id, welcome_text, reply_markup=ReplyKeyboardRemove())
+
+
+@dp.message(Command("metrics"), F.from_user.id.in_(EXPERT_IDS))
+async def cmd_metrics(message: types.Message):
+    """Текущие метрики бота (только для экспертов)"""
+    await telegram_sender.send_message(message.chat.id, metrics.render() or "Метрик пока нет")
+
+
+@dp.message(Command("reload_vocab"), F.from_user.id.in_(EXPERT_IDS))
+async def cmd_reload_vocab(message: types.Message):
+    """Перечитывает файл словарей классификатора без перезапуска бота (только для экспертов)"""
+    reloaded = await question_processor.reload_async(force=True)
+    snapshot = question_processor.snapshot
+
+    if reloaded:
+        await telegram_sender.send_message(
+            message.chat.id,
+            f"✅ Словари перезагружены: версия {snapshot.version}, "
+            f"сборка {snapshot.build_seconds * 1000:.1f} мс"
+        )
+    else:
+        await telegram_sender.send_message(
+            message.chat.id,
+            f"❌ Словари не перезагружены, работает версия {snapshot.version}\n"
+            f"{question_processor.last_reload_error}"
+        )
 
 
 @dp.message(F.text & ~F.from_user.id.in_(EXPERT_IDS))
@@ -99,7 +343,7 @@ async def handle_user_question(message: types.Message):
     original_question = message.text
 
     # 1. Обрабатываем вопрос
-    processed = question_processor.process(original_question)
+    processed = await async_classifier.process(original_question)
 
     logging.info(f"Обработка вопроса от пользователя {user_id}:")
     logging.info(f"  Оригинал: '{original_question}'")
@@ -108,73 +352,141 @@ async def handle_user_question(message: types.Message):
 
     # 2. Если вопрос не медицинский - сразу отвечаем и НЕ сохраняем в БД
     if not processed["is_medical"]:
-        await message.answer(
+        await telegram_sender.send_message(
+            message.chat.id,
             "Я специализируюсь только на вопросах здоровья. Пожалуйста, задайте вопрос о здоровом образе жизни, симптомах или общих медицинских темах."
         )
         # НЕ создаем запись в БД для немедицинских вопросов
         return
 
-    # 3. Сохраняем ОЧИЩЕННЫЙ вопрос в БД
+    # 3. Сохраняем ОЧИЩЕННЫЙ вопрос в БД вместе с выбранной для него моделью и разделами промпта
+    route = model_router.route(processed)
+    prompt = prompt_builder.build(processed["keywords"], processed["cleaned"])
+    logging.info(f"  Модель: {route.model}, max_tokens {route.max_tokens} ({route.reason})")
+    logging.info(f"  Разделы промпта: {prompt.tags}, ~{prompt.tokens} токенов (сэкономлено ~{prompt.saved_tokens})")
     request = UserRequest(
         user_id=user_id,
         question=processed["cleaned"],
         original_question=original_question,  # Теперь это поле есть
-        status='waiting'
+        status='waiting',
+        model=route.model,
+        max_tokens=route.max_tokens,
+        route_reason=route.reason,
+        keywords=",".join(processed["keywords"]),
+        prompt_sections=",".join(prompt.tags),
+        prompt_tokens_saved=prompt.saved_tokens
     )
     session.add(request)
-    session.commit()
+    session.flush()
+
+    # 4. Ставим генерацию в очередь (запрос и задача сохраняются одной транзакцией) и сразу
+    # отвечаем: черновик сделают воркеры, и задача не потеряется, даже если бот перезапустится
+    generation_queue.enqueue(request.id, db=session)
+    await telegram_sender.send_message(
+        message.chat.id,
+        "✅ Ваш вопрос принят на модерацию. Ответ поступит в течение 12 часов."
+    )
+
 
-    # 4. Уведомляем пользователя
-    await message.answer("✅ Ваш вопрос принят на модерацию. Ответ поступит в течение 12 часов.")
+async def generate_draft(request_id: int):
+    """Задача очереди: генерирует черновик ответа на ОЧИЩЕННЫЙ вопрос и отправляет его экспертам"""
+    request = session.query(UserRequest).filter_by(id=request_id).first()
+    if not request or request.status != 'waiting':
+        return
+    original_question = request.original_question or request.question
 
-    # 5. Генерируем черновик ответа на ОЧИЩЕННЫЙ вопрос с помощью GigaChat
+    # Черновик уже сохранен, но эксперты могли не получить уведомление (перезапуск) - только уведомляем
+    draft = get_active_draft(request_id)
+    if draft:
+        await notify_experts(request_id, original_question, draft.llm_response)
+        return
+
+    editors = []
     try:
-        # Используем очищенный вопрос для генерации
-        llm_response = await giga_client.generate_response(processed["cleaned"])
+        options = generation_options(request)
+        if GIGACHAT_STREAMING:
+            # Эксперты видят ответ по мере генерации, кнопки появятся после сохранения черновика
+            editors = await send_expert_placeholders(request_id, original_question)
+            header = draft_message_text(request_id, original_question, "")
+            llm_response = await stream_response(request.question, editors, header, **options)
+        else:
+            llm_response = await giga_scheduler.generate(request.question, priority=PRIORITY_USER, **options)
+    except Exception:
+        # Сообщения экспертов с недописанным ответом помечаем как неудачные; повтор решает очередь
+        for editor in editors:
+            try:
+                await editor.finish(draft_message_text(request_id, original_question, "⚠️ Не удалось сгенерировать ответ"))
+            except Exception as edit_error:
+                logging.error(f"Ошибка редактирования сообщения эксперта {editor.chat_id}: {edit_error}")
+        raise
+
+    # Очищаем ответ (опционально)
+    cleaned_response = giga_client.clean_response(llm_response)
+
+    # Сохраняем черновик в БД
+    draft = DraftAnswer(
+        request_id=request_id,
+        llm_response=cleaned_response
+    )
+    session.add(draft)
+    session.commit()
 
-        # Очищаем ответ (опционально)
-        cleaned_response = giga_client.clean_response(llm_response)
+    # Уведомляем экспертов о новом вопросе
+    # Отправляем экспертам ОРИГИНАЛЬНЫЙ вопрос для контекста
+    if GIGACHAT_STREAMING:
+        await finish_expert_messages(request_id, editors, draft_message_text(request_id, original_question, cleaned_response))
+    else:
+        await notify_experts(request_id, original_question, cleaned_response)
 
-        # Сохраняем черновик в БД
-        draft = DraftAnswer(
-            request_id=request.id,
-            llm_response=cleaned_response
-        )
-        session.add(draft)
-        session.commit()
 
-        # Уведомляем экспертов о новом вопросе
-        # Отправляем экспертам ОРИГИНАЛЬНЫЙ вопрос для контекста
-        await notify_experts(request.id, original_question, cleaned_response)
+async def generation_failed(request_id: int, error: Exception):
+    """Все попытки генерации исчерпаны: запрос помечается ошибкой, пользователь получает сообщение"""
+    logging.error(f"Ошибка при генерации ответа: {error}")
+    request = session.query(UserRequest).filter_by(id=request_id).first()
+    if not request:
+        return
+    # Обновляем статус запроса на ошибку (если эксперт еще не успел его обработать)
+    if not transition_request(request_id, 'waiting', 'error'):
+        return
+    await telegram_sender.send_message(request.user_id, "⚠️ Произошла ошибка при обработке вопроса. Попробуйте позже.")
+
 
-    except Exception as e:
-        logging.error(f"Ошибка при генерации ответа: {e}")
-        # Обновляем статус запроса на ошибку
-        request.status = 'error'
-        session.commit()
-        await message.answer("⚠️ Произошла ошибка при обработке вопроса. Попробуйте позже.")
+# Генерация черновиков идет в фоновых воркерах, задачи хранятся в таблице generation_jobs
+generation_queue = JobQueue(
+    generate_draft,
+    on_failure=generation_failed,
+    concurrency=GENERATION_WORKERS,
+    visibility_timeout=GENERATION_VISIBILITY_TIMEOUT,
+    max_attempts=GENERATION_MAX_ATTEMPTS,
+    retry_delay=GENERATION_RETRY_DELAY
+)
+metrics.register("generation_queue", generation_queue.stats)
 
 
 @dp.message(F.text & F.from_user.id.in_(EXPERT_IDS))
 async def handle_expert_text(message: types.Message):
     """Обработка текстовых сообщений от экспертов в режиме редактирования"""
 
-    if message.from_user.id in editing_sessions:
-        request_id = editing_sessions[message.from_user.id]
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+    request_id = await get_editing_session(message.from_user.id)
+    if request_id is not None:
+        draft = get_active_draft(request_id)
         request = session.query(UserRequest).filter_by(id=request_id).first()
 
-        if draft and request:
+        if request and request.status != 'waiting':
+            # Пока эксперт редактировал, запрос опубликовали или отклонили
+            await telegram_sender.send_message(message.chat.id, "ℹ️ Запрос уже обработан, исправление не сохранено")
+            await end_editing_session(message.from_user.id)
+        elif draft and request:
             # Сохраняем отредактированный текст
             draft.expert_edited_response = message.text
             session.commit()
 
             # Получаем message_id для редактирования
             message_key = (message.from_user.id, request_id)
-            target_message_id = expert_messages.get(message_key)
+            target_message_id = await get_expert_message(*message_key)
 
-            # После редактирования возвращаемся к ОСНОВНОЙ клавиатуре
-            keyboard = get_expert_keyboard(request_id)  # Стандартная клавиатура!
+            # После редактирования возвращаемся к основной клавиатуре (с листанием, если вариантов несколько)
+            keyboard = moderation_keyboard(request_id)
 
             # Формируем текст сообщения
             message_text = f"""🆕 Вопрос для модерации (ID: {request_id})
@@ -187,44 +499,45 @@ async def handle_expert_text(message: types.Message):
 
             # Удаляем сообщение с текстом редактирования
             try:
-                await message.delete()
+                await telegram_sender.call(message.chat.id, "delete_message", message_id=message.message_id)
             except:
                 pass
 
             # Редактируем сообщение с кнопками
             if target_message_id:
                 try:
-                    await bot.edit_message_text(
-                        chat_id=message.from_user.id,
-                        message_id=target_message_id,
-                        text=message_text,
-                        reply_markup=keyboard  # Стандартная клавиатура
+                    await telegram_sender.edit_message_text(
+                        message.from_user.id,
+                        target_message_id,
+                        message_text,
+                        reply_markup=keyboard
                     )
                 except Exception as e:
                     logging.error(f"Ошибка редактирования сообщения: {e}")
-                    # Если не удалось отредактировать, отправляем новое
-                    await message.answer(
-                        message_text,
-                        reply_markup=keyboard  # Стандартная клавиатура
-                    )
-            else:
-                await message.answer(
+                    target_message_id = None
+
+            if not target_message_id:
+                # Если редактировать нечего или не удалось, отправляем новое
+                sent = await telegram_sender.send_message(
+                    message.from_user.id,
                     message_text,
-                    reply_markup=keyboard  # Стандартная клавиатура
+                    reply_markup=keyboard
                 )
+                await remember_expert_message(message.from_user.id, request_id, sent.message_id)
 
             # Удаляем сессию редактирования
-            del editing_sessions[message.from_user.id]
+            await end_editing_session(message.from_user.id)
             logging.info(f"Эксперт {message.from_user.id} отредактировал ответ на запрос {request_id}")
 
         else:
-            await message.answer("❌ Ошибка: запрос или черновик не найден")
-            if message.from_user.id in editing_sessions:
-                del editing_sessions[message.from_user.id]
+            await telegram_sender.send_message(message.chat.id, "❌ Ошибка: запрос или черновик не найден")
+            await end_editing_session(message.from_user.id)
     else:
         # Эксперт пишет обычное сообщение (не в режиме редактирования)
-        await message.answer("🤖 Вы эксперт. Используйте кнопки модерации для работы с вопросами.")
-
+        await telegram_sender.send_message(
+            message.chat.id,
+            "🤖 Вы эксперт. Используйте кнопки модерации для работы с вопросами."
+        )
 
 
 # Обработчик нажатия на кнопку "Назад"
@@ -232,15 +545,16 @@ async def handle_expert_text(message: types.Message):
 async def back_to_main(callback: types.CallbackQuery):
     """Возврат к меню - НЕ сохраняет несохраненные изменения из текущей сессии"""
 
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[1])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
 
-    try:
-        request_id = int(callback.data.split("_")[1])
+    async with request_locks(request_id):
         request = session.query(UserRequest).filter_by(id=request_id).first()
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+        draft = get_active_draft(request_id)
 
         if request and draft:
             # Если мы в режиме редактирования (текст еще не сохранен),
@@ -248,8 +562,7 @@ async def back_to_main(callback: types.CallbackQuery):
             # Просто показываем то, что уже есть в БД
 
             # Удаляем сессию редактирования (текст не сохранялся)
-            if callback.from_user.id in editing_sessions:
-                del editing_sessions[callback.from_user.id]
+            await end_editing_session(callback.from_user.id)
 
             # Используем сохраненный в БД текст
             current_response = draft.expert_edited_response or draft.llm_response
@@ -265,18 +578,27 @@ async def back_to_main(callback: types.CallbackQuery):
 {response_label}
 {current_response}"""
 
-            await callback.message.edit_text(
+            await telegram_sender.edit_message_text(
+                callback.message.chat.id,
+                callback.message.message_id,
                 message_text,
-                reply_markup=get_expert_keyboard(request_id)
+                reply_markup=moderation_keyboard(request_id)
             )
 
             await callback.answer("Возврат к основному меню")
         else:
             await callback.answer("❌ Запрос не найден", show_alert=True)
 
-    finally:
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
+
+def draft_message_text(request_id: int, original_question: str, llm_response: str) -> str:
+    """Текст сообщения эксперту о новом вопросе"""
+    return f"""🆕 Новый вопрос для модерации (ID: {request_id})
+
+👤 Вопрос пользователя:
+{original_question}
+
+🤖 Ответ ИИ:
+{llm_response}"""
 
 
 async def notify_experts(request_id: int, original_question: str, llm_response: str):
@@ -287,26 +609,70 @@ async def notify_experts(request_id: int, original_question: str, llm_response:
         logging.error(f"Запрос {request_id} не найден для уведомления экспертов")
         return
 
-    message_text = f"""🆕 Новый вопрос для модерации (ID: {request_id})
+    message_text = draft_message_text(request_id, original_question, llm_response)
 
-👤 Вопрос пользователя:
-{original_question}
+    # Всем экспертам одновременно: медленный чат не задерживает остальных
+    sent = await telegram_sender.fan_out(EXPERT_IDS, message_text, reply_markup=get_expert_keyboard(request_id))
+    for expert_id, message in sent.items():
+        if isinstance(message, Exception):
+            logging.error(f"Не удалось уведомить эксперта {expert_id}: {message}")
+            continue
+        # Сохраняем message_id для возможности редактирования
+        await remember_expert_message(expert_id, request_id, message.message_id)
 
-🤖 Ответ ИИ:
-{llm_response}"""
+
+async def send_expert_placeholders(request_id: int, original_question: str) -> list:
+    """
+    Сразу отправляет экспертам вопрос без кнопок; ответ допишется по мере генерации
+
+    При повторной попытке генерации используются уже отправленные сообщения, новые не дублируются.
+    """
+    message_text = draft_message_text(request_id, original_question, "⏳ Генерируется...")
+    editors = []
+    missing = []
 
     for expert_id in EXPERT_IDS:
+        message_id = await get_expert_message(expert_id, request_id)
+        if message_id is None:
+            missing.append(expert_id)
+            continue
+        editor = ThrottledMessageEditor(expert_id, message_id)
+        await editor.update(message_text)
+        editors.append(editor)
+
+    if not missing:
+        return editors
+    sent = await telegram_sender.fan_out(missing, message_text)
+    for expert_id, message in sent.items():
+        if isinstance(message, Exception):
+            logging.error(f"Не удалось уведомить эксперта {expert_id}: {message}")
+            continue
+        await remember_expert_message(expert_id, request_id, message.message_id)
+        editors.append(ThrottledMessageEditor(expert_id, message.message_id))
+
+    return editors
+
+
+async def finish_expert_messages(request_id: int, editors: list, message_text: str):
+    """Записывает в сообщения экспертов окончательный ответ и добавляет кнопки модерации"""
+
+    async def finish(editor: ThrottledMessageEditor):
         try:
-            message = await bot.send_message(
-                expert_id,
-                message_text,
-                reply_markup=get_expert_keyboard(request_id)
-            )
-            # Сохраняем message_id для возможности редактирования
-            expert_messages[(expert_id, request_id)] = message.message_id
-
+            await editor.finish(message_text, reply_markup=get_expert_keyboard(request_id))
         except Exception as e:
-            logging.error(f"Не удалось уведомить эксперта {expert_id}: {e}")
+            logging.error(f"Ошибка редактирования сообщения эксперта {editor.chat_id}: {e}")
+            # Если не удалось отредактировать, отправляем новое
+            try:
+                message = await telegram_sender.send_message(
+                    editor.chat_id,
+                    message_text,
+                    reply_markup=get_expert_keyboard(request_id)
+                )
+                await remember_expert_message(editor.chat_id, request_id, message.message_id)
+            except Exception as e:
+                logging.error(f"Не удалось уведомить эксперта {editor.chat_id}: {e}")
+
+    await asyncio.gather(*(finish(editor) for editor in editors))
 
 
 # Обработчик нажатия на кнопку "Опубликовать"
@@ -314,18 +680,17 @@ async def notify_experts(request_id: int, original_question: str, llm_response:
 async def approve_response(callback: types.CallbackQuery):
     """Одобрение ответа экспертом"""
 
-    # Защита от множественных нажатий
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[1])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
-
-    try:
-        request_id = int(callback.data.split("_")[1])
 
+    async with request_locks(request_id):
         # Находим запрос и черновик в БД
         request = session.query(UserRequest).filter_by(id=request_id).first()
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+        draft = get_active_draft(request_id)
 
         if request and draft:
             #ВАЖНО: Проверяем, есть ли отредактированный текст ▼▼▼
@@ -338,121 +703,132 @@ async def approve_response(callback: types.CallbackQuery):
                 final_response = draft.llm_response
                 logging.info(f"Отправляется оригинальный ответ ИИ для запроса {request_id}")
 
-            # Обновляем статус
-            request.status = 'approved'
+            # Обновляем статус: опубликует только тот, кто первым перевел запрос из 'waiting'
+            if not transition_request(request_id, 'waiting', 'approved'):
+                await callback.answer("ℹ️ Запрос уже обработан", show_alert=True)
+                return
 
             # Добавляем приветствие и дисклеймер
             final_response = giga_client.add_greeting_disclaimer(final_response)
 
             # Отправляем ответ пользователю
             try:
-                await bot.send_message(
-                    chat_id=request.user_id,
-                    text=final_response
+                await telegram_sender.send_message(
+                    request.user_id,
+                    final_response
                 )
-                # Обновляем время решения
-                draft.decision_time = datetime.now()
-                draft.expert_id = callback.from_user.id
+            except Exception as e:
+                # Ответ не доставлен - запрос возвращается на модерацию
+                transition_request(request_id, 'approved', 'waiting')
+                await callback.answer(f"❌ Ошибка отправки: {e}", show_alert=True)
+                return
 
-                session.commit()
+            # Обновляем время решения
+            draft.decision_time = datetime.now()
+            draft.expert_id = callback.from_user.id
+            session.commit()
 
-                # Уведомляем эксперта об успехе
-                await callback.message.edit_text(
+            # Уведомляем эксперта об успехе
+            try:
+                await telegram_sender.edit_message_text(
+                    callback.message.chat.id,
+                    callback.message.message_id,
                     f"✅ Ответ опубликован и отправлен пользователю!\n\n"
                     f"ID запроса: {request_id}\n"
                     f"Тип ответа: {'Отредактированный экспертом' if draft.expert_edited_response else 'Оригинальный от ИИ'}",
                     reply_markup=None
                 )
-
             except Exception as e:
-                await callback.answer(f"❌ Ошибка отправки: {e}", show_alert=True)
+                logging.error(f"Ошибка редактирования сообщения: {e}")
         else:
             await callback.answer("❌ Запрос не найден", show_alert=True)
 
-    finally:
-        # Убираем из множества обработки после завершения
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
-
 
 # Обработчик нажатия на кнопку "Отклонить"
 @dp.callback_query(F.data.startswith("reject_"))
 async def reject_response(callback: types.CallbackQuery):
     """Отклонение ответа экспертом"""
 
-    # Защита от множественных нажатий
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[1])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
-
-    try:
-        request_id = int(callback.data.split("_")[1])
 
+    async with request_locks(request_id):
         # Находим запрос в БД
         request = session.query(UserRequest).filter_by(id=request_id).first()
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+        draft = get_active_draft(request_id)
 
         if request:
-            # Обновляем статус
-            request.status = 'rejected'
+            # Обновляем статус: пользователь получит ровно одно решение по запросу
+            if not transition_request(request_id, 'waiting', 'rejected'):
+                await callback.answer("ℹ️ Запрос уже обработан", show_alert=True)
+                return
 
             # Отправляем шаблонный ответ пользователю
             try:
-                await bot.send_message(
-                    chat_id=request.user_id,
-                    text="❌ К сожалению, мы не можем ответить на этот вопрос. Обратитесь к врачу за индивидуальной консультацией."
+                await telegram_sender.send_message(
+                    request.user_id,
+                    "❌ К сожалению, мы не можем ответить на этот вопрос. Обратитесь к врачу за индивидуальной консультацией."
                 )
+            except Exception as e:
+                transition_request(request_id, 'rejected', 'waiting')
+                await callback.answer(f"❌ Ошибка отправки: {e}", show_alert=True)
+                return
 
-                # Обновляем время решения
-                if draft:
-                    draft.decision_time = datetime.now()
-                    draft.expert_id = callback.from_user.id
-
-                session.commit()
+            # Обновляем время решения
+            if draft:
+                draft.decision_time = datetime.now()
+                draft.expert_id = callback.from_user.id
+            session.commit()
 
-                # Уведомляем эксперта об успехе
-                await callback.message.edit_text(
+            # Уведомляем эксперта об успехе
+            try:
+                await telegram_sender.edit_message_text(
+                    callback.message.chat.id,
+                    callback.message.message_id,
                     f"❌ Ответ отклонен. Пользователь уведомлен.\n\n"
                     f"ID запроса: {request_id}",
                     reply_markup=None
                 )
-
             except Exception as e:
-                await callback.answer(f"❌ Ошибка отправки: {e}", show_alert=True)
+                logging.error(f"Ошибка редактирования сообщения: {e}")
         else:
             await callback.answer("❌ Запрос не найден", show_alert=True)
 
-    finally:
-        # Убираем из множества обработки после завершения
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
-
 
 # Обработчик нажатия на кнопку "Редактировать"
 @dp.callback_query(F.data.startswith("edit_"))
 async def start_editing_response(callback: types.CallbackQuery):
     """Начало редактирования ответа"""
 
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[1])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
 
-    try:
+    async with request_locks(request_id):
         if callback.from_user.id not in EXPERT_IDS:
             await callback.answer("❌ У вас нет прав для редактирования.", show_alert=True)
             return
 
-        request_id = int(callback.data.split("_")[1])
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+        request = session.query(UserRequest).filter_by(id=request_id).first()
+        if request and request.status != 'waiting':
+            await callback.answer("ℹ️ Запрос уже обработан", show_alert=True)
+            return
+
+        draft = get_active_draft(request_id)
 
         if draft:
             # Сохраняем сессию редактирования
-            editing_sessions[callback.from_user.id] = request_id
+            await start_editing_session(callback.from_user.id, request_id)
 
             # Сохраняем message_id текущего сообщения
-            expert_messages[(callback.from_user.id, request_id)] = callback.message.message_id
+            await remember_expert_message(callback.from_user.id, request_id, callback.message.message_id)
 
             current_text = draft.expert_edited_response or draft.llm_response
 
@@ -462,7 +838,9 @@ async def start_editing_response(callback: types.CallbackQuery):
             ])
 
             # Редактируем текущее сообщение
-            await callback.message.edit_text(
+            await telegram_sender.edit_message_text(
+                callback.message.chat.id,
+                callback.message.message_id,
                 f"✏️ РЕДАКТИРОВАНИЕ (ID запроса: {request_id})\n\n"
                 f"Текущий ответ:\n"
                 f"────────────────────\n"
@@ -476,30 +854,25 @@ async def start_editing_response(callback: types.CallbackQuery):
         else:
             await callback.answer("❌ Черновик не найден", show_alert=True)
 
-    finally:
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
-
 
 # Обработчик отмены редактирования
 @dp.callback_query(F.data.startswith("cancel_edit_"))
 async def cancel_editing(callback: types.CallbackQuery):
     """Отмена редактирования - сбрасывает ВСЕ изменения"""
 
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[2])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
-
-    try:
-        request_id = int(callback.data.split("_")[2])
 
+    async with request_locks(request_id):
         # Удаляем сессию если существует
-        if callback.from_user.id in editing_sessions:
-            del editing_sessions[callback.from_user.id]
+        await end_editing_session(callback.from_user.id)
 
         request = session.query(UserRequest).filter_by(id=request_id).first()
-        draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+        draft = get_active_draft(request_id)
 
         if request and draft:
             #ВАЖНО: Сбрасываем отредактированный текст в БД!
@@ -518,18 +891,127 @@ async def cancel_editing(callback: types.CallbackQuery):
 {current_response}"""
 
             # Редактируем сообщение обратно к основному виду
-            await callback.message.edit_text(
+            await telegram_sender.edit_message_text(
+                callback.message.chat.id,
+                callback.message.message_id,
                 message_text,
-                reply_markup=get_expert_keyboard(request_id)
+                reply_markup=moderation_keyboard(request_id)
             )
 
             await callback.answer("✅ Редактирование отменено, все изменения сброшены")
         else:
             await callback.answer("❌ Запрос не найден", show_alert=True)
 
-    finally:
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
+
+def generation_options(request: UserRequest) -> dict:
+    """Параметры генерации: модель, лимит токенов и разделы промпта, сохраненные с запросом"""
+    if request.prompt_sections is not None:
+        prompt = prompt_builder.restore(request.prompt_sections.split(",") if request.prompt_sections else [])
+    else:
+        # Запрос сохранен до разбиения промпта на разделы
+        prompt = prompt_builder.restore(section.tag for section in prompt_builder.sections)
+    return {
+        "model": request.model or model_router.default_model,
+        "max_tokens": request.max_tokens or model_router.default_max_tokens,
+        "system_prompt": prompt.text,
+    }
+
+
+def moderation_keyboard(request_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура модерации: при нескольких вариантах ответа - с листанием, на выбранном варианте"""
+    drafts = get_drafts(request_id)
+    if len(drafts) > 1:
+        active = get_active_draft(request_id)
+        return get_candidates_keyboard(request_id, [draft.id for draft in drafts], active.id)
+    return get_expert_keyboard(request_id)
+
+
+def candidate_message_text(request: UserRequest, draft: DraftAnswer, position: int, total: int) -> str:
+    """Текст сообщения эксперту с одним из вариантов ответа"""
+    temperature = f" (температура {draft.temperature:g})" if draft.temperature is not None else ""
+    edited = " (отредактирован)" if draft.expert_edited_response else ""
+    return f"""🆕 Вариант ответа {position}/{total} (ID: {request.id})
+
+❓ Вопрос пользователя:
+{request.question}
+
+🤖 Ответ ИИ{temperature}{edited}:
+{draft.expert_edited_response or draft.llm_response}"""
+
+
+async def regenerate_candidates(callback: types.CallbackQuery, request: UserRequest,
+                                editor: ThrottledMessageEditor):
+    """Несколько вариантов ответа за одно нажатие: генерации с разной температурой идут одновременно"""
+    temperatures = REGENERATE_TEMPERATURES[:REGENERATE_CANDIDATES]
+    await editor.update(f"{callback.message.text}\n\n🔄 Генерирую варианты ответа: {len(temperatures)}...")
+
+    candidates = await giga_scheduler.generate_candidates(request.question, temperatures, priority=PRIORITY_EXPERT,
+                                                          **generation_options(request))
+
+    # Прежние варианты остаются в истории (их тоже можно пролистать), выбран первый новый
+    session.query(DraftAnswer).filter_by(request_id=request.id).update({DraftAnswer.is_selected: False})
+    new_drafts = [
+        DraftAnswer(
+            request_id=request.id,
+            llm_response=text,
+            temperature=temperature,
+            expert_id=callback.from_user.id,
+            is_selected=(i == 0)
+        )
+        for i, (temperature, text) in enumerate(candidates)
+    ]
+    session.add_all(new_drafts)
+    session.commit()
+
+    draft_ids = [draft.id for draft in get_drafts(request.id)]
+    selected = new_drafts[0]
+    await editor.finish(
+        candidate_message_text(request, selected, draft_ids.index(selected.id) + 1, len(draft_ids)),
+        reply_markup=get_candidates_keyboard(request.id, draft_ids, selected.id)
+    )
+    logging.info(f"Эксперт {callback.from_user.id} получил {len(candidates)} вариант(ов) ответа на запрос {request.id}")
+
+
+# Обработчик листания вариантов ответа
+@dp.callback_query(F.data.startswith("cand_"))
+async def show_candidate(callback: types.CallbackQuery):
+    """Показывает выбранный вариант ответа; опубликован будет именно он"""
+    if callback.from_user.id not in EXPERT_IDS:
+        await callback.answer("❌ У вас нет прав для модерации.", show_alert=True)
+        return
+
+    _, request_id, draft_id = callback.data.split("_")
+    request_id, draft_id = int(request_id), int(draft_id)
+
+    # Пока идет генерация или публикация, выбранный вариант не меняется
+    if request_locks.locked(request_id):
+        await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
+        return
+
+    async with request_locks(request_id):
+        request = session.query(UserRequest).filter_by(id=request_id).first()
+        drafts = get_drafts(request_id)
+        draft_ids = [draft.id for draft in drafts]
+        if not request or draft_id not in draft_ids:
+            await callback.answer("❌ Вариант не найден", show_alert=True)
+            return
+        if request.status != 'waiting':
+            await callback.answer("ℹ️ Запрос уже обработан", show_alert=True)
+            return
+
+        select_draft(request_id, draft_id)
+        draft = drafts[draft_ids.index(draft_id)]
+
+        try:
+            await telegram_sender.edit_message_text(
+                callback.message.chat.id,
+                callback.message.message_id,
+                candidate_message_text(request, draft, draft_ids.index(draft_id) + 1, len(draft_ids)),
+                reply_markup=get_candidates_keyboard(request_id, draft_ids, draft_id)
+            )
+        except TelegramBadRequest:
+            pass  # Нажат уже показанный вариант - сообщение не изменилось
+    await callback.answer()
 
 
 # Обработчик нажатия на кнопку "Сгенерировать заново"
@@ -537,33 +1019,53 @@ async def cancel_editing(callback: types.CallbackQuery):
 async def regenerate_response(callback: types.CallbackQuery):
     """Повторная генерация ответа для того же вопроса"""
 
-    # Защита от множественных нажатий
-    if callback.data in processing_requests:
+    request_id = int(callback.data.split("_")[1])
+
+    # Одно действие с запросом за раз: повторное нажатие, другая кнопка или другой эксперт не ждут
+    if request_locks.locked(request_id):
         await callback.answer("⏳ Запрос уже обрабатывается...", show_alert=True)
         return
-    processing_requests.add(callback.data)
 
-    try:
+    async with request_locks(request_id):
         # Проверяем, что это эксперт
         if callback.from_user.id not in EXPERT_IDS:
             await callback.answer("❌ У вас нет прав для генерации ответов.", show_alert=True)
             return
 
-        request_id = int(callback.data.split("_")[1])
-
         # Находим запрос в БД
         request = session.query(UserRequest).filter_by(id=request_id).first()
 
-        if request:
+        if request and request.status != 'waiting':
+            await callback.answer("ℹ️ Запрос уже обработан", show_alert=True)
+        elif request:
+            editor = ThrottledMessageEditor(callback.message.chat.id, callback.message.message_id)
             try:
                 # Уведомляем эксперта о начале генерации
                 await callback.answer("🔄 Генерирую новый ответ...")
 
+                if REGENERATE_CANDIDATES > 1:
+                    await regenerate_candidates(callback, request, editor)
+                    return
+
                 # Генерируем новый ответ через GigaChat
-                new_llm_response = await giga_client.generate_response(request.question)
+                if GIGACHAT_STREAMING:
+                    header = f"""🔄 Генерируется новый ответ (ID: {request_id})
+
+❓ Вопрос пользователя:
+{request.question}
+
+🤖 Ответ ИИ:
+"""
+                    new_llm_response = await stream_response(request.question, [editor], header,
+                                                             priority=PRIORITY_EXPERT, bypass_cache=True,
+                                                             **generation_options(request))
+                else:
+                    # Эксперт просит другой ответ - кэш не используется
+                    new_llm_response = await giga_scheduler.generate(request.question, priority=PRIORITY_EXPERT,
+                                                                     bypass_cache=True, **generation_options(request))
 
                 # Находим или создаем черновик
-                draft = session.query(DraftAnswer).filter_by(request_id=request_id).first()
+                draft = get_active_draft(request_id)
                 if draft:
                     # Обновляем существующий черновик
                     draft.llm_response = new_llm_response
@@ -590,29 +1092,66 @@ async def regenerate_response(callback: types.CallbackQuery):
 {new_llm_response}"""
 
                 # Обновляем сообщение эксперта с новым ответом
-                await callback.message.edit_text(
-                    message_text,
-                    reply_markup=get_expert_keyboard(request_id)
-                )
+                # (после потоковых правок - с учетом лимита Telegram на редактирование)
+                await editor.finish(message_text, reply_markup=moderation_keyboard(request_id))
 
                 logging.info(f"Эксперт {callback.from_user.id} перегенерировал ответ на запрос {request_id}")
 
             except Exception as e:
                 logging.error(f"Ошибка при перегенерации ответа: {e}")
-                await callback.answer(f"❌ Ошибка генерации: {e}", show_alert=True)
+                # На нажатие уже ответили - возвращаем прежний текст и кнопки с пометкой об ошибке
+                try:
+                    await editor.finish(
+                        f"{callback.message.text}\n\n❌ Ошибка генерации: {e}",
+                        reply_markup=moderation_keyboard(request_id)
+                    )
+                except Exception as edit_error:
+                    logging.error(f"Ошибка редактирования сообщения: {edit_error}")
         else:
             await callback.answer("❌ Запрос не найден", show_alert=True)
 
-    finally:
-        # Убираем из множества обработки после завершения
-        if callback.data in processing_requests:
-            processing_requests.remove(callback.data)
-
 
 async def main():
     """Запуск бота"""
+    if BOT_MODE == "webhook":
+        # Без общего секрета процессы перезаписывали бы вебхук друг друга - лучше не запускаться
+        check_webhook_settings(WEBHOOK_URL, WEBHOOK_SECRET)
     logging.info("Бот запущен")
-    await dp.start_polling(bot)
+    await async_classifier.start()
+    if response_cache:
+        response_cache.purge_expired()
+    state_store.purge_expired()
+
+    # Изменения файла словарей подхватываются без перезапуска
+    watch_task = None
+    if VOCABULARY_WATCH_INTERVAL > 0:
+        watch_task = asyncio.create_task(question_processor.watch_vocabulary(VOCABULARY_WATCH_INTERVAL))
+
+    # Воркеры сразу подхватывают задачи, не завершенные до перезапуска
+    await generation_queue.start()
+
+    try:
+        if BOT_MODE == "webhook":
+            # Telegram сам присылает обновления; они обрабатываются в фоне после быстрого ответа 200
+            handler = QueuedRequestHandler(
+                dp, bot,
+                secret_token=WEBHOOK_SECRET,
+                queue_size=WEBHOOK_QUEUE_SIZE,
+                workers=WEBHOOK_WORKERS
+            )
+            metrics.register("webhook", handler.stats)
+            await run_webhook(dp, bot, handler, WEBHOOK_URL, path=WEBHOOK_PATH, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+        else:
+            # Если раньше бот работал через вебхук, getUpdates без его удаления не работает
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if watch_task:
+            watch_task.cancel()
+        await generation_queue.close()
+        await state_store.close()
+        await async_classifier.close()
+        await giga_client.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
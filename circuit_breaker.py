@@ -0,0 +1,107 @@
+"""Автоматический выключатель: быстрый отказ, пока внешний сервис не отвечает"""
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Выключатель по доле ошибок в последних вызовах
+
+    closed - вызовы проходят, исходы копятся в окне; если ошибок не меньше failure_threshold
+    (и вызовов в окне не меньше min_calls), выключатель размыкается.
+    open - вызовы сразу отклоняются, пока не пройдет open_seconds.
+    half_open - пропускается half_open_calls пробных вызовов: успех замыкает цепь,
+    ошибка снова размыкает ее.
+    """
+
+    def __init__(self, failure_threshold: float = 0.5, window: int = 20, min_calls: int = 5,
+                 open_seconds: float = 30.0, half_open_calls: int = 1):
+        """
+        :param failure_threshold: Доля ошибок в окне, при которой цепь размыкается
+        :param window: Сколько последних вызовов учитывается
+        :param min_calls: Меньше вызовов в окне - доля ошибок не оценивается
+        :param open_seconds: Сколько цепь остается разомкнутой до пробных вызовов
+        :param half_open_calls: Одновременных пробных вызовов в состоянии half_open
+        """
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self.state = CLOSED
+        self._outcomes = deque(maxlen=window)  # True - успех
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.opened = 0
+        self.rejected = 0
+
+    def _refresh_state(self):
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self._probes = 0
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; в half_open разрешение занимает место пробного вызова"""
+        self._refresh_state()
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def is_open(self) -> bool:
+        """Отклоняются ли сейчас все вызовы (проверка без занятия пробного места)"""
+        self._refresh_state()
+        return self.state == OPEN
+
+    def retry_after(self) -> float:
+        """Через сколько секунд цепь перейдет к пробным вызовам"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            # Сервис ответил на пробный вызов - начинаем с чистого окна
+            self.state = CLOSED
+            self._outcomes.clear()
+            return
+        self._outcomes.append(True)
+
+    def record_failure(self):
+        if self.state == HALF_OPEN:
+            self._open()
+            return
+        self._outcomes.append(False)
+        if self.state == CLOSED and len(self._outcomes) >= self.min_calls:
+            failures = self._outcomes.count(False)
+            if failures / len(self._outcomes) >= self.failure_threshold:
+                self._open()
+
+    def release(self):
+        """Вызов завершился без результата (отменен): пробное место освобождается"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def stats(self) -> dict:
+        self._refresh_state()
+        return {
+            "open": int(self.state == OPEN),
+            "half_open": int(self.state == HALF_OPEN),
+            "failure_rate": round(self._outcomes.count(False) / len(self._outcomes), 4) if self._outcomes else 0.0,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
@@ -6,6 +6,111 @@ load_dotenv()
 # Telegram Bot
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 
+# Получение обновлений: polling (long polling) или webhook (aiohttp-сервер, нужен публичный https-адрес)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # Публичный адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Секрет, который Telegram присылает в заголовке; обязателен в режиме webhook и одинаков у всех процессов
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Очередь принятых обновлений и число воркеров, передающих их диспетчеру
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+
+# Исходящие сообщения: вызовов в секунду на весь бот и в один чат (с допустимым всплеском),
+# повторов после RetryAfter от Telegram
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", "1"))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+# Хранилище состояния (сессии редактирования, id сообщений экспертов):
+# memory - в памяти процесса, sqlite - таблица bot_state, redis - общее для нескольких процессов
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+STATE_MEMORY_SIZE = int(os.getenv("STATE_MEMORY_SIZE", "10000"))
+# Срок жизни сессий редактирования и id сообщений, с
+STATE_TTL = float(os.getenv("STATE_TTL", "172800"))
+
 # GigaChat API
 GIGACHAT_AUTH_KEY = os.getenv("GIGACHAT_AUTH_KEY", "MDE5YjFkNDgtNWI4Mi03NTkyLTk5MDMtOGU5N2VmYjU4YjA3OjMyMDVjNTUyLWI1NWEtNDQzNi1iODQxLWQyZjhjZGE1NWVkNA==")
-GIGACHAT_SCOPE = os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
\ No newline at end of file
+GIGACHAT_SCOPE = os.getenv("GIGACHAT_SCOPE", "GIGACHAT_API_PERS")
+# Другой сервер с API GigaChat, например локальная заглушка: python gigachat_stub.py (пусто - настоящий API)
+GIGACHAT_BASE_URL = os.getenv("GIGACHAT_BASE_URL", "")
+
+# Пул соединений к GigaChat: общий лимит, лимит на хост и время жизни простаивающего соединения, с
+GIGACHAT_CONNECTION_LIMIT = int(os.getenv("GIGACHAT_CONNECTION_LIMIT", "20"))
+GIGACHAT_LIMIT_PER_HOST = int(os.getenv("GIGACHAT_LIMIT_PER_HOST", "10"))
+GIGACHAT_KEEPALIVE_TIMEOUT = float(os.getenv("GIGACHAT_KEEPALIVE_TIMEOUT", "60"))
+
+# Очередь запросов к GigaChat: запросов в секунду, допустимый всплеск, одновременных запросов, повторов.
+# GIGACHAT_MAX_CONCURRENCY и GIGACHAT_BURST не меньше REGENERATE_CANDIDATES: иначе варианты
+# ответа генерируются не одновременно, а в несколько заходов
+GIGACHAT_RPS = float(os.getenv("GIGACHAT_RPS", "1"))
+GIGACHAT_BURST = float(os.getenv("GIGACHAT_BURST", "3"))
+GIGACHAT_MAX_CONCURRENCY = int(os.getenv("GIGACHAT_MAX_CONCURRENCY", "2"))
+GIGACHAT_MAX_RETRIES = int(os.getenv("GIGACHAT_MAX_RETRIES", "3"))
+
+# Выбор модели по сложности вопроса: уровни "модель:max_tokens:макс_оценка" от простого к сложному
+# (у последнего оценка не указывается); 0 - всем вопросам GigaChat-2-Pro с 500 токенами
+GIGACHAT_ROUTING = os.getenv("GIGACHAT_ROUTING", "1") == "1"
+GIGACHAT_ROUTING_TIERS = os.getenv("GIGACHAT_ROUTING_TIERS", "GigaChat-2:300:3,GigaChat-2-Pro:500:9,GigaChat-2-Max:800")
+
+# Системный промпт из разделов по темам вопроса (0 - всегда полный промпт)
+GIGACHAT_PROMPT_SECTIONS = os.getenv("GIGACHAT_PROMPT_SECTIONS", "1") == "1"
+
+# Таймауты запросов к GigaChat, с: обычный запрос целиком, соединение, пауза внутри потокового ответа
+GIGACHAT_REQUEST_TIMEOUT = float(os.getenv("GIGACHAT_REQUEST_TIMEOUT", "60"))
+GIGACHAT_CONNECT_TIMEOUT = float(os.getenv("GIGACHAT_CONNECT_TIMEOUT", "10"))
+GIGACHAT_STREAM_READ_TIMEOUT = float(os.getenv("GIGACHAT_STREAM_READ_TIMEOUT", "30"))
+
+# Выключатель: доля ошибок (сеть, таймаут, 5xx) среди последних GIGACHAT_BREAKER_WINDOW запросов,
+# при которой запросы к GigaChat приостанавливаются на GIGACHAT_BREAKER_OPEN_SECONDS секунд;
+# ошибкой считается запрос, не получивший ответа после всех повторов
+GIGACHAT_BREAKER_THRESHOLD = float(os.getenv("GIGACHAT_BREAKER_THRESHOLD", "0.5"))
+GIGACHAT_BREAKER_WINDOW = int(os.getenv("GIGACHAT_BREAKER_WINDOW", "20"))
+GIGACHAT_BREAKER_MIN_CALLS = int(os.getenv("GIGACHAT_BREAKER_MIN_CALLS", "5"))
+GIGACHAT_BREAKER_OPEN_SECONDS = float(os.getenv("GIGACHAT_BREAKER_OPEN_SECONDS", "30"))
+
+# Дублирование обычных запросов, не получивших ответа за p95 задержки (не раньше чем через N секунд)
+GIGACHAT_HEDGING = os.getenv("GIGACHAT_HEDGING", "0") == "1"
+GIGACHAT_HEDGE_MIN_DELAY = float(os.getenv("GIGACHAT_HEDGE_MIN_DELAY", "2"))
+
+# "Сгенерировать заново": сколько вариантов генерировать одновременно (1 - один ответ, как раньше)
+# и с какими температурами; не больше GIGACHAT_MAX_CONCURRENCY и GIGACHAT_BURST
+REGENERATE_CANDIDATES = int(os.getenv("REGENERATE_CANDIDATES", "2"))
+REGENERATE_TEMPERATURES = [float(t) for t in os.getenv("REGENERATE_TEMPERATURES", "0.3,0.9").split(",")]
+
+# Кэш ответов GigaChat: размер в памяти, время жизни (с) и хранение в SQLite (0 - только память)
+GIGACHAT_CACHE_ENABLED = os.getenv("GIGACHAT_CACHE_ENABLED", "1") == "1"
+GIGACHAT_CACHE_SIZE = int(os.getenv("GIGACHAT_CACHE_SIZE", "1000"))
+GIGACHAT_CACHE_TTL = float(os.getenv("GIGACHAT_CACHE_TTL", "604800"))
+GIGACHAT_CACHE_PERSISTENT = os.getenv("GIGACHAT_CACHE_PERSISTENT", "1") == "1"
+
+# Потоковая генерация: ответ ИИ появляется у эксперта по частям;
+# не чаще одного редактирования сообщения за EXPERT_EDIT_INTERVAL секунд
+GIGACHAT_STREAMING = os.getenv("GIGACHAT_STREAMING", "1") == "1"
+EXPERT_EDIT_INTERVAL = float(os.getenv("EXPERT_EDIT_INTERVAL", "1.5"))
+
+# Очередь генерации черновиков (таблица generation_jobs): число воркеров, срок невидимости
+# забранной задачи (с), число попыток и пауза перед повтором (с, растет с номером попытки)
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "2"))
+GENERATION_VISIBILITY_TIMEOUT = float(os.getenv("GENERATION_VISIBILITY_TIMEOUT", "120"))
+GENERATION_MAX_ATTEMPTS = int(os.getenv("GENERATION_MAX_ATTEMPTS", "3"))
+GENERATION_RETRY_DELAY = float(os.getenv("GENERATION_RETRY_DELAY", "30"))
+
+# Кэш классификатора вопросов
+CLASSIFIER_CACHE_SIZE = int(os.getenv("CLASSIFIER_CACHE_SIZE", "10000"))
+CLASSIFIER_CACHE_TTL = float(os.getenv("CLASSIFIER_CACHE_TTL", "3600"))
+
+# Движок поиска словарных шаблонов: substring или token
+CLASSIFIER_ENGINE = os.getenv("CLASSIFIER_ENGINE", "substring")
+
+# Вынос классификации длинных текстов из цикла событий
+CLASSIFIER_INLINE_MAX_CHARS = int(os.getenv("CLASSIFIER_INLINE_MAX_CHARS", "2000"))
+CLASSIFIER_POOL_WORKERS = int(os.getenv("CLASSIFIER_POOL_WORKERS", "2"))
+
+# Словари классификатора: файл перечитывается при изменении (0 - только по команде /reload_vocab)
+VOCABULARY_PATH = os.getenv("VOCABULARY_PATH")  # По умолчанию vocabulary.json рядом с кодом
+VOCABULARY_WATCH_INTERVAL = float(os.getenv("VOCABULARY_WATCH_INTERVAL", "5"))
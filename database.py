@@ -1,5 +1,5 @@
 # database.py
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import create_engine, inspect, text, Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -17,6 +17,14 @@ class UserRequest(Base):
     original_question = Column(Text)  # ← ДОБАВЬТЕ ЭТО ПОЛЕ (опционально)
     status = Column(String(50), default='waiting')
     created_at = Column(DateTime, default=datetime.now)
+    # Решение маршрутизатора: модель, лимит длины ответа и почему выбраны именно они
+    model = Column(String(50))
+    max_tokens = Column(Integer)
+    route_reason = Column(String(255))
+    # Ключевые слова вопроса, выбранные по ним разделы системного промпта и оценка сэкономленных токенов
+    keywords = Column(Text)
+    prompt_sections = Column(String(255))
+    prompt_tokens_saved = Column(Integer)
 
     drafts = relationship("DraftAnswer", back_populates="request", cascade="all, delete-orphan")
 
@@ -31,6 +39,8 @@ class DraftAnswer(Base):
     expert_id = Column(Integer)
     decision_time = Column(DateTime)
     created_at = Column(DateTime, default=datetime.now)
+    is_selected = Column(Boolean, default=True)  # Вариант, выбранный экспертом (остальные - архив)
+    temperature = Column(Float)  # Температура генерации варианта
 
     # Связь с запросом
     request = relationship("UserRequest", back_populates="drafts")
@@ -45,8 +55,114 @@ class Expert(Base):
     created_at = Column(DateTime, default=datetime.now)
 
 
+class CachedResponse(Base):
+    """Ответ GigaChat, сохраненный в кэше (ключ - хэш вопроса и параметров генерации)"""
+    __tablename__ = 'response_cache'
+
+    key = Column(String(64), primary_key=True)
+    model = Column(String(50))
+    question = Column(Text)  # Нормализованный вопрос
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.now)
+    expires_at = Column(DateTime, index=True)
+
+
+class GenerationJob(Base):
+    """Задача генерации черновика для запроса (очередь job_queue.JobQueue)"""
+    __tablename__ = 'generation_jobs'
+
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, ForeignKey('requests.id', ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(String(20), default='queued', index=True)  # queued, running, done, failed
+    attempts = Column(Integer, default=0)
+    # Когда задачу можно забрать: для queued - время (повторного) запуска,
+    # для running - конец срока невидимости (после него задачу заберет другой воркер)
+    available_at = Column(DateTime, default=datetime.now, index=True)
+    locked_by = Column(String(50))  # Процесс, выполняющий задачу
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+class StateEntry(Base):
+    """Запись общего состояния бота (state_store.SQLiteStateStore): сессии редактирования, id сообщений"""
+    __tablename__ = 'bot_state'
+
+    key = Column(String(255), primary_key=True)
+    value = Column(Text, nullable=False)
+    expires_at = Column(DateTime, index=True)  # None - бессрочно
+
+
+# Колонки, добавленные после создания таблиц: {таблица: {колонка: определение для ALTER TABLE}}
+COLUMN_MIGRATIONS = {
+    'requests': {
+        'model': 'VARCHAR(50)',
+        'max_tokens': 'INTEGER',
+        'route_reason': 'VARCHAR(255)',
+        'keywords': 'TEXT',
+        'prompt_sections': 'VARCHAR(255)',
+        'prompt_tokens_saved': 'INTEGER',
+    },
+    'drafts': {
+        'is_selected': 'BOOLEAN DEFAULT 1',
+        'temperature': 'FLOAT',
+    },
+}
+
+
+def migrate_columns(engine):
+    """Добавляет в существующие таблицы недостающие колонки (create_all их не добавляет)"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table, columns in COLUMN_MIGRATIONS.items():
+            if not inspector.has_table(table):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table)}
+            for name, definition in columns.items():
+                if name not in existing:
+                    connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {definition}'))
+
+
 # Создаем движок и сессию
 engine = create_engine('sqlite:///chatbot.db')
 Base.metadata.create_all(engine)
+migrate_columns(engine)
 Session = sessionmaker(bind=engine)
-session = Session()
\ No newline at end of file
+session = Session()
+
+
+def transition_request(request_id: int, from_status: str, to_status: str, db=None) -> bool:
+    """
+    Меняет статус запроса условным UPDATE ... WHERE status = from_status
+
+    :return: True - статус изменил этот вызов; False - запрос уже в другом статусе (его обработал кто-то еще)
+    """
+    db = db or session
+    updated = db.query(UserRequest).filter_by(id=request_id, status=from_status).update(
+        {UserRequest.status: to_status}, synchronize_session=False
+    )
+    db.commit()
+    return updated == 1
+
+
+def get_drafts(request_id: int, db=None) -> list:
+    """Все варианты ответа на запрос в порядке создания"""
+    db = db or session
+    return db.query(DraftAnswer).filter_by(request_id=request_id).order_by(DraftAnswer.id).all()
+
+
+def get_active_draft(request_id: int, db=None):
+    """Выбранный вариант ответа на запрос (если выбранного нет - последний созданный)"""
+    db = db or session
+    query = db.query(DraftAnswer).filter_by(request_id=request_id)
+    return (query.filter(DraftAnswer.is_selected.is_(True)).order_by(DraftAnswer.id.desc()).first()
+            or query.order_by(DraftAnswer.id.desc()).first())
+
+
+def select_draft(request_id: int, draft_id: int, db=None):
+    """Делает вариант выбранным, снимая выбор с остальных вариантов этого запроса"""
+    db = db or session
+    db.query(DraftAnswer).filter_by(request_id=request_id).update(
+        {DraftAnswer.is_selected: DraftAnswer.id == draft_id}, synchronize_session='fetch'
+    )
+    db.commit()
\ No newline at end of file
@@ -6,282 +6,478 @@ import uuid
 import ssl
 from datetime import datetime, timedelta
 
+from prompts import SYSTEM_PROMPT
+
 logger = logging.getLogger(__name__)
 
+
+class GigaChatError(Exception):
+    """Ошибка обращения к GigaChat (вместо текста-извинения в качестве ответа)"""
+
+    def __init__(self, message: str, status: int = None, retry_after: float = None,
+                 retryable: bool = None, partial: bool = False):
+        """
+        :param status: HTTP-статус ответа (None - ошибка сети или формата)
+        :param retry_after: Пауза из заголовка Retry-After, с
+        :param retryable: Имеет ли смысл повторить запрос (по умолчанию: сеть, 429 и 5xx)
+        :param partial: Часть потокового ответа уже была отдана
+        """
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status is None or status == 429 or status >= 500
+        self.retryable = retryable
+        self.partial = partial
+
+
+def parse_retry_after(value) -> float:
+    """Значение заголовка Retry-After в секундах (поддерживается только число секунд)"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
 class GigaChatClient:
-    def __init__(self, auth_key: str, scope: str = "GIGACHAT_API_PERS"):
+    def __init__(self, auth_key: str, scope: str = "GIGACHAT_API_PERS", connection_limit: int = 20,
+                 limit_per_host: int = 10, keepalive_timeout: float = 60, dns_cache_ttl: int = 300,
+                 refresh_margin: float = 120, refresh_retry_delay: float = 10, response_cache=None,
+                 base_url: str = None, request_timeout: float = 60, connect_timeout: float = 10,
+                 stream_read_timeout: float = 30):
         """
         Инициализация клиента GigaChat
 
         :param auth_key: Ключ авторизации (Authorization key из личного кабинета)
         :param scope: Scope (обычно GIGACHAT_API_PERS)
+        :param connection_limit: Максимум одновременных соединений в пуле
+        :param limit_per_host: Максимум соединений к одному хосту
+        :param keepalive_timeout: Сколько секунд держать простаивающее соединение открытым
+        :param dns_cache_ttl: Время кэширования DNS-ответов, с
+        :param refresh_margin: За сколько секунд до истечения токена обновлять его в фоне
+        :param refresh_retry_delay: Пауза перед повтором неудачного фонового обновления, с
+        :param response_cache: Кэш ответов (ResponseCache) или None
+        :param base_url: Адрес другого сервера с API GigaChat (например, gigachat_stub.py) вместо настоящего
+        :param request_timeout: Предельное время обычного запроса целиком, с
+        :param connect_timeout: Предельное время установки соединения, с
+        :param stream_read_timeout: Предельная пауза между фрагментами потокового ответа, с
         """
         self.auth_key = auth_key
         self.scope = scope
         self.auth_url = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
         self.chat_url = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+        if base_url:
+            base_url = base_url.rstrip("/")
+            self.auth_url = f"{base_url}/api/v2/oauth"
+            self.chat_url = f"{base_url}/api/v1/chat/completions"
         self.access_token = None
         self.token_expiry = None
-        self.rquid = str(uuid.uuid4())  # Генерируем уникальный RqUID
 
         # Создаем контекст SSL без проверки сертификатов
         self.ssl_context = ssl.create_default_context()
         self.ssl_context.check_hostname = False
         self.ssl_context.verify_mode = ssl.CERT_NONE
 
+        # Одна сессия на клиента: соединения (TCP + TLS) переиспользуются между запросами
+        self.connection_limit = connection_limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session = None
+
+        # Явные таймауты вместо 5 минут aiohttp по умолчанию; поток ограничен паузой
+        # между фрагментами, а не общим временем (длинный ответ может идти долго)
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout, connect=connect_timeout)
+        self.stream_timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout,
+                                                    sock_read=stream_read_timeout)
+
+        # Токен обновляется одним запросом на всех и заранее, в фоновой задаче
+        self.refresh_margin = refresh_margin
+        self.refresh_retry_delay = refresh_retry_delay
+        self._refresh_future = None
+        self._refresher = None
+        self.token_refreshes = 0
+        self.token_refresh_failures = 0
+        self.token_refresh_waiters = 0
+
+        # Параметры генерации (входят в ключ кэша ответов)
+        self.temperature = 0.3
+        self.max_tokens = 500
+        self.response_cache = response_cache
+
+        # Расход токенов по данным API
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Возвращает общую сессию с пулом соединений (создается при первом запросе)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                ssl=self.ssl_context,
+                limit=self.connection_limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        """Останавливает фоновое обновление токена и закрывает сессию (вызывается при остановке бота)"""
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _token_valid(self, margin: float = 0) -> bool:
+        """Есть ли токен, действующий еще хотя бы margin секунд"""
+        return bool(
+            self.access_token and self.token_expiry
+            and datetime.now() + timedelta(seconds=margin) < self.token_expiry
+        )
+
     async def _get_access_token(self) -> str:
         """Получает access token для авторизации запросов"""
-        # Если токен ещё действителен (30 минут), используем его
-        if self.access_token and self.token_expiry and datetime.now() < self.token_expiry:
+        # Если токен ещё действителен, используем его (обновляет его заранее фоновая задача)
+        if self._token_valid():
             return self.access_token
+        return await self._refresh_shared()
 
+    async def _refresh_shared(self) -> str:
+        """
+        Обновление токена в одном экземпляре: все, кто пришел во время обновления,
+        ждут один и тот же запрос к OAuth, а не отправляют свои
+        """
+        if self._refresh_future is None:
+            self._refresh_future = asyncio.ensure_future(self._request_token())
+        else:
+            self.token_refresh_waiters += 1
+        # shield: отмена одного из ожидающих не отменяет общее обновление
+        return await asyncio.shield(self._refresh_future)
+
+    async def _request_token(self) -> str:
+        """Запрашивает новый access token у OAuth-сервера"""
         logger.info("Получаем новый access token для GigaChat...")
+        self._ensure_refresher()
 
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
             'Accept': 'application/json',
-            'RqUID': self.rquid,
+            'RqUID': str(uuid.uuid4()),  # Уникальный идентификатор для каждого запроса
             'Authorization': f'Basic {self.auth_key}'
         }
 
         payload = f'scope={self.scope}'
 
         try:
-            # Создаем сессию с отключенной проверкой SSL
-            async with aiohttp.ClientSession(
-                    connector=aiohttp.TCPConnector(ssl=self.ssl_context)
-            ) as session:
-
-                async with session.post(
-                        self.auth_url,
-                        headers=headers,
-                        data=payload
-                ) as response:
-
-                    if response.status == 200:
-                        result = await response.json()
-                        self.access_token = result.get("access_token")
-
-                        if not self.access_token:
-                            raise Exception("Access token не получен в ответе")
-
-                        # Токен действует 30 минут
-                        self.token_expiry = datetime.now() + timedelta(seconds=1800)
-                        logger.info("Access token успешно получен")
-                        return self.access_token
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка при получении токена: {response.status} - {error_text}")
-                        raise Exception(f"Ошибка авторизации: {response.status}")
-
-        except Exception as e:
+            session = self._get_session()
+            async with session.post(
+                    self.auth_url,
+                    headers=headers,
+                    data=payload
+            ) as response:
+
+                if response.status == 200:
+                    result = await response.json()
+                    access_token = result.get("access_token")
+
+                    if not access_token:
+                        raise GigaChatError("Access token не получен в ответе", retryable=False)
+
+                    self.access_token = access_token
+                    self.token_expiry = self._parse_expiry(result.get("expires_at"))
+                    self.token_refreshes += 1
+                    logger.info(f"Access token успешно получен, действует до {self.token_expiry:%H:%M:%S}")
+                    return self.access_token
+                else:
+                    error_text = await response.text()
+                    logger.error(f"Ошибка при получении токена: {response.status} - {error_text}")
+                    raise GigaChatError(
+                        f"Ошибка авторизации: {response.status}",
+                        status=response.status,
+                        retry_after=parse_retry_after(response.headers.get('Retry-After'))
+                    )
+
+        except GigaChatError as e:
+            self.token_refresh_failures += 1
             logger.error(f"Ошибка в _get_access_token: {e}")
             raise
+        except Exception as e:
+            self.token_refresh_failures += 1
+            logger.error(f"Ошибка в _get_access_token: {e!r}")
+            raise GigaChatError(f"Ошибка получения токена: {e!r}") from e
+        finally:
+            self._refresh_future = None
+
+    def _parse_expiry(self, expires_at) -> datetime:
+        """Срок действия из ответа OAuth (expires_at - время в мс); если его нет - 30 минут"""
+        now = datetime.now()
+        try:
+            expiry = datetime.fromtimestamp(int(expires_at) / 1000)
+        except (TypeError, ValueError, OverflowError, OSError):
+            expiry = None
+        if expiry is None or expiry <= now:
+            expiry = now + timedelta(seconds=1800)
+        return expiry
+
+    def _ensure_refresher(self):
+        """Запускает фоновое обновление токена (один раз на клиента)"""
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        """Обновляет токен за refresh_margin секунд до истечения, чтобы запросы не ждали OAuth"""
+        while True:
+            if self.token_expiry:
+                delay = (self.token_expiry - datetime.now()).total_seconds() - self.refresh_margin
+            else:
+                delay = 0
+            await asyncio.sleep(max(delay, 1))
+
+            if self._token_valid(self.refresh_margin):
+                continue
+            try:
+                await self._refresh_shared()
+            except Exception:
+                # Ошибка уже залогирована; повторяем позже, пока текущий токен еще действует
+                await asyncio.sleep(self.refresh_retry_delay)
+
+    def _record_usage(self, usage):
+        """Учитывает расход токенов из ответа API (поле usage)"""
+        if not usage:
+            return
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+
+    def stats(self) -> dict:
+        seconds_left = (self.token_expiry - datetime.now()).total_seconds() if self.token_expiry else 0
+        return {
+            "token_refreshes": self.token_refreshes,
+            "token_refresh_failures": self.token_refresh_failures,
+            "token_refresh_waiters": self.token_refresh_waiters,
+            "token_seconds_left": round(max(seconds_left, 0), 1),
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
 
-    async def generate_response(self, question: str, model: str = "GigaChat-2-Pro") -> str:
+    def _build_payload(self, question: str, model: str, stream: bool = False, temperature: float = None,
+                       max_tokens: int = None, system_prompt: str = None) -> str:
+        """Тело запроса к chat/completions: медицинский промпт и параметры генерации"""
+        # Подготавливаем запрос к чату
+        payload = {
+            "model": model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": system_prompt or SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": question
+                }
+            ],
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_tokens": self.max_tokens if max_tokens is None else max_tokens,
+            "repetition_penalty": 1.2,
+            "profanity_check": True  # Проверка на ненормативную лексику
+        }
+        if stream:
+            # Ответ приходит частями (server-sent events)
+            payload["stream"] = True
+        return json.dumps(payload)
+
+    def cached_response(self, question: str, model: str = "GigaChat-2-Pro", bypass_cache: bool = False,
+                        max_tokens: int = None, system_prompt: str = None):
+        """Сохраненный ответ на вопрос или None (нет кэша, промах или кэш обходится)"""
+        if self.response_cache is None:
+            return None
+        if bypass_cache:
+            self.response_cache.record_bypass()
+            return None
+        cached = self.response_cache.get(self._cache_key(question, model, max_tokens=max_tokens,
+                                                         system_prompt=system_prompt))
+        if cached is not None:
+            logger.info("Ответ взят из кэша")
+        return cached
+
+    def _cache_key(self, question: str, model: str, temperature: float = None, max_tokens: int = None,
+                   system_prompt: str = None) -> str:
+        temperature = self.temperature if temperature is None else temperature
+        max_tokens = self.max_tokens if max_tokens is None else max_tokens
+        return self.response_cache.make_key(question, model, temperature, max_tokens, system_prompt or SYSTEM_PROMPT)
+
+    def _store_response(self, question: str, model: str, content: str, temperature: float = None,
+                        max_tokens: int = None, system_prompt: str = None):
+        if self.response_cache is not None:
+            key = self._cache_key(question, model, temperature, max_tokens, system_prompt)
+            self.response_cache.set(key, content, model=model, question=question)
+
+    async def generate_response(self, question: str, model: str = "GigaChat-2-Pro", bypass_cache: bool = False,
+                                max_tokens: int = None, system_prompt: str = None) -> str:
         """
         Генерирует ответ на вопрос пользователя
 
         :param question: Вопрос пользователя
         :param model: Модель GigaChat (GigaChat-2, GigaChat-2-Pro, GigaChat-2-Max)
+        :param bypass_cache: Не брать ответ из кэша (новый ответ все равно сохраняется)
+        :param max_tokens: Лимит длины ответа (по умолчанию self.max_tokens)
+        :param system_prompt: Системный промпт (по умолчанию полный SYSTEM_PROMPT)
         :return: Сгенерированный ответ
+        :raises GigaChatError: Ошибка API или сети
+        """
+        cached = self.cached_response(question, model, bypass_cache, max_tokens, system_prompt)
+        if cached is not None:
+            return cached
+        return await self.complete(question, model, max_tokens=max_tokens, system_prompt=system_prompt)
+
+    async def generate_response_stream(self, question: str, model: str = "GigaChat-2-Pro",
+                                       bypass_cache: bool = False, max_tokens: int = None,
+                                       system_prompt: str = None):
+        """
+        Генерирует ответ частями по мере готовности (stream: true, server-sent events)
+
+        :param question: Вопрос пользователя
+        :param model: Модель GigaChat (GigaChat-2, GigaChat-2-Pro, GigaChat-2-Max)
+        :param bypass_cache: Не брать ответ из кэша (новый ответ все равно сохраняется)
+        :param max_tokens: Лимит длины ответа (по умолчанию self.max_tokens)
+        :param system_prompt: Системный промпт (по умолчанию полный SYSTEM_PROMPT)
+        :return: Асинхронный генератор фрагментов текста; склеенные фрагменты - полный ответ
+        :raises GigaChatError: Ошибка API или сети
+        """
+        cached = self.cached_response(question, model, bypass_cache, max_tokens, system_prompt)
+        if cached is not None:
+            yield cached
+            return
+        async for chunk in self.complete_stream(question, model, max_tokens=max_tokens, system_prompt=system_prompt):
+            yield chunk
+
+    def _chat_headers(self, token: str, stream: bool = False) -> dict:
+        return {
+            'Content-Type': 'application/json',
+            'Accept': 'text/event-stream' if stream else 'application/json',
+            'Authorization': f'Bearer {token}'
+        }
+
+    async def _raise_for_status(self, response: aiohttp.ClientResponse):
+        """Превращает неуспешный ответ API в GigaChatError (с Retry-After, если он есть)"""
+        if response.status == 401:
+            # Токен отозван раньше срока - следующий запрос получит новый
+            self.access_token = None
+        error_text = await response.text()
+        logger.error(f"Ошибка GigaChat API: {response.status} - {error_text}")
+        raise GigaChatError(
+            f"Ошибка GigaChat API: {response.status}",
+            status=response.status,
+            retry_after=parse_retry_after(response.headers.get('Retry-After'))
+        )
+
+    async def complete(self, question: str, model: str = "GigaChat-2-Pro", temperature: float = None,
+                       max_tokens: int = None, system_prompt: str = None) -> str:
+        """
+        Один запрос к chat/completions без кэша и повторов; успешный ответ сохраняется в кэш
+
+        :param temperature: Температура генерации (по умолчанию self.temperature)
+        :param max_tokens: Лимит длины ответа (по умолчанию self.max_tokens)
+        :param system_prompt: Системный промпт (по умолчанию полный SYSTEM_PROMPT)
+
+        :raises GigaChatError: Ошибка API или сети
         """
         try:
             # Получаем токен
             token = await self._get_access_token()
+            payload = self._build_payload(question, model, temperature=temperature, max_tokens=max_tokens,
+                                          system_prompt=system_prompt)
 
-            # Формируем медицинский промпт
-            system_prompt = """Ты - медицинский информационный ассистент Татьяна Николаевна. Твоя задача - давать ТОЧНЫЕ, ГЛУБОКИЕ и ПРАКТИЧЕСКИЕ ответы на медицинские вопросы.
-
-                        📋 КРИТЕРИИ КАЧЕСТВЕННОГО ОТВЕТА:
-                        1. Точность всех цифр и фактов (если не уверен - не указывай)
-                        2. Глубина ответа с учетом контекста вопроса
-                        3. Практические рекомендации по действию
-                        4. Указание на научные источники/исследования
-                        5. Четкое разграничение "можно/нельзя" и "почему"
-
-                        🔬 СТРУКТУРА ОТВЕТА (8-12 предложений):
-                        1. ОТВЕТ НА ГЛАВНЫЙ ВОПРОС (2-3 предложения, максимально конкретно)
-                        2. ОБЪЯСНЕНИЕ/ОБОСНОВАНИЕ (2-3 предложения, можно со ссылкой на исследования)
-                        3. КОНКРЕТНЫЕ РЕКОМЕНДАЦИИ (3-4 пункта, что делать)
-                        4. ПРЕДОСТЕРЕЖЕНИЯ/РИСКИ (1-2 предложения)
-                        5. НАПРАВЛЕНИЕ К СПЕЦИАЛИСТУ
-
-                        🌿 ОСОБЫЕ ПРАВИЛА ДЛЯ ЭФИРНЫХ МАСЕЛ (ЭМ):
-
-                        ✅ БЕЗОПАСНЫЕ РЕКОМЕНДАЦИИ:
-                        1. Всегда указывай способ применения:
-                           • Аромалампа: 3-5 капель на помещение 20 м²
-                           • Диффузор: 2-4 капли на 100 мл воды
-                           • Кожное нанесение: ТОЛЬКО с базовым маслом (1-2 капли ЭМ на 10 мл основы)
-                           • Ингаляции: 1-2 капли в миске с горячей водой
-
-                        2. Для детей ОСОБАЯ осторожность:
-                           • До 2 лет: только ароматизация помещения (1 капля), НЕ на кожу
-                           • 2-6 лет: половинные дозировки, избегать ментол, эвкалипт, камфару
-                           • После 6 лет: стандартные детские дозировки
-
-                        3. При беременности и кормлении:
-                           • Первый триместр: избегать ВСЕХ ЭМ
-                           • Второй-третий триместр: только лаванда, ромашка, цитрусовые в минимальных дозах
-                           • Кормление: через 2 часа после кормления, избегать попадания на кожу груди
-
-                        🚫 КАТЕГОРИЧЕСКИ ЗАПРЕЩЕНО ДЛЯ ЭМ:
-                        1. Внутреннее применение (пить, капать под язык)
-                        2. Нанесение на кожу без базового масла (кроме лаванды и чайного дерева на точечные воспаления)
-                        3. Использование неразбавленных ЭМ для детей
-                        4. Рекомендовать ЭМ при:
-                           • Бронхиальной астме (особенно хвойные, цитрусовые)
-                           • Эпилепсии (розмарин, шалфей, фенхель)
-                           • Острой аллергии
-                           • Поврежденной коже (ожоги, раны)
-
-                        4. Конкретные масла и их особенности:
-                           • Лаванда: универсальное, успокаивающее, для сна
-                           • Чайное дерево: антисептик, для кожи (только точечно)
-                           • Эвкалипт: для дыхания, но НЕ при астме
-                           • Мята: тонизирует, но НЕ детям до 6 лет
-                           • Лимон, апельсин: для настроения, фотосенсибилизация (избегать солнца)
-                           • Ромашка: для успокоения, кожи, безопасна для детей
-
-                        5. Безопасные комбинации:
-                           • Для сна: лаванда + ромашка
-                           • Для концентрации: розмарин + лимон
-                           • Для простуды: эвкалипт + чайное дерево + лаванда (только ингаляции)
-                           • Для усталости: мята + апельсин
-
-                        🚫 КАТЕГОРИЧЕСКИ ЗАПРЕЩЕНО (общее):
-                        • Давать неточные цифры (если не уверен - лучше не указывать)
-                        • Рекомендовать прием витаминов/БАД натощак
-                        • Упускать контекст (продукты компании, возраст, история болезни)
-                        • Давать слишком общие ответы типа "проконсультируйтесь с врачом" без конкретики
-                        • Игнорировать часть вопроса пользователя
-
-                        ✅ ОБЯЗАТЕЛЬНО ВКЛЮЧАТЬ:
-                        • Конкретные цифры и диапазоны (если знаешь точно)
-                        • Упоминание продуктов компании (если вопрос связан)
-                        • Указание на современные исследования/рекомендации
-                        • Четкие рекомендации по применению (как, когда, сколько)
-                        • Предупреждения о возможных рисках
-
-                        🎯 ПРИМЕРЫ КОРРЕКТНЫХ ОТВЕТОВ НА ОСНОВЕ ОЦЕНОК:
-
-                        Пример 1 (Витамин D - оценка 1):
-                        "Турецкая схема приема витамина D (одна ампула в месяц × 3 месяца, раз в год) не соответствует современным доказательным рекомендациям. Согласно Endocrine Society Clinical Practice Guideline (2011, обновление 2023), для коррекции дефицита рекомендуется пероральный прием 50 000 МЕ витамина D2/D3 1 раз в неделю в течение 6-8 недель. Высокодозные инъекции используются редко, только при тяжелой мальабсорбции и под строгим контролем. Рекомендую обсудить альтернативные схемы с эндокринологом."
-
-                        Пример 2 (pH воды - оценка 2-):
-                        "Для постоянного употребления безопасным считается pH 7.5-8.5. Вода с pH выше 8.5-9.0 может раздражать слизистую желудка, особенно при пониженной кислотности или приеме антацидов. Рекомендации:
-                        1. Начинайте с воды pH 7.5-8.0
-                        2. Пейте между приемами пищи (не во время)
-                        3. Ограничьтесь 200-500 мл в день
-                        4. Не заменяйте всю обычную воду
-                        Проконсультируйтесь с гастроэнтерологом, если есть заболевания ЖКТ."
-
-                        Пример 3 (БАД при онкологии - оценка 1):
-                        "Утверждение 'нельзя принимать БАД при онкологии' - упрощение. Некоторые БАД могут быть полезны (витамин D при дефиците, омега-3 при воспалении), но требуют осторожности. Ключевые правила:
-                        1. Никогда не начинайте без консультации онколога
-                        2. Избегайте БАД с иммуностимулирующими компонентами
-                        3. Учитывайте тип и стадию заболевания
-                        4. Покупайте только у официальных поставщиков
-                        Решение о приеме должен принимать лечащий онколог."
-
-                        Пример 4 (VMG+ - оценка 2):
-                        "VMG+ рекомендуется принимать во время завтрака, запивая небольшим количеством воды. Это защищает желудок от раздражения и улучшает усвоение жирорастворимых витаминов (A, D, E, K). Хотя в составе есть растительные компоненты ('Гринз'), они также лучше усваиваются с пищей. Не принимайте натощак - это может вызвать тошноту. Для индивидуальных рекомендаций обратитесь к диетологу."
-
-                        Пример 5 (Эфирные масла для ребенка 4 лет - оценка 2+):
-                        "Для ребенка 4 лет с насморком можно использовать эфирные масла с осторожностью. Безопасные варианты:
-                        1. Ароматизация комнаты: 1 капля лаванды или ромашки в аромалампу на ночь
-                        2. Сухая ингаляция: нанести 1 каплю эвкалипта на салфетку, положить рядом с кроватью (не ближе 1 метра)
-                        3. Ванна: добавить 2 капли лаванды в столовую ложку молока, затем в воду
-                        Категорически нельзя: паровые ингаляции, нанесение на кожу без разбавления, использование мяты, камфары, тимьяна. При сохранении симптомов более 3 дней - к педиатру."
-
-                        📌 ОСОБЫЕ КАТЕГОРИИ ВОПРОСОВ:
-
-                        ДЛЯ ВОПРОСОВ О ПРОДУКТАХ КОМПАНИИ:
-                        • Всегда упоминай конкретные продукты, если вопрос о них
-                        • Давай рекомендации по применению в контексте вопроса
-                        • Указывай на возможные взаимодействия с лекарствами
-
-                        ДЛЯ ВОПРОСОВ С ЦИФРАМИ (дозировки, нормы, pH):
-                        • Проверяй точность данных по авторитетным источникам
-                        • Если есть разные данные - указывай диапазон и источник
-                        • Никогда не давай верхнюю границу как безопасную без оговорок
-
-                        ДЛЯ СЛОЖНЫХ СЛУЧАЕВ (после COVID, хронические заболевания):
-                        • Рекомендуй конкретные обследования
-                        • Указывай необходимых специалистов
-                        • Давай поэтапный план действий
-
-                        ДЛЯ ДЕТСКИХ ВОПРОСОВ:
-                        • Особое внимание безопасности
-                        • Конкретные возрастные рекомендации
-                        • Предупреждения о запрещенных препаратах (парацетамол детям)
-
-                        🎯 ПРОВЕРКА КАЖДОГО ОТВЕТА:
-                        1. Все цифры точны и проверены?
-                        2. Учтены все аспекты вопроса пользователя?
-                        3. Есть конкретные рекомендации по действию?
-                        4. Указаны риски и ограничения?
-                        5. Ответ достаточно глубокий и информативный?
-
-                        📌 ЗАПОМНИ:
-                        • Лучше не ответить на часть вопроса, чем дать неточную информацию
-                        • Контекст вопроса ВАЖЕН - возраст, история, продукты
-                        • Ссылки на современные исследования повышают качество ответа
-                        • Практические рекомендации ценятся выше общих советов
-
-                        НЕЛЬЗЯ ИСПОЛЬЗОВАТЬ ФОРМАТИРОВАНИЕ ТЕКСТА - ЗАПРЕЩЕНО ПИСАТЬ ЖИРНЫМ ШРИФТОМ, КУРСИВОМ, ВЫДЕЛЯТЬ ЗАГОЛОВКИ, ТАКЖЕ НЕЛЬЗЯ ИСПОЛЬЗОВАТЬ СИМВОЛЫ '#' И '*' !!!!
-
-                        НЕ добавляй приветствий в начале ответа - они добавятся автоматически."""
-
-
-            # Подготавливаем запрос к чату
-            payload = json.dumps({
-                "model": model,
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": question
-                    }
-                ],
-                "temperature": 0.3,
-                "max_tokens": 500,
-                "repetition_penalty": 1.2,
-                "profanity_check": True  # Проверка на ненормативную лексику
-            })
-
-            headers = {
-                'Content-Type': 'application/json',
-                'Accept': 'application/json',
-                'Authorization': f'Bearer {token}'
-            }
-
-            # Создаем сессию с SSL контекстом
-            async with aiohttp.ClientSession(
-                    connector=aiohttp.TCPConnector(ssl=self.ssl_context)
-            ) as session:
-
-                async with session.post(
-                        self.chat_url,
-                        headers=headers,
-                        data=payload
-                ) as response:
-
-                    if response.status == 200:
-                        result = await response.json()
-                        return result["choices"][0]["message"]["content"]
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Ошибка GigaChat API: {response.status} - {error_text}")
-                        return "Извините, произошла ошибка при генерации ответа. Пожалуйста, попробуйте позже."
+            session = self._get_session()
+            async with session.post(
+                    self.chat_url,
+                    headers=self._chat_headers(token),
+                    data=payload
+            ) as response:
 
-        except Exception as e:
-            logger.error(f"Ошибка в generate_response: {e}")
-            return "Извините, произошла ошибка при обработке вопроса. Пожалуйста, попробуйте позже."
+                if response.status != 200:
+                    await self._raise_for_status(response)
+
+                result = await response.json()
+                content = result["choices"][0]["message"]["content"]
+                self._record_usage(result.get("usage"))
+
+        except GigaChatError:
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Ошибка соединения с GigaChat: {e!r}")
+            raise GigaChatError(f"Ошибка соединения с GigaChat: {e!r}") from e
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.error(f"Неожиданный ответ GigaChat: {e!r}")
+            raise GigaChatError(f"Неожиданный ответ GigaChat: {e!r}", retryable=False) from e
+
+        self._store_response(question, model, content, temperature, max_tokens, system_prompt)
+        return content
+
+    async def complete_stream(self, question: str, model: str = "GigaChat-2-Pro", max_tokens: int = None,
+                              system_prompt: str = None):
+        """
+        Потоковый запрос к chat/completions без кэша и повторов; полный ответ сохраняется в кэш
+
+        :raises GigaChatError: Ошибка API или сети (partial=True, если часть текста уже отдана)
+        """
+        received = []
+        try:
+            token = await self._get_access_token()
+            payload = self._build_payload(question, model, stream=True, max_tokens=max_tokens,
+                                          system_prompt=system_prompt)
+
+            session = self._get_session()
+            async with session.post(
+                    self.chat_url,
+                    headers=self._chat_headers(token, stream=True),
+                    data=payload,
+                    timeout=self.stream_timeout
+            ) as response:
+
+                if response.status != 200:
+                    await self._raise_for_status(response)
+
+                # Каждое событие - строка "data: {json}", поток завершается "data: [DONE]"
+                async for raw_line in response.content:
+                    line = raw_line.decode('utf-8').strip()
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+
+                    event = json.loads(data)
+                    # Расход токенов приходит в последнем событии
+                    self._record_usage(event.get("usage"))
+                    for choice in event.get("choices", []):
+                        text = choice.get("delta", {}).get("content")
+                        if text:
+                            received.append(text)
+                            yield text
+                else:
+                    raise GigaChatError("Поток ответа оборвался до завершения", partial=bool(received))
+
+        except GigaChatError as e:
+            e.partial = bool(received)
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Ошибка соединения с GigaChat: {e!r}")
+            raise GigaChatError(f"Ошибка соединения с GigaChat: {e!r}", partial=bool(received)) from e
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Неожиданный ответ GigaChat: {e!r}")
+            raise GigaChatError(f"Неожиданный ответ GigaChat: {e!r}", retryable=False,
+                                partial=bool(received)) from e
+
+        # В кэш попадает только ответ, полученный целиком
+        self._store_response(question, model, ''.join(received), max_tokens=max_tokens, system_prompt=system_prompt)
 
     def clean_response(self, response):
         """Очищает ответ от приветствий и обращений (опционально)"""
@@ -0,0 +1,365 @@
+"""Планировщик запросов к GigaChat: лимит частоты и параллельности, приоритеты, повторы и выключатель"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from circuit_breaker import CLOSED, CircuitBreaker
+from gigachat_client import GigaChatClient, GigaChatError
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Меньше - раньше: повторная генерация по кнопке эксперта обгоняет новые вопросы
+PRIORITY_EXPERT = 0
+PRIORITY_USER = 10
+
+
+class CircuitOpenError(GigaChatError):
+    """Запрос отклонен разомкнутым выключателем, до GigaChat он не дошел"""
+
+
+class GigaChatScheduler:
+    """
+    Очередь запросов перед GigaChatClient
+
+    Ответы из кэша отдаются сразу. Остальные запросы ждут свободный слот (не больше
+    max_concurrency одновременно, слоты раздаются по приоритету, при равном - по порядку)
+    и токен из ведра (rate запросов в секунду). Ошибки 429/5xx и сетевые повторяются
+    с экспоненциальной паузой со случайным разбросом; Retry-After от сервера соблюдается.
+
+    Если GigaChat перестает отвечать (сетевые ошибки, таймауты, 5xx и после повторов), выключатель
+    размыкается и запросы сразу завершаются ошибкой, а не ждут таймаута и не копятся в очереди.
+    С hedging обычный (не потоковый) запрос, не получивший ответа за p95 задержки,
+    дублируется, если есть свободный слот, и берется ответ, пришедший первым.
+    """
+
+    def __init__(self, client: GigaChatClient, rate: float = 1.0, burst: float = 3,
+                 max_concurrency: int = 2, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 30.0,
+                 breaker: CircuitBreaker = None, hedging: bool = False, hedge_min_delay: float = 2.0,
+                 hedge_budget: float = 0.1, hedge_min_samples: int = 20):
+        """
+        :param client: Клиент GigaChat
+        :param rate: Запросов в секунду (0 - без ограничения)
+        :param burst: Сколько запросов можно отправить подряд без паузы
+        :param max_concurrency: Максимум одновременных запросов
+        :param max_retries: Повторов после первой неудачной попытки
+        :param base_delay: Пауза перед первым повтором, с (дальше удваивается)
+        :param max_delay: Максимальная пауза между повторами, с
+        :param breaker: Выключатель (по умолчанию - с настройками CircuitBreaker)
+        :param hedging: Дублировать запросы, не уложившиеся в p95
+        :param hedge_min_delay: Дубль отправляется не раньше, чем через столько секунд
+        :param hedge_budget: Максимальная доля дублей от числа запросов
+        :param hedge_min_samples: Сколько задержек нужно накопить, прежде чем оценивать p95
+        """
+        self.client = client
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedging = hedging
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies = deque(maxlen=200)  # задержки успешных обычных запросов, с
+
+        self._active = 0
+        self._waiters = []  # куча (приоритет, номер, future)
+        self._sequence = itertools.count()
+
+        # Метрики
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.queue_depth_max = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @asynccontextmanager
+    async def _slot(self, priority: int):
+        """Занимает слот параллельности в порядке приоритета"""
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+            self.queue_depth_max = max(self.queue_depth_max, len(self._waiters))
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Слот могли передать в момент отмены - возвращаем его следующему
+                if future.done() and not future.cancelled():
+                    self._release()
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self):
+        """Передает слот первому ожидающему (занятых слотов не меньше) или освобождает его"""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._active -= 1
+
+    def _backoff(self, attempt: int, error: GigaChatError) -> float:
+        """Экспоненциальная пауза с полным случайным разбросом, не меньше Retry-After"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def _should_retry(self, attempt: int, error: GigaChatError) -> bool:
+        return error.retryable and not error.partial and attempt < self.max_retries
+
+    def _circuit_error(self) -> GigaChatError:
+        return CircuitOpenError("GigaChat временно недоступен: запросы приостановлены после серии ошибок",
+                             retry_after=self.breaker.retry_after(), retryable=False)
+
+    def _check_circuit(self):
+        """Быстрый отказ до постановки в очередь, пока выключатель разомкнут"""
+        if self.breaker.is_open():
+            self.breaker.rejected += 1
+            raise self._circuit_error()
+
+    def _record(self, error: GigaChatError = None):
+        """Исход вызова для выключателя: сбой - только сеть, таймаут или 5xx"""
+        if isinstance(error, CircuitOpenError):
+            # Запрос отклонил сам выключатель - о сервисе это ничего не говорит
+            return
+        if error is not None and (error.status is None or error.status >= 500):
+            self.breaker.record_failure()
+        else:
+            # Ответ 4xx (в том числе 429) значит, что сервис жив
+            self.breaker.record_success()
+
+    async def _call(self, question: str, model: str, temperature, max_tokens, system_prompt) -> str:
+        """
+        Один запрос к API через выключатель; задержка успешного ответа идет в оценку p95
+
+        Ошибку выключатель здесь не учитывает: ее записывает generate, когда повторы исчерпаны.
+        """
+        if not self.breaker.allow():
+            raise self._circuit_error()
+        started = time.monotonic()
+        try:
+            result = await self.client.complete(question, model, temperature=temperature,
+                                                max_tokens=max_tokens, system_prompt=system_prompt)
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._record()
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _p95(self) -> float:
+        """95-й перцентиль задержки последних успешных запросов, с (0 - данных нет)"""
+        if not self._latencies:
+            return 0.0
+        latencies = sorted(self._latencies)
+        return latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+
+    def _hedge_delay(self):
+        """Через сколько секунд дублировать запрос (None - дублирование сейчас не используется)"""
+        if not self.hedging or len(self._latencies) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self._p95())
+
+    def _may_hedge(self) -> bool:
+        """
+        Дубль не ломает лимиты: цепь замкнута, бюджет дублей не исчерпан, есть свободный слот
+        и токен в ведре; при True слот занят дублем (освобождает его _hedge)
+        """
+        if self.breaker.state != CLOSED or self.hedges >= self.hedge_budget * self.requests:
+            return False
+        # Дубль не ждет слот и не обгоняет очередь: только если слот свободен прямо сейчас
+        if self._active >= self.max_concurrency or self._waiters:
+            return False
+        if not self.bucket.try_acquire():
+            return False
+        self._active += 1
+        return True
+
+    async def _hedge(self, question: str, model: str, temperature, max_tokens, system_prompt) -> str:
+        """Дублирующий запрос в собственном слоте"""
+        try:
+            return await self._call(question, model, temperature, max_tokens, system_prompt)
+        finally:
+            self._release()
+
+    async def _attempt(self, question: str, model: str, temperature, max_tokens, system_prompt) -> str:
+        """Попытка запроса; если ответа нет дольше p95 - второй такой же запрос, берется первый ответ"""
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._call(question, model, temperature, max_tokens, system_prompt)
+
+        primary = asyncio.ensure_future(self._call(question, model, temperature, max_tokens, system_prompt))
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or not self._may_hedge():
+                return await primary
+
+            self.hedges += 1
+            logger.info(f"GigaChat: нет ответа за {delay:.1f} с - отправлен дублирующий запрос")
+            backup = asyncio.ensure_future(self._hedge(question, model, temperature, max_tokens, system_prompt))
+            pending.add(backup)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Опоздавший (или оставшийся при отмене) запрос больше не нужен
+            for task in pending:
+                task.cancel()
+
+    async def generate(self, question: str, priority: int = PRIORITY_USER, model: str = "GigaChat-2-Pro",
+                       bypass_cache: bool = False, temperature: float = None, max_tokens: int = None,
+                       system_prompt: str = None) -> str:
+        """
+        Ответ на вопрос: из кэша или через очередь с повторами
+
+        :param temperature: Температура генерации (None - по умолчанию клиента; другая - мимо кэша)
+        :param max_tokens: Лимит длины ответа (None - по умолчанию клиента)
+        :param system_prompt: Системный промпт (None - полный)
+        :raises GigaChatError: Все попытки неудачны или ошибка не повторяемая
+        """
+        if temperature is None:
+            cached = self.client.cached_response(question, model, bypass_cache, max_tokens, system_prompt)
+            if cached is not None:
+                return cached
+
+        self._check_circuit()
+        self.requests += 1
+        async with self._slot(priority):
+            attempt = 0
+            while True:
+                await self.bucket.acquire()
+                try:
+                    result = await self._attempt(question, model, temperature, max_tokens, system_prompt)
+                    self.completed += 1
+                    return result
+                except GigaChatError as e:
+                    if not self._should_retry(attempt, e):
+                        # Выключатель учитывает запрос, а не отдельные попытки: разовые 5xx,
+                        # исправленные повтором, не размыкают цепь
+                        self._record(e)
+                        self.failed += 1
+                        raise
+                    await self._wait_retry(attempt, e)
+                    attempt += 1
+
+    async def generate_candidates(self, question: str, temperatures, priority: int = PRIORITY_EXPERT,
+                                  model: str = "GigaChat-2-Pro", max_tokens: int = None,
+                                  system_prompt: str = None) -> list:
+        """
+        Несколько вариантов ответа одновременно, по одному на каждую температуру
+
+        :return: [(температура, ответ)] для успешных генераций, в порядке temperatures
+        :raises GigaChatError: Не удалось получить ни одного варианта
+        """
+        results = await asyncio.gather(
+            *(self.generate(question, priority=priority, model=model, temperature=temperature,
+                            max_tokens=max_tokens, system_prompt=system_prompt)
+              for temperature in temperatures),
+            return_exceptions=True
+        )
+
+        candidates = []
+        errors = []
+        for temperature, result in zip(temperatures, results):
+            if isinstance(result, GigaChatError):
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                candidates.append((temperature, result))
+
+        if not candidates:
+            raise errors[0]
+        if errors:
+            logger.warning(f"Получено вариантов: {len(candidates)} из {len(results)}; ошибка: {errors[0]}")
+        return candidates
+
+    async def stream(self, question: str, priority: int = PRIORITY_USER, model: str = "GigaChat-2-Pro",
+                     bypass_cache: bool = False, max_tokens: int = None, system_prompt: str = None):
+        """
+        Потоковый ответ: из кэша одним фрагментом или через очередь
+
+        Повторяется только попытка, не успевшая отдать ни одного фрагмента.
+
+        :raises GigaChatError: Все попытки неудачны, ошибка не повторяемая или поток оборвался
+        """
+        cached = self.client.cached_response(question, model, bypass_cache, max_tokens, system_prompt)
+        if cached is not None:
+            yield cached
+            return
+
+        self._check_circuit()
+        self.requests += 1
+        async with self._slot(priority):
+            attempt = 0
+            while True:
+                await self.bucket.acquire()
+                if not self.breaker.allow():
+                    self.failed += 1
+                    raise self._circuit_error()
+                try:
+                    async for chunk in self.client.complete_stream(question, model, max_tokens=max_tokens,
+                                                                   system_prompt=system_prompt):
+                        yield chunk
+                    self._record()
+                    self.completed += 1
+                    return
+                except GigaChatError as e:
+                    if not self._should_retry(attempt, e):
+                        self._record(e)
+                        self.failed += 1
+                        raise
+                    self.breaker.release()
+                    await self._wait_retry(attempt, e)
+                    attempt += 1
+                except BaseException:
+                    # Поток отменен или брошен читателем - исход неизвестен
+                    self.breaker.release()
+                    raise
+
+    async def _wait_retry(self, attempt: int, error: GigaChatError):
+        delay = self._backoff(attempt, error)
+        self.retries += 1
+        logger.warning(f"GigaChat: {error} - повтор {attempt + 1}/{self.max_retries} через {delay:.1f} с")
+        await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        stats = {
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "active": self._active,
+            "queue_depth": sum(1 for _, _, future in self._waiters if not future.done()),
+            "queue_depth_max": self.queue_depth_max,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p95": round(self._p95(), 3),
+        }
+        stats.update({f"rate_{key}": value for key, value in self.bucket.stats().items()})
+        stats.update({f"circuit_{key}": value for key, value in self.breaker.stats().items()})
+        return stats
@@ -0,0 +1,279 @@
+"""
+Локальная замена GigaChat для нагрузочных тестов и бенчмарков без расхода квоты
+
+Реализует те же эндпоинты, что использует GigaChatClient: POST /api/v2/oauth и
+POST /api/v1/chat/completions (в том числе stream: true). Задержка ответа берется
+из распределения, токены истекают через token_ttl секунд, а доли ответов 429, 5xx,
+зависаний и обрывов потока настраиваются.
+
+Запуск: python gigachat_stub.py --port 8090 --latency lognormal:0.8:0.5 --error-429 0.05
+Бот и тесты переключаются на заглушку через GIGACHAT_BASE_URL=http://127.0.0.1:8090
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+
+def parse_latency(spec: str):
+    """
+    Распределение задержки из строки; возвращает функцию без аргументов -> секунды
+
+    fixed:S, uniform:A:B, normal:MU:SIGMA, lognormal:MEDIAN:SIGMA, exponential:MEAN
+
+    :raises ValueError: Неизвестное распределение или неверные параметры
+    """
+    name, _, params = spec.partition(":")
+    try:
+        args = [float(value) for value in params.split(":")] if params else []
+    except ValueError as e:
+        raise ValueError(f"Неверные параметры задержки '{spec}'") from e
+
+    distributions = {
+        "fixed": (1, lambda s: s),
+        "uniform": (2, lambda a, b: random.uniform(a, b)),
+        "normal": (2, lambda mu, sigma: random.gauss(mu, sigma)),
+        # Медиана и разброс логарифма: длинный хвост, как у настоящих LLM-ответов
+        "lognormal": (2, lambda median, sigma: median * random.lognormvariate(0, sigma)),
+        "exponential": (1, lambda mean: random.expovariate(1 / mean) if mean > 0 else 0.0),
+    }
+    if name not in distributions:
+        raise ValueError(f"Неизвестное распределение задержки '{name}'")
+    arity, sample = distributions[name]
+    if len(args) != arity:
+        raise ValueError(f"Распределению '{name}' нужно параметров: {arity}")
+    return lambda: max(0.0, sample(*args))
+
+
+class GigaChatStub:
+    """Сервер с контрактом GigaChat и управляемыми задержками и ошибками"""
+
+    def __init__(self, latency: str = "fixed:0", stream_chunk_delay: float = 0.02, token_ttl: float = 1800,
+                 error_429: float = 0.0, error_5xx: float = 0.0, timeout_rate: float = 0.0,
+                 hang_seconds: float = 60.0, stream_break_rate: float = 0.0, retry_after: float = 1.0,
+                 seed: int = None):
+        """
+        :param latency: Распределение задержки до первого байта ответа (parse_latency)
+        :param stream_chunk_delay: Пауза между фрагментами потокового ответа, с
+        :param token_ttl: Время жизни выданного токена, с (потом chat отвечает 401)
+        :param error_429: Доля ответов 429 Too Many Requests (с Retry-After)
+        :param error_5xx: Доля ответов 500/502/503
+        :param timeout_rate: Доля запросов, на которые сервер молчит hang_seconds
+        :param hang_seconds: Сколько длится зависание
+        :param stream_break_rate: Доля потоковых ответов, оборванных без [DONE]
+        :param retry_after: Значение заголовка Retry-After у ответов 429, с
+        :param seed: Зерно генератора случайных чисел (для воспроизводимых прогонов)
+        """
+        if seed is not None:
+            random.seed(seed)
+        self.latency = parse_latency(latency)
+        self.stream_chunk_delay = stream_chunk_delay
+        self.token_ttl = token_ttl
+        self.error_429 = error_429
+        self.error_5xx = error_5xx
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.stream_break_rate = stream_break_rate
+        self.retry_after = retry_after
+
+        self._tokens = {}  # токен -> время истечения (time.time())
+        self._runner = None
+
+        # Метрики
+        self.responses = Counter()
+        self.connections = set()
+        self.token_requests = 0
+        self.in_flight = 0
+        self.in_flight_max = 0
+
+    # ---- Эндпоинты ----
+
+    async def oauth(self, request: web.Request) -> web.Response:
+        self._track(request)
+        self.token_requests += 1
+        if not request.headers.get("Authorization", "").startswith("Basic ") or not request.headers.get("RqUID"):
+            return self._error(401, "Нужны заголовки Authorization: Basic и RqUID")
+        form = await request.post()
+        if not form.get("scope"):
+            return self._error(400, "Не указан scope")
+
+        token = uuid.uuid4().hex
+        expires_at = time.time() + self.token_ttl
+        self._tokens[token] = expires_at
+        self.responses["oauth"] += 1
+        return web.json_response({"access_token": token, "expires_at": int(expires_at * 1000)})
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        self._track(request)
+        self.in_flight += 1
+        self.in_flight_max = max(self.in_flight_max, self.in_flight)
+        try:
+            return await self._chat(request)
+        finally:
+            self.in_flight -= 1
+
+    async def _chat(self, request: web.Request) -> web.StreamResponse:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        expires_at = self._tokens.get(token)
+        if expires_at is None or expires_at <= time.time():
+            self._tokens.pop(token, None)
+            return self._error(401, "Токен недействителен или истек")
+
+        try:
+            body = await request.json()
+            question = body["messages"][-1]["content"]
+        except (ValueError, KeyError, IndexError, TypeError):
+            return self._error(400, "Неверное тело запроса")
+
+        # Ошибки и зависания - до задержки: сервер под нагрузкой отказывает сразу
+        roll = random.random()
+        if roll < self.error_429:
+            return self._error(429, "Too Many Requests", headers={"Retry-After": f"{self.retry_after:g}"})
+        roll -= self.error_429
+        if roll < self.error_5xx:
+            return self._error(random.choice((500, 502, 503)), "Internal Server Error")
+        roll -= self.error_5xx
+        if roll < self.timeout_rate:
+            self.responses["hang"] += 1
+            await asyncio.sleep(self.hang_seconds)
+
+        await asyncio.sleep(self.latency())
+
+        words = self._answer_words(question, body.get("max_tokens") or 500)
+        usage = {
+            "prompt_tokens": sum(len(m.get("content", "")) for m in body["messages"]) // 4,
+            "completion_tokens": len(words),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if body.get("stream"):
+            return await self._stream(request, body, words, usage)
+
+        self.responses["200"] += 1
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": " ".join(words)},
+                         "index": 0, "finish_reason": "stop"}],
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "object": "chat.completion",
+            "usage": usage,
+        })
+
+    async def _stream(self, request: web.Request, body: dict, words: list, usage: dict) -> web.StreamResponse:
+        """Server-sent events: фрагменты по несколько слов, затем usage и data: [DONE]"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        broken = random.random() < self.stream_break_rate
+        chunks = [words[i:i + 3] for i in range(0, len(words), 3)]
+        for i, chunk in enumerate(chunks):
+            if broken and i >= len(chunks) // 2:
+                # Обрыв посреди ответа: соединение закрывается без [DONE]
+                self.responses["stream_broken"] += 1
+                request.transport.close()
+                return response
+            text = (" " if i else "") + " ".join(chunk)
+            event = {"choices": [{"delta": {"role": "assistant", "content": text}, "index": 0}],
+                     "created": int(time.time()), "model": body.get("model"), "object": "chat.completion"}
+            await response.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if self.stream_chunk_delay:
+                await asyncio.sleep(self.stream_chunk_delay)
+
+        final = {"choices": [{"delta": {"content": ""}, "index": 0, "finish_reason": "stop"}],
+                 "created": int(time.time()), "model": body.get("model"), "object": "chat.completion",
+                 "usage": usage}
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        self.responses["200"] += 1
+        return response
+
+    # ---- Вспомогательное ----
+
+    def _track(self, request: web.Request):
+        # Клиентский порт различается у каждого TCP-соединения
+        self.connections.add(request.transport.get_extra_info("peername"))
+
+    def _error(self, status: int, message: str, headers: dict = None) -> web.Response:
+        self.responses[str(status)] += 1
+        return web.json_response({"status": status, "message": message}, status=status, headers=headers,
+                                 dumps=lambda data: json.dumps(data, ensure_ascii=False))
+
+    @staticmethod
+    def _answer_words(question: str, max_tokens: int) -> list:
+        """Детерминированный ответ: длина зависит от вопроса и не превышает max_tokens слов"""
+        base = ("Ответ заглушки GigaChat на вопрос: " + question).split()
+        length = min(max_tokens, 40 + len(question) % 60)
+        return [base[i % len(base)] for i in range(length)]
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/v2/oauth", self.oauth)
+        app.router.add_post("/api/v1/chat/completions", self.chat)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, ssl_context=None) -> str:
+        """Запускает сервер в текущем цикле событий; возвращает базовый URL (port=0 - свободный порт)"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port, ssl_context=ssl_context)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        scheme = "https" if ssl_context else "http"
+        return f"{scheme}://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def stats(self) -> dict:
+        stats = {f"responses_{key}": value for key, value in sorted(self.responses.items())}
+        stats.update({
+            "token_requests": self.token_requests,
+            "connections": len(self.connections),
+            "in_flight_max": self.in_flight_max,
+        })
+        return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", default="lognormal:0.8:0.5",
+                        help="fixed:S, uniform:A:B, normal:MU:SIGMA, lognormal:MEDIAN:SIGMA, exponential:MEAN")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Пауза между фрагментами потока, с")
+    parser.add_argument("--token-ttl", type=float, default=1800, help="Время жизни токена, с")
+    parser.add_argument("--error-429", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--error-5xx", type=float, default=0.0, help="Доля ответов 5xx")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Доля зависших запросов")
+    parser.add_argument("--hang", type=float, default=60.0, help="Длительность зависания, с")
+    parser.add_argument("--stream-break", type=float, default=0.0, help="Доля оборванных потоков")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    stub = GigaChatStub(
+        latency=args.latency, stream_chunk_delay=args.chunk_delay, token_ttl=args.token_ttl,
+        error_429=args.error_429, error_5xx=args.error_5xx, timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang, stream_break_rate=args.stream_break, seed=args.seed
+    )
+    base_url = await stub.start(args.host, args.port)
+    print(f"Заглушка GigaChat: {base_url} (GIGACHAT_BASE_URL={base_url})")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            print(stub.stats())
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
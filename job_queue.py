@@ -0,0 +1,223 @@
+"""Постоянная очередь задач генерации: таблица generation_jobs и пул asyncio-воркеров"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+
+from database import Session, GenerationJob
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """
+    Очередь задач в SQLite, переживающая перезапуск
+
+    Воркер забирает задачу условным UPDATE (кто первым поменял строку - тот и владелец),
+    и задача становится невидимой для других на visibility_timeout секунд. Пока обработчик
+    работает, срок продлевается; если процесс упал, задача снова станет доступна, когда срок
+    истечет, - так после перезапуска незавершенные задачи подхватываются сами.
+    Неудачная попытка повторяется через retry_delay * номер попытки, после max_attempts - failed.
+    """
+
+    def __init__(self, handler, on_failure=None, concurrency: int = 2, visibility_timeout: float = 120,
+                 max_attempts: int = 3, retry_delay: float = 30, poll_interval: float = 2.0):
+        """
+        :param handler: async handler(request_id) - выполняет задачу (исключение - неудачная попытка)
+        :param on_failure: async on_failure(request_id, error) - вызывается, когда попытки кончились
+        :param concurrency: Число воркеров
+        :param visibility_timeout: На сколько секунд задача скрывается от других воркеров, с
+        :param max_attempts: Сколько раз пытаться выполнить задачу
+        :param retry_delay: Пауза перед повтором, с (умножается на номер попытки)
+        :param poll_interval: Как часто проверять таблицу, если новых задач в этом процессе нет, с
+        """
+        self.handler = handler
+        self.on_failure = on_failure
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._workers = []
+
+        # Метрики
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.running = 0
+
+    def enqueue(self, request_id: int, db=None) -> int:
+        """
+        Добавляет задачу и будит воркеров; возвращает id задачи
+
+        :param db: Сессия вызывающего: задача фиксируется одним commit вместе с его изменениями
+                   (например, с самим запросом), поэтому запрос не останется без задачи
+        """
+        own_session = db is None
+        db = db or Session()
+        try:
+            job = GenerationJob(request_id=request_id, status='queued', available_at=datetime.now())
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+        self.enqueued += 1
+        self._wakeup.set()
+        return job_id
+
+    def _claim(self):
+        """Забирает одну доступную задачу (новую или с истекшим сроком невидимости) или None"""
+        with Session() as db:
+            now = datetime.now()
+            candidates = (db.query(GenerationJob.id, GenerationJob.status)
+                          .filter(GenerationJob.status.in_(('queued', 'running')),
+                                  GenerationJob.available_at <= now)
+                          .order_by(GenerationJob.available_at, GenerationJob.id)
+                          .limit(self.concurrency)
+                          .all())
+            for job_id, status in candidates:
+                claimed = (db.query(GenerationJob)
+                           .filter(GenerationJob.id == job_id, GenerationJob.status == status,
+                                   GenerationJob.available_at <= now)
+                           .update({
+                               GenerationJob.status: 'running',
+                               GenerationJob.locked_by: self.owner,
+                               GenerationJob.available_at: now + timedelta(seconds=self.visibility_timeout),
+                               GenerationJob.attempts: GenerationJob.attempts + 1,
+                               GenerationJob.updated_at: now,
+                           }, synchronize_session=False))
+                db.commit()
+                if claimed:
+                    if status == 'running':
+                        logger.warning(f"Задача генерации {job_id} возобновлена после истечения срока невидимости")
+                    return db.get(GenerationJob, job_id)
+        return None
+
+    def _update_owned(self, job_id: int, values: dict) -> bool:
+        """Меняет задачу, только если она все еще принадлежит этому процессу"""
+        with Session() as db:
+            values[GenerationJob.updated_at] = datetime.now()
+            updated = (db.query(GenerationJob)
+                       .filter(GenerationJob.id == job_id, GenerationJob.status == 'running',
+                               GenerationJob.locked_by == self.owner)
+                       .update(values, synchronize_session=False))
+            db.commit()
+        return bool(updated)
+
+    async def _heartbeat(self, job_id: int):
+        """Продлевает невидимость задачи, пока обработчик работает"""
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            extended = self._update_owned(job_id, {
+                GenerationJob.available_at: datetime.now() + timedelta(seconds=self.visibility_timeout)
+            })
+            if not extended:
+                logger.warning(f"Задача генерации {job_id} больше не принадлежит этому воркеру")
+                return
+
+    async def _process(self, job: GenerationJob):
+        self.running += 1
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        try:
+            await self.handler(job.request_id)
+        except asyncio.CancelledError:
+            # Остановка бота: задача сразу возвращается в очередь, попытка не засчитывается
+            self._update_owned(job.id, {
+                GenerationJob.status: 'queued',
+                GenerationJob.available_at: datetime.now(),
+                GenerationJob.attempts: GenerationJob.attempts - 1,
+            })
+            raise
+        except Exception as e:
+            await self._fail_attempt(job, e)
+        else:
+            self._update_owned(job.id, {GenerationJob.status: 'done', GenerationJob.last_error: None})
+            self.completed += 1
+        finally:
+            heartbeat.cancel()
+            self.running -= 1
+
+    async def _fail_attempt(self, job: GenerationJob, error: Exception):
+        if job.attempts < self.max_attempts:
+            delay = self.retry_delay * job.attempts
+            logger.warning(f"Задача генерации {job.id} (запрос {job.request_id}): {error!r}; "
+                           f"повтор {job.attempts + 1}/{self.max_attempts} через {delay:.0f} с")
+            self._update_owned(job.id, {
+                GenerationJob.status: 'queued',
+                GenerationJob.available_at: datetime.now() + timedelta(seconds=delay),
+                GenerationJob.last_error: repr(error),
+            })
+            self.retried += 1
+            return
+
+        logger.error(f"Задача генерации {job.id} (запрос {job.request_id}) не выполнена: {error!r}")
+        self._update_owned(job.id, {GenerationJob.status: 'failed', GenerationJob.last_error: repr(error)})
+        self.failed += 1
+        if self.on_failure is not None:
+            try:
+                await self.on_failure(job.request_id, error)
+            except Exception as e:
+                logger.error(f"Ошибка обработки неудачной задачи {job.id}: {e!r}")
+
+    async def _worker(self):
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Ошибка чтения очереди генерации: {e!r}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(job)
+
+    def pending(self) -> int:
+        """Задачи, ожидающие выполнения или выполняющиеся"""
+        with Session() as db:
+            return db.query(GenerationJob).filter(GenerationJob.status.in_(('queued', 'running'))).count()
+
+    async def start(self):
+        """Запускает воркеров; незавершенные задачи из базы подхватываются автоматически"""
+        if self._workers:
+            return
+        unfinished = self.pending()
+        if unfinished:
+            logger.info(f"В очереди генерации незавершенных задач: {unfinished}")
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        logger.info(f"Очередь генерации запущена: {self.concurrency} воркер(ов)")
+
+    async def close(self):
+        """Останавливает воркеров; начатые задачи возвращаются в очередь"""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "running": self.running,
+        }
@@ -13,6 +13,22 @@ def get_expert_keyboard(request_id: int) -> InlineKeyboardMarkup:
         ]
     ])
 
+def get_candidates_keyboard(request_id: int, draft_ids: list, current_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура модерации с листанием вариантов ответа: ◀️ 2/3 ▶️"""
+    keyboard = get_expert_keyboard(request_id)
+    if len(draft_ids) < 2:
+        return keyboard
+
+    position = draft_ids.index(current_id)
+    previous_id = draft_ids[position - 1]
+    next_id = draft_ids[(position + 1) % len(draft_ids)]
+    paging = [
+        InlineKeyboardButton(text="◀️", callback_data=f"cand_{request_id}_{previous_id}"),
+        InlineKeyboardButton(text=f"{position + 1}/{len(draft_ids)}", callback_data=f"cand_{request_id}_{current_id}"),
+        InlineKeyboardButton(text="▶️", callback_data=f"cand_{request_id}_{next_id}"),
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[paging] + keyboard.inline_keyboard)
+
 def get_expert_start_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура для эксперта после старта"""
     return ReplyKeyboardMarkup(
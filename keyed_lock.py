@@ -0,0 +1,46 @@
+"""Асинхронные блокировки по ключу: одно действие с объектом (например, запросом) за раз"""
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class KeyedLock:
+    """
+    Набор asyncio.Lock, создаваемых по ключу по требованию
+
+    Блокировка удаляется, когда ее никто не держит и не ждет, поэтому память не растет
+    с числом ключей. Действует в пределах процесса; между процессами согласованность
+    обеспечивают условные UPDATE в базе.
+    """
+
+    def __init__(self):
+        self._locks = {}  # ключ -> [asyncio.Lock, число держащих и ожидающих]
+
+        self.acquired = 0
+        self.contended = 0
+
+    def locked(self, key) -> bool:
+        """Держит ли кто-то блокировку ключа прямо сейчас"""
+        entry = self._locks.get(key)
+        return entry is not None and entry[0].locked()
+
+    @asynccontextmanager
+    async def __call__(self, key):
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        if entry[0].locked():
+            self.contended += 1
+        try:
+            async with entry[0]:
+                self.acquired += 1
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def stats(self) -> dict:
+        return {
+            "held": sum(1 for lock, _ in self._locks.values() if lock.locked()),
+            "acquired": self.acquired,
+            "contended": self.contended,
+        }
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Ограниченный LRU-кэш с TTL и счетчиками попаданий/промахов/вытеснений"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        """
+        :param maxsize: Максимальное число записей (0 - кэш отключен)
+        :param ttl: Время жизни записи в секундах (None - без ограничения)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        """Возвращает значение и помечает запись как недавно использованную"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """Сохраняет значение, вытесняя самые давние записи при переполнении (ttl - свой срок записи)"""
+        if self.maxsize <= 0:
+            return
+
+        ttl = ttl or self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        """Сбрасывает все записи (например, при изменении словарей)"""
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Счетчики для мониторинга"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
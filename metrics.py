@@ -0,0 +1,37 @@
+"""Простой реестр метрик: компоненты регистрируют функции, возвращающие словарь значений"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_collectors = {}
+
+
+def register(name: str, collector):
+    """
+    Регистрирует источник метрик
+
+    :param name: Префикс метрик (например, classifier_cache)
+    :param collector: Функция без аргументов, возвращающая {метрика: число}
+    """
+    _collectors[name] = collector
+
+
+def unregister(name: str):
+    _collectors.pop(name, None)
+
+
+def collect() -> dict:
+    """Собирает текущие значения всех метрик: {префикс_метрика: число}"""
+    values = {}
+    for name, collector in list(_collectors.items()):
+        try:
+            for key, value in collector().items():
+                values[f"{name}_{key}"] = value
+        except Exception as e:
+            logger.error(f"Ошибка сбора метрик {name}: {e}")
+    return values
+
+
+def render() -> str:
+    """Метрики в текстовом формате Prometheus"""
+    return "\n".join(f"{key} {value}" for key, value in sorted(collect().items()))
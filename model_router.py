@@ -0,0 +1,138 @@
+"""Выбор модели GigaChat и лимита длины ответа по сложности вопроса"""
+import logging
+import re
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Темы, где ошибка в ответе особенно дорога: такие вопросы всегда идут в старшую модель
+CRITICAL_MARKERS = (
+    "беременн", "кормлю грудью", "грудное вскармливание", "ребен", "ребён", "младен", "новорожд",
+    "онколог", "опухол", "раковы", "раковая", "раковой", "раковую", "химиотерап", "инсульт", "инфаркт", "судорог", "кровотечен",
+    "потеря сознания", "потерял сознание", "потеряла сознание", "анафилак", "отек квинке", "отёк квинке",
+)
+
+# Короткие слова, совпадающие только целиком: как начало слова "рак" нашелся бы и в "раковине"
+CRITICAL_WORDS = ("рак", "рака", "раку", "раком", "раке", "раков")
+
+DEFAULT_TIERS = "GigaChat-2:300:3,GigaChat-2-Pro:500:9,GigaChat-2-Max:800"
+
+
+class ModelTier:
+    """Уровень: модель, лимит токенов и максимальная оценка сложности, которую он обслуживает"""
+
+    __slots__ = ("model", "max_tokens", "max_score")
+
+    def __init__(self, model: str, max_tokens: int, max_score: int = None):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_score = max_score  # None - без ограничения (последний уровень)
+
+    def __repr__(self):
+        return f"ModelTier({self.model!r}, {self.max_tokens}, {self.max_score})"
+
+
+def parse_tiers(spec: str) -> list:
+    """
+    Уровни из строки "модель:max_tokens:макс_оценка,..." (у последнего уровня оценка не указывается)
+
+    :raises ValueError: Строка записана неверно
+    """
+    tiers = []
+    for item in spec.split(","):
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) not in (2, 3) or not parts[0]:
+            raise ValueError(f"Неверный уровень модели: '{item}'")
+        max_score = int(parts[2]) if len(parts) == 3 and parts[2] else None
+        tiers.append(ModelTier(parts[0], int(parts[1]), max_score))
+
+    if not tiers or tiers[-1].max_score is not None:
+        raise ValueError("У последнего уровня не должно быть ограничения по оценке")
+    if any(tier.max_score is None for tier in tiers[:-1]):
+        raise ValueError("Ограничение по оценке нужно всем уровням, кроме последнего")
+    return tiers
+
+
+class RouteDecision:
+    """Решение маршрутизатора для одного вопроса"""
+
+    __slots__ = ("model", "max_tokens", "score", "reason")
+
+    def __init__(self, model: str, max_tokens: int, score: int, reason: str):
+        self.model = model
+        self.max_tokens = max_tokens
+        self.score = score
+        self.reason = reason
+
+    def __repr__(self):
+        return f"RouteDecision({self.model!r}, max_tokens={self.max_tokens}, score={self.score}, reason={self.reason!r})"
+
+
+class ModelRouter:
+    """
+    Маршрутизатор по сигналам, уже посчитанным QuestionProcessor
+
+    Оценка сложности: ключевые слова + сработавшие триггеры + длина (слово за каждые
+    words_per_point слов) + по 2 за каждый вопрос после первого. Вопрос уходит на первый
+    уровень, чья max_score не меньше оценки; критические темы - сразу на последний.
+    """
+
+    def __init__(self, tiers: list, enabled: bool = True, default_model: str = "GigaChat-2-Pro",
+                 default_max_tokens: int = 500, critical_markers=CRITICAL_MARKERS, critical_words=CRITICAL_WORDS,
+                 words_per_point: int = 15):
+        """
+        :param tiers: Уровни от простого к сложному (parse_tiers)
+        :param enabled: False - всем вопросам модель и лимит по умолчанию
+        :param default_model: Модель при выключенной маршрутизации
+        :param default_max_tokens: Лимит токенов при выключенной маршрутизации
+        :param critical_markers: Начала слов/фраз, отправляющие вопрос на старший уровень
+        :param critical_words: Слова, отправляющие вопрос на старший уровень, только если совпали целиком
+        :param words_per_point: Сколько слов вопроса добавляют единицу к оценке
+        """
+        self.tiers = tiers
+        self.enabled = enabled
+        self.default_model = default_model
+        self.default_max_tokens = default_max_tokens
+        self.words_per_point = words_per_point
+        patterns = [re.escape(marker) for marker in critical_markers]
+        patterns += [re.escape(word) + r"\b" for word in critical_words]
+        self.critical_regex = re.compile(r"\b(?:" + "|".join(patterns) + ")") if patterns else None
+
+        self.routed = Counter()
+
+    def score(self, processed) -> tuple:
+        """Оценка сложности и ее составляющие: (оценка, {сигнал: значение})"""
+        signals = {
+            "keywords": len(processed["keywords"]),
+            "triggers": processed.get("triggers", 0),
+            "words": len(processed["cleaned"].split()),
+            # Очистка убирает знаки по краям, поэтому вопросы считаются по оригиналу
+            "questions": processed["original"].count("?"),
+        }
+        score = (signals["keywords"] + signals["triggers"] + signals["words"] // self.words_per_point
+                 + 2 * max(signals["questions"] - 1, 0))
+        return score, signals
+
+    def route(self, processed) -> RouteDecision:
+        """Модель и лимит токенов для обработанного вопроса (ProcessedQuestion)"""
+        if not self.enabled:
+            decision = RouteDecision(self.default_model, self.default_max_tokens, 0, "маршрутизация выключена")
+            self.routed[decision.model] += 1
+            return decision
+
+        score, signals = self.score(processed)
+
+        critical = self.critical_regex.search(processed["cleaned"].lower()) if self.critical_regex else None
+        if critical:
+            tier = self.tiers[-1]
+            reason = f"критическая тема: {critical.group()}"
+        else:
+            tier = next(t for t in self.tiers if t.max_score is None or score <= t.max_score)
+            reason = "оценка {}: {}".format(score, ", ".join(f"{name} {value}" for name, value in signals.items()))
+
+        self.routed[tier.model] += 1
+        logger.debug(f"Маршрут: {tier.model} ({tier.max_tokens} токенов) - {reason}")
+        return RouteDecision(tier.model, tier.max_tokens, score, reason)
+
+    def stats(self) -> dict:
+        return {f"routed_{model}": count for model, count in self.routed.items()}
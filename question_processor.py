@@ -1,298 +1,354 @@
+import asyncio
 import logging
+import os
 import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from lru_cache import LRUCache
+from vocabulary import DEFAULT_VOCABULARY_PATH, VocabularyError, VocabularySnapshot, read_vocabulary
 
 logger = logging.getLogger(__name__)
 
+# Начальные/конечные знаки препинания, которые убираются после очистки
+_EDGE_PUNCTUATION = ',:-!? '
+# Знаки, после которых приветствие может быть "приклеено" к следующему слову (привет,друзья)
+_GREETING_GLUE = re.compile(r'[,!.]')
+
+
+class ProcessedQuestion:
+    """Результат обработки вопроса: компактный объект с доступом по ключам, как у словаря"""
+
+    __slots__ = ("original", "cleaned", "is_medical", "keywords", "triggers", "error")
+
+    def __init__(self, original: str, cleaned: str, is_medical: bool, keywords: list, triggers: int = 0):
+        self.original = original
+        self.cleaned = cleaned
+        self.is_medical = is_medical
+        self.keywords = keywords
+        self.triggers = triggers  # Сколько разных паттернов-триггеров сработало
+        self.error = None if is_medical else "Вопрос не распознан как медицинский"
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key) -> bool:
+        return key in self.__slots__
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"ProcessedQuestion({self.to_dict()!r})"
+
+
+# Обработчик в процессе-воркере пула (создается один раз на процесс)
+_worker_processor = None
+
+
+def init_worker(engine: str, vocabulary_path: str = None, vocabulary: tuple = None):
+    """
+    Инициализатор процесса пула: компилирует словари один раз на процесс
+
+    :param vocabulary: (словари, отпечаток) основного процесса - воркер собирает ту же версию,
+                       даже если файл уже изменен или испорчен
+    """
+    global _worker_processor
+    _worker_processor = QuestionProcessor(cache_size=0, engine=engine, vocabulary_path=vocabulary_path,
+                                          vocabulary=vocabulary)
+
+
+def classify_in_worker(question: str) -> "ProcessedQuestion":
+    return _worker_processor.classify(question)
+
+
+def classify_chunk_in_worker(questions: list) -> list:
+    return [_worker_processor.classify(question) for question in questions]
+
+
 class QuestionProcessor:
     """Умный обработчик вопросов с гибкой фильтрацией"""
 
-    def __init__(self):
-        # Приветствия для удаления
-        self.greetings = [
-            "здравствуйте", "добрый день", "добрый вечер", "доброе утро",
-            "привет", "доброй ночи", "уважаемая", "уважаемый", "здрасте"
-        ]
-
-        # Обращения (могут быть частью вопроса)
-        self.addresses = [
-            "татьяна", "николаевна", "татьяна николаевна",
-            "администратор", "админ", "доктор", "врач", "специалист",
-            "эксперт", "консультант"
-        ]
-
-        # Ключевые слова и фразы из реальных вопросов (РАСШИРЕНО)
-        self.medical_patterns = [
-            # Головные боли и неврология (ДОБАВЛЕНО)
-            'головн', 'голова', 'мигрен', 'боль голов', 'мигрень',
-            'мрт', 'мрт ', 'мрт голов', 'томограф', 'узи голов',
-            'мозг', 'мозга', 'сосуд', 'сосуды', 'сосудов',
-            'давлен', 'гипертон', 'гипотон', 'давление',
-            'головокруж', 'вертиго', 'тошнот', 'рвот',
-            'невролог', 'невропатолог', 'неврологи',
-
-            # Онкология и рак (ДОБАВЛЕНО)
-            'рак', 'онкологи', 'онкозаболеван', 'опухол', 'новообразова',
-            'карцином', 'канцер', 'злокачествен', 'доброкачествен',
-            'молочн желез', 'груд', 'маммограф', 'мастопат',
-            'простат', 'предстательн', 'пса ', 'psa',
-            'биопс', 'гистолог', 'онкомаркер',
-
-            # Эфирные масла и аббревиатуры (ДОБАВЛЕНО И РАСШИРЕНО)
-            'эм', ' эм ', 'эфирн', 'масло', 'эфирное масло',
-            'эфирные масла', 'ароматерап', 'аромамасло',
-            'дотерра', 'dōterra', 'dō terra', 'dō-terra',
-            'young living', 'йонг ливинг', 'йан ливинг',
-            'диффузор', 'ингаляц', 'аромалампа',
-            'защит', 'поддержк', 'поддержать', 'защитить',
-            'чем себя защит', 'чем поддерж', 'как защит',
-
-            # Из примеров
-            'вит д', 'витамин д', 'витамин d', 'инъекц', 'укол', 'ампул',
-            'схем', 'приём', 'прием', 'прокомментир', 'коммент',
-            'ph воды', 'щелочн', 'уровен ph', 'ph питьевой',
-            'бад', 'бады', 'биодобав', 'добавк',
-            'vmg+', 'витаминно-минеральн', 'комплекс', 'завтрак',
-            'еда', 'пища', 'желудок', 'голодный',
-            'ковид', 'covid', 'легк', 'дыхан', 'кашель', 'свист',
-            'сатурац', 'ингалятор', 'кортикостероид',
-            'пальмов', 'масло', 'состав', 'детск', 'витамин',
-            'гастрит', 'слизист', 'раздражат',
-            'десн', 'челюст', 'воспал', 'опух', 'стоматолог',
-            'иммунитет', 'аллерг', 'чихан', 'слез', 'сонн',
-            'кож', 'дермат', 'шершав', 'трещин', 'атопич',
-            'бронхит', 'хроническ', 'мокрот', 'эвкалипт',
-            'остеопороз', 'кальц', 'фтор', 'антипаразитар',
-            'миом', 'кист', 'яични', 'папиллом', 'маммолог',
-            'геморро', 'шишк', 'боль', 'проктолог',
-            'орви', 'фарингит', 'температур', 'горл', 'жаропонижающ',
-
-            # Общие медицинские термины
-            'болезн', 'заболеван', 'симптом', 'диагноз', 'лечен',
-            'терапи', 'профилактик', 'рекомендац', 'совет',
-            'что делать', 'как быть', 'можно ли', 'стоит ли',
-            'подскажит', 'посоветуйт', 'помогит', 'объяснит',
-
-            # Частые вопросы о продуктах
-            'когда принимат', 'как принимат', 'сколько принимат',
-            'с чем принимат', 'до еды', 'после еды', 'во время еды',
-            'утром', 'вечером', 'днем', 'на ночь',
-            'курс', 'длительн', 'продолжительн', 'перерыв',
-            'побочн', 'эффект', 'результат', 'действ',
-
-            # Вопросы о взаимодействии
-            'вместе с', 'одновременно', 'параллельн', 'сочета',
-            'можно ли совмещат', 'можно ли комбинироват',
-            'противопоказан', 'ограничен', 'нельзя',
-
-            # Вопросы о дозировках
-            'доз', 'количеств', 'сколько', 'мг', 'мл', 'капель',
-            'таблетк', 'капсул', 'ложк', 'чайная', 'столовая',
-
-            # Вопросы о возрасте и состояниях
-            'ребенк', 'детск', 'взросл', 'пожил', 'женщин',
-            'мужчин', 'беременн', 'кормящ', 'кормление',
-            'хроническ', 'острый', 'обострен', 'ремиссия',
-
-            # Общие слова поддержки и здоровья
-            'здоровь', 'самочувств', 'состоян', 'помочь',
-            'улучшить', 'улучшен', 'усилить', 'укрепить',
-            'поддерж', 'профилактик', 'предупредить'
-        ]
-
-        # Паттерны-триггеры (даже одно слово из этих триггеров делает вопрос медицинским) - РАСШИРЕНО
-        self.trigger_patterns = [
-            # Головные боли и МРТ
-            r'головн(ой|ая|ые)?\s*бол',  # головная боль
-            r'\bмрт\b',  # МРТ
-            r'мигрен',  # мигрень
-
-            # Онкология
-            r'\bрак\b',  # рак
-            r'молочн(ой|ых)?\s*желез',  # молочных желез
-            r'онкологи',  # онкология
-            r'опухол',  # опухоль
-
-            # Эфирные масла и аббревиатуры
-            r'\bэм\b',  # ЭМ (эфирные масла)
-            r'эфирн(ое|ые)?\s*масл',  # эфирное масло
-            r'дотерра',  # dōterra
-            r'young\s*living',  # Young Living
-
-            # Общие медицинские
-            r'(вит|витамин)[\s\.]*[дd]',  # вит Д, витамин Д
-            r'инъекц',  # инъекции
-            r'ph[\s\-]*вод',  # ph воды
-            r'бад(ы|ов)?\b',  # бад, бады
-            r'vmg\+',  # VMG+
-            r'ковид|covid',  # ковид
-            r'гастрит',  # гастрит
-            r'иммунитет',  # иммунитет
-            r'аллерг',  # аллергия
-            r'дермат',  # дерматит
-            r'бронхит',  # бронхит
-            r'остеопороз',  # остеопороз
-            r'миом',  # миома
-            r'геморро',  # геморрой
-            r'орви',  # ОРВИ
-
-            # Процедуры и обследования
-            r'завтра\s*(иду|ид[её]т|пойду)',  # завтра иду на...
-            r'(иду|пойду)\s*на\s*(мрт|узи|анализ)',  # иду на МРТ/УЗИ
-            r'чем\s*себя\s*защит',  # чем себя защитить
-            r'чем\s*поддерж',  # чем поддержать
-        ]
-
-        # Слова-исключения (точно немедицинские)
-        self.non_medical = [
-            'политик', 'экономик', 'финанс', 'кредит', 'ипотек',
-            'юрист', 'адвокат', 'суд', 'закон', 'прав',
-            'религи', 'вера', 'бог', 'церков',
-            'кинотеатр', 'концерт', 'выставк', 'музей',
-            'ремонт квартир', 'строительств дом',
-            'автомобиль купить', 'техника бытов',
-            'рецепт пирог', 'блюдо праздничн',
-            'программирован', 'компьютер', 'смартфон',
-            'отдых на море', 'турпутёвк', 'отель'
-        ]
-
-        # Контекстные фразы, которые указывают на медицинский вопрос - РАСШИРЕНО
-        self.context_phrases = [
-            'не могли бы вы', 'прокомментируйте', 'объясните',
-            'подскажите пожалуйста', 'посоветуйте',
-            'что делать если', 'как быть когда',
-            'можно ли принимать', 'стоит ли использовать',
-            'какой лучше', 'какая дозировка',
-            'чем помочь', 'как справиться',
-            'нужны ли исследования', 'к какому врачу',
-
-            # Новые фразы
-            'чем себя защитить', 'чем поддержать',
-            'завтра иду на', 'после процедуры',
-            'перед обследованием', 'во время лечения',
-            'сердечно благодарю', 'благодарю за ответ',
-            'спасибо за поддержку', 'заранее благодарен',
-            'прошу вашего совета', 'жду вашего ответа',
-            'что посоветуете', 'как лучше подготовиться'
-        ]
-
-        # Медицинские процедуры и обследования
-        self.medical_procedures = [
-            'мрт', 'узи', 'кт', 'рентген', 'эндоскопия',
-            'колоноскопия', 'гастроскопия', 'биопсия',
-            'анализ крови', 'анализ мочи', 'томография',
-            'маммография', 'флюорография', 'электрокардиограмма'
-        ]
+    ENGINES = ("substring", "token")
+
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 3600, engine: str = "substring",
+                 vocabulary_path: str = None, vocabulary: tuple = None):
+        """
+        :param cache_size: Размер кэша результатов process() (0 - без кэша)
+        :param cache_ttl: Время жизни записи кэша в секундах
+        :param engine: Поиск словарных шаблонов: substring (подстроки, Ахо-Корасик)
+                       или token (по словам с отрезанием окончаний)
+        :param vocabulary_path: Файл словарей (по умолчанию vocabulary.json рядом с модулем)
+        :param vocabulary: Уже прочитанные (словари, отпечаток) - файл при создании не читается
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Неизвестный движок классификатора: {engine}")
+        self.engine = engine
+        self.vocabulary_path = vocabulary_path or DEFAULT_VOCABULARY_PATH
+
+        # Кэш решений по очищенному тексту: повторные вопросы не классифицируются заново
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+
+        # Перезагрузка словарей: сборка сериализуется, чтение идет без блокировок
+        self._reload_lock = threading.Lock()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_reload_error = None
+
+        self._mtime = self._vocabulary_mtime()
+        if vocabulary is None:
+            vocabulary = read_vocabulary(self.vocabulary_path)
+        words, fingerprint = vocabulary
+        self._snapshot = VocabularySnapshot(words, engine, fingerprint=fingerprint, path=self.vocabulary_path)
+        logger.debug(f"Словари собраны за {self._snapshot.build_seconds * 1000:.1f} мс")
+
+    @property
+    def snapshot(self) -> VocabularySnapshot:
+        """Текущий скомпилированный снимок словарей"""
+        return self._snapshot
+
+    @property
+    def vocabulary_version(self) -> int:
+        return self._snapshot.version
+
+    @property
+    def fingerprint(self) -> str:
+        return self._snapshot.fingerprint
+
+    def worker_initargs(self) -> tuple:
+        """
+        Аргументы init_worker: процессы пула собирают текущую версию словарей
+
+        Файл воркеры сами не перечитывают - после перезагрузки словарей пул создается заново.
+        """
+        snapshot = self._snapshot
+        return self.engine, self.vocabulary_path, (snapshot.vocabulary, snapshot.fingerprint)
+
+    def _vocabulary_mtime(self):
+        try:
+            return os.stat(self.vocabulary_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Перечитывает файл словарей и подменяет снимок
+
+        Новый снимок собирается целиком, затем подменяется одним присваиванием.
+        При ошибке в файле продолжает работать прежний снимок.
+
+        :param force: Пересобрать, даже если содержимое файла не изменилось
+        :return: True, если подменен снимок
+        """
+        with self._reload_lock:
+            current = self._snapshot
+            mtime = self._vocabulary_mtime()
+            try:
+                vocabulary, fingerprint = read_vocabulary(self.vocabulary_path)
+                if fingerprint == current.fingerprint and not force:
+                    self._mtime = mtime
+                    return False
+                snapshot = VocabularySnapshot(vocabulary, self.engine, version=current.version + 1,
+                                              fingerprint=fingerprint, path=self.vocabulary_path)
+            except VocabularyError as e:
+                self.reload_errors += 1
+                self.last_reload_error = str(e)
+                self._mtime = mtime  # Не повторяем ту же ошибку до следующего изменения файла
+                logger.error(f"Словари не перезагружены, работает версия {current.version}: {e}")
+                return False
+
+            self._snapshot = snapshot
+            self._mtime = mtime
+            self.reloads += 1
+            self.last_reload_error = None
+
+        # Записи кэша старой версии больше не читаются (ключ содержит версию), освобождаем память
+        self.cache.clear()
+        logger.info(f"Словари перезагружены: версия {snapshot.version}, "
+                    f"сборка {snapshot.build_seconds * 1000:.1f} мс")
+        return True
+
+    async def reload_async(self, force: bool = False) -> bool:
+        """Перезагрузка словарей в потоке: цикл событий не блокируется на время сборки"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.reload, force)
+
+    def vocabulary_changed(self) -> bool:
+        """Изменился ли файл словарей с момента последней загрузки"""
+        return self._vocabulary_mtime() != self._mtime
+
+    async def watch_vocabulary(self, interval: float = 5.0):
+        """Следит за временем изменения файла словарей и перезагружает их"""
+        while True:
+            await asyncio.sleep(interval)
+            if self.vocabulary_changed():
+                await self.reload_async()
+
+    def vocabulary_stats(self) -> dict:
+        stats = self._snapshot.stats()
+        stats["reloads"] = self.reloads
+        stats["reload_errors"] = self.reload_errors
+        return stats
+
+    def iter_triggers(self, question_lower: str, snapshot: VocabularySnapshot = None):
+        """
+        Первое совпадение каждого сработавшего паттерна, как у re.search: (вид, паттерн, начало, текст)
+
+        Объединенное выражение - быстрый отсев: большинство вопросов не содержит ни одного
+        триггера, и для них все заканчивается одним search. Если совпадение есть, каждый паттерн
+        ищется отдельно с позиции первого совпадения - раньше ни один паттерн начаться не может,
+        а перекрывающиеся триггеры ("иду на мрт" внутри "завтра иду на мрт") не теряются.
+        """
+        snapshot = snapshot or self._snapshot
+        first = snapshot.trigger_regex.search(question_lower)
+        if first is None:
+            return
+        groups = snapshot.trigger_groups
+        start = first.start()
+        found = []
+        for group, regex in snapshot.trigger_compiled.items():
+            match = regex.search(question_lower, start)
+            if match:
+                found.append((match.start(), group, match.group()))
+        found.sort(key=lambda item: item[0])
+        for position, group, matched in found:
+            kind, pattern = groups[group]
+            yield kind, pattern, position, matched
+
+    def _scan(self, question_lower: str, snapshot: VocabularySnapshot) -> dict:
+        """Один проход автомата и поиск триггеров: найденные шаблоны и триггеры по категориям"""
+        hits = snapshot.matcher.find(question_lower)
+        triggers = {}
+        special = set()
+        for kind, pattern, _, matched in self.iter_triggers(question_lower, snapshot):
+            if kind == 'trigger':
+                triggers.setdefault(pattern, matched)
+            else:
+                special.add(pattern)
+        hits['trigger'] = triggers
+        hits['special'] = special
+        return hits
 
     def clean_question(self, question: str) -> str:
         """Очищает вопрос от приветствий, сохраняя суть"""
-        original = question
+        cleaned, _ = self._clean(question, self._snapshot)
+        logger.debug(f"Очистка: '{question[:50]}...' -> '{cleaned[:50]}...'")
+        return cleaned
+
+    def _clean(self, question: str, snapshot: VocabularySnapshot) -> tuple:
+        """Очистка за один проход по словам: (очищенный текст, он же в нижнем регистре)"""
         words = question.split()
+        lowered = [word.lower() for word in words]
+        keys = [word_lower.strip(' ,:;.!?') for word_lower in lowered]
         cleaned_words = []
-
-        # Флаг: пропускать ли приветствия (только в начале)
-        skip_greetings = True
-
-        for i, word in enumerate(words):
-            word_lower = word.lower().strip(' ,:;.!?')
-
-            # Удаляем только явные приветствия в начале
-            if skip_greetings:
-                is_greeting = False
-                for greeting in self.greetings:
-                    # Приветствие должно быть отдельным словом или в начале
-                    if (greeting == word_lower or
-                            word_lower.startswith(greeting + ",") or
-                            word_lower.startswith(greeting + "!") or
-                            word_lower.startswith(greeting + ".")):
-                        is_greeting = True
-                        break
-
-                if is_greeting:
+        cleaned_lower_words = []
+
+        greeting_trie = snapshot.greeting_trie
+        address_trie = snapshot.address_trie
+        greeting_starts = snapshot.greeting_starts
+        single_greetings = snapshot.single_greetings
+        address_starts = snapshot.address_starts
+        count = len(words)
+        i = 0
+
+        # Приветствия и обращения в начале удаляются вперемешку ("Добрый день, Татьяна Николаевна!")
+        while i < count:
+            key = keys[i]
+            length = 0
+            if key in greeting_starts:
+                length = greeting_trie.match(keys, i)
+            # Приветствие, приклеенное к следующему слову: "привет,друзья"
+            if not length and _GREETING_GLUE.split(key, 1)[0] in single_greetings:
+                length = 1
+            if not length and key in address_starts:
+                length = address_trie.match(keys, i)
+            if not length:
+                break
+            i += length
+
+        # Дальше по тексту удаляются только обращения; дерево проверяется лишь для слов,
+        # с которых начинается хотя бы одно обращение
+        while i < count:
+            if keys[i] in address_starts:
+                length = address_trie.match(keys, i)
+                if length:
+                    i += length
                     continue
-                else:
-                    skip_greetings = False
-
-            # Проверяем, не является ли слово обращением (сохраняем, если оно не отдельное)
-            is_address = False
-            for address in self.addresses:
-                if address == word_lower:
-                    is_address = True
-                    break
-
-            # Если это отдельное обращение, можно пропустить
-            if is_address and len(word_lower) <= 15:  # Только короткие обращения
-                continue
-
             cleaned_words.append(words[i])  # Сохраняем оригинальное написание
+            cleaned_lower_words.append(lowered[i])
+            i += 1
 
         cleaned = ' '.join(cleaned_words)
 
         # Если после очистки осталась пустая строка
         if not cleaned.strip():
-            return original
+            return question, question.lower()
 
         # Убираем начальные/концечные знаки препинания
-        cleaned = re.sub(r'^[,\:\-\!\?\s]+', '', cleaned)
-        cleaned = re.sub(r'[,\:\-\!\?\s]+$', '', cleaned)
+        # (после join пробельные символы между словами - только одиночные пробелы)
+        cleaned = cleaned.strip(_EDGE_PUNCTUATION)
+        cleaned_lower = ' '.join(cleaned_lower_words).strip(_EDGE_PUNCTUATION)
 
         # Первая буква заглавная
         if cleaned:
             cleaned = cleaned[0].upper() + cleaned[1:]
 
-        logger.debug(f"Очистка: '{original[:50]}...' -> '{cleaned[:50]}...'")
-        return cleaned
+        return cleaned, cleaned_lower
 
     def is_health_related(self, question: str) -> bool:
         """Гибкая проверка медицинской тематики - УЛУЧШЕННАЯ"""
+        snapshot = self._snapshot
         question_lower = question.lower()
+        return self._decide(question, question_lower, self._scan(question_lower, snapshot), snapshot)
+
+    def _decide(self, question: str, question_lower: str, hits: dict, snapshot: VocabularySnapshot) -> bool:
+        """Принимает решение по результатам одного прохода автомата"""
+        medical_found = hits['medical']
 
         # 0. Быстрая проверка: если есть благодарность в конце - это обычно медицинский вопрос
-        if any(phrase in question_lower for phrase in ['благодарю', 'спасибо', 'заранее благодар']):
-            # Проверим, есть ли хоть что-то медицинское
-            medical_terms_in_thanks = 0
-            for pattern in self.medical_patterns:
-                if pattern in question_lower:
-                    medical_terms_in_thanks += 1
-                    if medical_terms_in_thanks >= 1:
-                        logger.debug(f"Обнаружен медицинский вопрос с благодарностью")
-                        return True
+        if hits['thanks'] and medical_found:
+            logger.debug(f"Обнаружен медицинский вопрос с благодарностью")
+            return True
 
         # 1. Проверяем паттерны-триггеры (самый строгий уровень)
-        for pattern in self.trigger_patterns:
-            if re.search(pattern, question_lower):
-                logger.debug(f"Обнаружен триггер-паттерн: {pattern}")
-                return True
+        if hits['trigger']:
+            logger.debug(f"Обнаружены триггер-паттерны: {list(hits['trigger'])}")
+            return True
 
         # 2. Проверяем наличие медицинских процедур
-        for procedure in self.medical_procedures:
-            if procedure in question_lower:
-                logger.debug(f"Обнаружена медицинская процедура: {procedure}")
-                return True
+        if hits['procedure']:
+            logger.debug(f"Обнаружена медицинская процедура: {hits['procedure']}")
+            return True
 
         # 3. Проверяем контекстные фразы
-        has_context = False
-        for phrase in self.context_phrases:
-            if phrase in question_lower:
-                has_context = True
-                logger.debug(f"Обнаружена контекстная фраза: {phrase}")
-                break
+        has_context = bool(hits['context'])
+        if has_context:
+            logger.debug(f"Обнаружена контекстная фраза: {hits['context']}")
 
         # 4. Проверяем медицинские паттерны
-        medical_score = 0
-        found_patterns = []
-        for pattern in self.medical_patterns:
-            if pattern in question_lower:
-                medical_score += 1
-                found_patterns.append(pattern)
-                logger.debug(f"Обнаружен медицинский паттерн: {pattern}")
+        medical_score = sum(snapshot.medical_weights[pattern] for pattern in medical_found)
+        found_patterns = sorted(medical_found)
+        if found_patterns:
+            logger.debug(f"Обнаружены медицинские паттерны: {found_patterns}")
 
         # 5. Проверяем исключения
-        for non_med in self.non_medical:
-            if non_med in question_lower:
-                # Но если есть сильный медицинский контекст, всё равно медицинский
-                if medical_score < 2:  # Слабый медицинский контекст
-                    logger.debug(f"Обнаружено немедицинское слово: {non_med}")
-                    return False
+        # Но если есть сильный медицинский контекст, всё равно медицинский
+        if hits['non_medical'] and medical_score < 2:  # Слабый медицинский контекст
+            logger.debug(f"Обнаружено немедицинское слово: {hits['non_medical']}")
+            return False
 
         # 6. Логика принятия решения
 
@@ -312,43 +368,22 @@ class QuestionProcessor:
             return True
 
         # Вариант D: Специальные комбинации для частых случаев
-        special_combinations = [
-            # Головные боли + что-то еще
-            (['голов', 'бол'], 2, "головная боль"),
-            # Рак + орган
-            (['рак', 'желез', 'молочн'], 2, "рак молочных желез"),
-            # МРТ + подготовка
-            (['мрт', 'защит', 'подготов'], 2, "подготовка к МРТ"),
-            # Эфирные масла + здоровье
-            (['эм', 'масл', 'здоров'], 2, "эфирные масла для здоровья"),
-        ]
-
-        for keywords, threshold, description in special_combinations:
-            count = sum(1 for kw in keywords if kw in question_lower)
+        combination_found = hits['combination']
+        for keywords, threshold, description in snapshot.special_combinations:
+            count = sum(1 for kw in keywords if kw in combination_found)
             if count >= threshold:
                 logger.debug(f"Принято по правилу D: {description}")
                 return True
 
         # 7. Специальные случаи из примеров преподавателя
-        special_cases = [
-            r'#вопрос',  # Хэштег вопроса
-            r'вопрос специалисту',  # Явное обращение
-            r'подскажите.*пожалуйста',  # Вежливый запрос
-            r'посоветуйте.*чем',  # Запрос совета
-            r'завтра иду',  # Планируемая процедура
-            r'чем себя',  # Запрос о защите/поддержке
-        ]
-
-        for case in special_cases:
-            if re.search(case, question_lower):
-                logger.debug(f"Специальный случай: {case}")
-                # Даже если мало медицинских терминов, считаем медицинским
-                if medical_score >= 1:
-                    return True
+        if hits['special']:
+            logger.debug(f"Специальный случай: {hits['special']}")
+            # Даже если мало медицинских терминов, считаем медицинским
+            if medical_score >= 1:
+                return True
 
         # 8. Если есть слова "боль", "заболевание", "симптом" - считаем медицинским
-        strong_indicators = ['боль', 'заболеван', 'симптом', 'лечен', 'терапи']
-        if any(indicator in question_lower for indicator in strong_indicators):
+        if hits['strong']:
             logger.debug(f"Принято по сильным индикаторам")
             return True
 
@@ -359,46 +394,90 @@ class QuestionProcessor:
     def extract_keywords(self, question: str) -> list:
         """Извлекает ключевые слова из вопроса"""
         question_lower = question.lower()
-        keywords = []
+        return self._keywords(question_lower, self._scan(question_lower, self._snapshot))
 
-        for pattern in self.medical_patterns:
-            if pattern in question_lower:
-                keywords.append(pattern)
+    def _keywords(self, question_lower: str, hits: dict) -> list:
+        """Собирает ключевые слова по результатам прохода автомата"""
+        keywords = set(hits['medical'])
 
-        # Также ищем триггеры
-        for pattern in self.trigger_patterns:
-            if re.search(pattern, question_lower):
-                # Извлекаем найденное слово
-                match = re.search(pattern, question_lower)
-                if match:
-                    keywords.append(match.group())
+        # Также добавляем найденные триггеры (совпавший текст)
+        keywords.update(hits['trigger'].values())
 
         # Добавляем процедуры
-        for procedure in self.medical_procedures:
-            if procedure in question_lower:
-                keywords.append(procedure)
-
-        return list(set(keywords))  # Убираем дубли
+        keywords.update(hits['procedure'])
+
+        return list(keywords)  # Без дублей
+
+    def classify(self, question: str) -> ProcessedQuestion:
+        """Обрабатывает вопрос без логирования и кэша (для пакетной обработки)"""
+        snapshot = self._snapshot
+        cleaned, cleaned_lower = self._clean(question, snapshot)
+        hits = self._scan(cleaned_lower, snapshot)
+        is_medical = self._decide(cleaned, cleaned_lower, hits, snapshot)
+        keywords = self._keywords(cleaned_lower, hits)
+        return ProcessedQuestion(question, cleaned, is_medical, keywords, len(hits['trigger']))
+
+    def _classify_cached(self, question: str) -> ProcessedQuestion:
+        """Классификация через кэш: ключ - текст после удаления приветствий и обращений"""
+        # Весь вызов работает с одним снимком, даже если словари подменят посередине
+        snapshot = self._snapshot
+        cleaned, cleaned_lower = self._clean(question, snapshot)
+
+        # Решение и ключевые слова зависят только от очищенного текста в нижнем регистре
+        # и версии словарей: ответы прежней версии после перезагрузки не используются
+        key = (snapshot.version, cleaned_lower)
+        cached = self.cache.get(key)
+        if cached is None:
+            hits = self._scan(cleaned_lower, snapshot)
+            cached = (self._decide(cleaned, cleaned_lower, hits, snapshot), self._keywords(cleaned_lower, hits),
+                      len(hits['trigger']))
+            self.cache.set(key, cached)
+
+        is_medical, keywords, triggers = cached
+        return ProcessedQuestion(question, cleaned, is_medical, list(keywords), triggers)
+
+    def iter_process(self, questions, workers: int = 0, chunk_size: int = 500):
+        """
+        Потоковая обработка множества вопросов (порядок сохраняется)
+
+        :param questions: Любой итерируемый набор вопросов
+        :param workers: Число процессов; 0 или 1 - обработка в текущем процессе
+        :param chunk_size: Размер пачки, отправляемой в процесс-воркер
+        """
+        if workers <= 1:
+            for question in questions:
+                yield self.classify(question)
+            return
+
+        iterator = iter(questions)
+        chunks = iter(lambda: list(islice(iterator, chunk_size)), [])
+        initargs = self.worker_initargs()
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=initargs) as executor:
+            # Держим в работе не больше двух пачек на процесс, чтобы не читать весь поток в память
+            pending = deque()
+            for chunk in chunks:
+                pending.append(executor.submit(classify_chunk_in_worker, chunk))
+                if len(pending) >= workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def process_many(self, questions, workers: int = 0, chunk_size: int = 500) -> list:
+        """Обрабатывает пачку вопросов и возвращает список результатов"""
+        return list(self.iter_process(questions, workers=workers, chunk_size=chunk_size))
 
     # ВАЖНО: Метод должен называться process
-    def process(self, question: str) -> dict:
-        """Обрабатывает вопрос с расширенной логикой"""
-        cleaned = self.clean_question(question)
-        is_medical = self.is_health_related(cleaned)
-        keywords = self.extract_keywords(cleaned)
-
-        logger.info("=" * 50)
-        logger.info(f"Обработка вопроса:")
-        logger.info(f"Оригинал: '{question[:100]}...'")
-        logger.info(f"Очищенный: '{cleaned[:100]}...'")
-        logger.info(f"Медицинский: {is_medical}")
-        logger.info(f"Ключевые слова: {keywords}")
-        logger.info("=" * 50)
-
-        return {
-            "original": question,
-            "cleaned": cleaned,
-            "is_medical": is_medical,
-            "keywords": keywords,
-            "error": None if is_medical else "Вопрос не распознан как медицинский"
-        }
\ No newline at end of file
+    def process(self, question: str) -> ProcessedQuestion:
+        """Обрабатывает вопрос: очистка, классификация и ключевые слова за один проход"""
+        result = self._classify_cached(question)
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("=" * 50)
+            logger.info(f"Обработка вопроса:")
+            logger.info(f"Оригинал: '{question[:100]}...'")
+            logger.info(f"Очищенный: '{result.cleaned[:100]}...'")
+            logger.info(f"Медицинский: {result.is_medical}")
+            logger.info(f"Ключевые слова: {result.keywords}")
+            logger.info("=" * 50)
+
+        return result
@@ -0,0 +1,85 @@
+"""Ограничение частоты запросов: ведро токенов"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Ведро токенов: в среднем rate запросов в секунду, кратковременно - до capacity подряд
+
+    Ожидающие обслуживаются по очереди (FIFO), каждый ждет ровно столько, сколько нужно
+    до появления токена.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        :param rate: Пополнение, токенов в секунду (0 - без ограничения)
+        :param capacity: Емкость ведра (допустимый всплеск); по умолчанию max(rate, 1)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.acquired = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Забирает токены, если они есть прямо сейчас (без ожидания)"""
+        if self.rate <= 0:
+            self.acquired += 1
+            return True
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            self.acquired += 1
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Через сколько секунд будет доступно tokens токенов"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def locked(self) -> bool:
+        """Есть ли ожидающие токен"""
+        return self._lock.locked()
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """
+        Ждет токены и забирает их; возвращает время ожидания, с
+
+        :raises ValueError: Токенов больше емкости ведра - столько не накопится никогда
+        """
+        if self.rate > 0 and tokens > self.capacity:
+            raise ValueError(f"Запрошено {tokens} токенов при емкости ведра {self.capacity}")
+
+        # Без очереди ожидающих токен можно забрать сразу; иначе - встаем в очередь
+        if not self._lock.locked() and self.try_acquire(tokens):
+            return 0.0
+
+        started = time.monotonic()
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay(tokens))
+
+        waited = time.monotonic() - started
+        self.throttled += 1
+        self.wait_seconds += waited
+        return waited
+
+    def stats(self) -> dict:
+        return {
+            "acquired": self.acquired,
+            "throttled": self.throttled,
+            "wait_seconds_total": round(self.wait_seconds, 3),
+        }
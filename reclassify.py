@@ -0,0 +1,91 @@
+import argparse
+import time
+from itertools import tee
+
+from database import Session, UserRequest
+from question_processor import QuestionProcessor
+
+
+def iter_request_chunks(db, chunk_size: int, limit: int = None):
+    """Читает таблицу requests пачками по возрастанию id"""
+    last_id = 0
+    read = 0
+    while limit is None or read < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - read)
+        rows = (
+            db.query(UserRequest.id, UserRequest.question, UserRequest.original_question)
+            .filter(UserRequest.id > last_id)
+            .order_by(UserRequest.id)
+            .limit(size)
+            .all()
+        )
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1].id
+        read += len(rows)
+
+
+def reclassify(chunk_size: int, workers: int, limit: int = None, verbose: bool = False):
+    print("=" * 50)
+    print("🔁 ПЕРЕКЛАССИФИКАЦИЯ ВОПРОСОВ")
+    print("=" * 50)
+
+    processor = QuestionProcessor()
+    db = Session()
+
+    total = 0
+    rejected_now = []
+    cleaned_changed = []
+    started = time.perf_counter()
+
+    # Один поток строк через один пул процессов: строки читаются из БД пачками по мере обработки
+    rows = (row for chunk in iter_request_chunks(db, chunk_size, limit) for row in chunk)
+    rows, rows_for_questions = tee(rows)
+    # В БД попадают только вопросы, признанные медицинскими
+    questions = (row.original_question or row.question for row in rows_for_questions)
+
+    try:
+        for row, result in zip(rows, processor.iter_process(questions, workers=workers, chunk_size=chunk_size)):
+            if not result.is_medical:
+                rejected_now.append((row.id, row.question))
+            elif row.original_question and result.cleaned != row.question:
+                cleaned_changed.append((row.id, row.question, result.cleaned))
+
+            total += 1
+            if total % chunk_size == 0:
+                print(f"  обработано: {total}")
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+
+    print("=" * 50)
+    print(f"📝 Всего вопросов: {total} за {elapsed:.2f} с")
+    print(f"❌ Больше не считаются медицинскими: {len(rejected_now)}")
+    print(f"✏️ Изменилась очистка: {len(cleaned_changed)}")
+
+    if rejected_now:
+        print("\nНе медицинские по новым словарям:")
+        for request_id, question in rejected_now if verbose else rejected_now[:20]:
+            print(f"  ID {request_id}: {question[:80]}")
+
+    if verbose and cleaned_changed:
+        print("\nИзменения очистки:")
+        for request_id, old, new in cleaned_changed:
+            print(f"  ID {request_id}: '{old[:60]}' -> '{new[:60]}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Переклассификация сохраненных вопросов текущими словарями")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Сколько строк читать из БД за раз")
+    parser.add_argument("--workers", type=int, default=0, help="Число процессов (0 - в текущем процессе)")
+    parser.add_argument("--limit", type=int, default=None, help="Обработать не больше N вопросов")
+    parser.add_argument("--verbose", action="store_true", help="Показать все изменения")
+    args = parser.parse_args()
+
+    reclassify(args.chunk_size, args.workers, args.limit, args.verbose)
+
+
+if __name__ == "__main__":
+    main()
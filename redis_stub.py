@@ -0,0 +1,145 @@
+"""
+Локальная замена Redis для проверки RedisStateStore без настоящего сервера
+
+Понимает протокол RESP и команды, которые использует бот: PING, AUTH, SELECT, GET,
+SET (EX, PX, NX, XX), DEL, EXISTS, PTTL, DBSIZE, FLUSHDB. Данные хранятся в памяти процесса.
+
+Запуск: python redis_stub.py --port 6390
+Бот переключается на нее через STATE_BACKEND=redis STATE_REDIS_URL=redis://127.0.0.1:6390/0
+"""
+import argparse
+import asyncio
+import time
+
+
+class RedisStub:
+    """Минимальный Redis-сервер на asyncio"""
+
+    def __init__(self):
+        self._data = {}  # ключ -> (значение, срок действия по time.monotonic() или None)
+        self._server = None
+        self.commands = 0
+        self.connections = 0
+
+    def _alive(self, key: str):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def _set(self, args: list):
+        key, value, options = args[0], args[1], [arg.upper() for arg in args[2:]]
+        expires_at = None
+        for name, factor in (("EX", 1.0), ("PX", 0.001)):
+            if name in options:
+                expires_at = time.monotonic() + float(args[2 + options.index(name) + 1]) * factor
+        exists = self._alive(key) is not None
+        if ("NX" in options and exists) or ("XX" in options and not exists):
+            return None
+        self._data[key] = (value, expires_at)
+        return "+OK"
+
+    def _pttl(self, key: str) -> int:
+        item = self._alive(key)
+        if item is None:
+            return -2
+        return -1 if item[1] is None else int((item[1] - time.monotonic()) * 1000)
+
+    def dispatch(self, args: list):
+        """Ответ на команду: str с + (статус), int, str/None (строка), Exception (ошибка)"""
+        name, args = args[0].upper(), args[1:]
+        self.commands += 1
+        if name == "PING":
+            return "+PONG"
+        if name in ("AUTH", "SELECT", "FLUSHDB"):
+            if name == "FLUSHDB":
+                self._data.clear()
+            return "+OK"
+        if name == "GET":
+            item = self._alive(args[0])
+            return None if item is None else item[0]
+        if name == "SET":
+            return self._set(args)
+        if name == "DEL":
+            return sum(1 for key in args if self._alive(key) is not None and self._data.pop(key))
+        if name == "EXISTS":
+            return sum(1 for key in args if self._alive(key) is not None)
+        if name == "PTTL":
+            return self._pttl(args[0])
+        if name == "DBSIZE":
+            return sum(1 for key in list(self._data) if self._alive(key) is not None)
+        return ValueError(f"ERR unknown command '{name}'")
+
+    @staticmethod
+    def _encode(reply) -> bytes:
+        if isinstance(reply, Exception):
+            return f"-{reply}\r\n".encode("utf-8")
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if reply is None:
+            return b"$-1\r\n"
+        if reply.startswith("+"):
+            return f"{reply}\r\n".encode("utf-8")
+        data = reply.encode("utf-8")
+        return b"$%d\r\n%s\r\n" % (len(data), data)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.startswith(b"*"):
+                    writer.write(b"-ERR protocol error\r\n")
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode("utf-8"))
+                writer.write(self._encode(self.dispatch(args)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер в текущем цикле событий; возвращает redis:// URL (port=0 - свободный порт)"""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def stats(self) -> dict:
+        return {"keys": len(self._data), "commands": self.commands, "connections": self.connections}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    stub = RedisStub()
+    url = await stub.start(args.host, args.port)
+    print(f"Заглушка Redis: {url} (STATE_REDIS_URL={url})")
+    try:
+        while True:
+            await asyncio.sleep(30)
+            print(stub.stats())
+    finally:
+        await stub.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
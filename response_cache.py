@@ -0,0 +1,146 @@
+"""Кэш ответов GigaChat: LRU в памяти и таблица в SQLite, переживающая перезапуск"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta
+
+from database import Session, CachedResponse
+from lru_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_question(question: str) -> str:
+    """Вопрос для ключа кэша: нижний регистр, ё -> е, одиночные пробелы, без знаков по краям"""
+    return ' '.join(question.lower().replace('ё', 'е').split()).strip(' .,!?')
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов: сначала память, затем база; ошибки генерации не кэшируются"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 7 * 24 * 3600, persistent: bool = True):
+        """
+        :param maxsize: Число ответов в памяти (0 - только база)
+        :param ttl: Время жизни ответа в секундах
+        :param persistent: Хранить ответы в SQLite
+        """
+        self.ttl = ttl
+        self.persistent = persistent
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+
+        self.hits = 0
+        self.misses = 0
+        self.db_hits = 0
+        self.stores = 0
+        self.bypasses = 0
+        self.errors = 0
+
+    @staticmethod
+    def make_key(question: str, model: str, temperature: float, max_tokens: int, system_prompt: str) -> str:
+        """Ключ: нормализованный вопрос, модель, параметры генерации и хэш системного промпта"""
+        prompt_hash = hashlib.sha256(system_prompt.encode('utf-8')).hexdigest()
+        raw = json.dumps([normalize_question(question), model, temperature, max_tokens, prompt_hash],
+                         ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Возвращает сохраненный ответ или None (в памяти хранится пара (ответ, срок действия))"""
+        response = None
+        item = self.memory.get(key)
+        if item is not None:
+            response, expires_at = item
+            # Запись, поднятая из базы, живет в памяти не дольше, чем в базе
+            if expires_at and expires_at <= datetime.now():
+                self.memory.pop(key)
+                response = None
+
+        if response is None and self.persistent:
+            item = self._load(key)
+            if item is not None:
+                self.db_hits += 1
+                self.memory.set(key, item)
+                response = item[0]
+
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def set(self, key: str, response: str, model: str = None, question: str = None):
+        """Сохраняет успешный ответ в память и базу (перезаписывает прежний)"""
+        if not response:
+            return
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=self.ttl) if self.ttl else None
+        self.memory.set(key, (response, expires_at))
+        self.stores += 1
+        if self.persistent:
+            self._store(key, response, model, question, now, expires_at)
+
+    def record_bypass(self):
+        """Учитывает запрос мимо кэша (повторная генерация по кнопке эксперта)"""
+        self.bypasses += 1
+
+    def _load(self, key: str):
+        try:
+            with Session() as db:
+                row = db.get(CachedResponse, key)
+                if row is None:
+                    return None
+                if row.expires_at and row.expires_at <= datetime.now():
+                    db.delete(row)
+                    db.commit()
+                    return None
+                return row.response, row.expires_at
+        except Exception as e:
+            # Кэш не должен ломать генерацию: при ошибке базы просто идем в GigaChat
+            self.errors += 1
+            logger.error(f"Ошибка чтения кэша ответов: {e}")
+            return None
+
+    def _store(self, key: str, response: str, model: str, question: str, now: datetime, expires_at):
+        try:
+            with Session() as db:
+                db.merge(CachedResponse(
+                    key=key,
+                    model=model,
+                    question=normalize_question(question) if question else None,
+                    response=response,
+                    created_at=now,
+                    expires_at=expires_at
+                ))
+                db.commit()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи в кэш ответов: {e}")
+
+    def purge_expired(self) -> int:
+        """Удаляет из базы просроченные ответы; возвращает их число"""
+        if not self.persistent:
+            return 0
+        try:
+            with Session() as db:
+                deleted = db.query(CachedResponse).filter(CachedResponse.expires_at <= datetime.now()).delete()
+                db.commit()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка очистки кэша ответов: {e}")
+            return 0
+        if deleted:
+            logger.info(f"Из кэша ответов удалено просроченных записей: {deleted}")
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_hits": self.memory.hits,
+            "db_hits": self.db_hits,
+            "stores": self.stores,
+            "bypasses": self.bypasses,
+            "errors": self.errors,
+            "memory_size": len(self.memory),
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
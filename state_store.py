@@ -0,0 +1,269 @@
+"""
+Общее состояние бота: сессии редактирования и id сообщений экспертов
+
+Один интерфейс и три хранилища: память (TTL и ограничение размера), SQLite (переживает
+перезапуск) и Redis (общий для нескольких процессов бота; для проверки без Redis -
+redis_stub.py). Ключи и значения - строки, у каждой записи может быть свой срок жизни.
+"""
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from database import Session, StateEntry
+from lru_cache import LRUCache
+
+
+class StateStore(ABC):
+    """Интерфейс хранилища; ttl - срок жизни записи в секундах (None - без срока)"""
+
+    @abstractmethod
+    async def get(self, key: str):
+        """Значение или None"""
+
+    @abstractmethod
+    async def set(self, key: str, value, ttl: float = None):
+        """Записывает значение (существующее заменяется)"""
+
+    @abstractmethod
+    async def delete(self, key: str):
+        """Удаляет запись, если она есть"""
+
+    def purge_expired(self) -> int:
+        """Удаляет истекшие записи, если хранилище не делает этого само; возвращает их число"""
+        return 0
+
+    async def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {}
+
+
+class MemoryStateStore(StateStore):
+    """Состояние в памяти процесса: записи истекают по TTL, при переполнении вытесняются самые давние"""
+
+    def __init__(self, maxsize: int = 10000):
+        self.data = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str):
+        return self.data.get(key)
+
+    async def set(self, key: str, value, ttl: float = None):
+        self.data.set(key, str(value), ttl=ttl)
+
+    async def delete(self, key: str):
+        self.data.pop(key)
+
+    def stats(self) -> dict:
+        stats = self.data.stats()
+        return {"size": stats["size"], "evictions": stats["evictions"], "expirations": stats["expirations"]}
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Состояние в таблице bot_state: переживает перезапуск, истекшие записи удаляет purge_expired
+
+    Запросы к SQLite выполняются в пуле потоков, чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self):
+        self.expired = 0
+
+    @staticmethod
+    def _expires_at(ttl: float):
+        return datetime.now() + timedelta(seconds=ttl) if ttl else None
+
+    @staticmethod
+    async def _run(func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def get(self, key: str):
+        return await self._run(self._get, key)
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self._run(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    def _get(self, key: str):
+        with Session() as db:
+            entry = db.get(StateEntry, key)
+            if entry is None:
+                return None
+            if entry.expires_at is not None and entry.expires_at <= datetime.now():
+                db.delete(entry)
+                db.commit()
+                self.expired += 1
+                return None
+            return entry.value
+
+    def _set(self, key: str, value, ttl: float = None):
+        with Session() as db:
+            db.merge(StateEntry(key=key, value=str(value), expires_at=self._expires_at(ttl)))
+            db.commit()
+
+    def _delete(self, key: str):
+        with Session() as db:
+            db.query(StateEntry).filter(StateEntry.key == key).delete()
+            db.commit()
+
+    def purge_expired(self) -> int:
+        """Удаляет истекшие записи; возвращает их число"""
+        with Session() as db:
+            removed = db.query(StateEntry).filter(StateEntry.expires_at <= datetime.now()).delete()
+            db.commit()
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {"expired": self.expired}
+
+
+class RedisError(Exception):
+    """Ответ Redis с ошибкой (-ERR ...)"""
+
+
+class RedisStateStore(StateStore):
+    """
+    Состояние в Redis: общее для нескольких процессов, сроки жизни соблюдает сам сервер
+
+    Клиент протокола RESP на asyncio без сторонних библиотек: одно соединение, команды
+    выполняются по очереди; при разрыве соединение открывается заново.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "chatbot:", timeout: float = 5.0):
+        """
+        :param url: redis://[:пароль@]хост:порт[/номер базы]
+        :param prefix: Префикс всех ключей бота
+        :param timeout: Таймаут соединения и ответа, с
+        """
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+
+        self._reader = None
+        self._writer = None
+        self._lock = asyncio.Lock()
+
+        self.commands = 0
+        self.reconnects = 0
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        try:
+            if self.password:
+                await self._roundtrip("AUTH", self.password)
+            if self.db:
+                await self._roundtrip("SELECT", self.db)
+        except BaseException:
+            self._close_connection()
+            raise
+
+    async def _roundtrip(self, *args):
+        command = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = str(arg).encode("utf-8")
+            command.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self._writer.write(b"".join(command))
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_reply(), self.timeout)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis закрыл соединение")
+        kind, payload = line[:1], line[1:-2].decode("utf-8")
+        if kind == b"+":
+            return payload
+        if kind == b"-":
+            raise RedisError(payload)
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise RedisError(f"Неизвестный ответ Redis: {line!r}")
+
+    async def execute(self, *args):
+        """
+        Выполняет команду; после разрыва соединения - одна повторная попытка
+
+        Если команда прервана между отправкой и чтением ответа (отмена задачи, таймаут),
+        соединение закрывается: иначе неполученный ответ достался бы следующей команде.
+        """
+        async with self._lock:
+            self.commands += 1
+            for attempt in range(2):
+                try:
+                    if self._writer is None:
+                        await self._connect()
+                    return await self._roundtrip(*args)
+                except RedisError:
+                    # Ответ с ошибкой прочитан целиком - соединение в порядке
+                    raise
+                except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, OSError):
+                    self._close_connection()
+                    if attempt:
+                        raise
+                    self.reconnects += 1
+                except BaseException:
+                    self._close_connection()
+                    raise
+
+    def _close_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    @staticmethod
+    def _expiry(ttl: float) -> tuple:
+        return ("PX", max(1, int(ttl * 1000))) if ttl else ()
+
+    async def get(self, key: str):
+        return await self.execute("GET", self.prefix + key)
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self.execute("SET", self.prefix + key, value, *self._expiry(ttl))
+
+    async def delete(self, key: str):
+        await self.execute("DEL", self.prefix + key)
+
+    async def close(self):
+        async with self._lock:
+            writer = self._writer
+            self._close_connection()
+            if writer is not None:
+                await writer.wait_closed()
+
+    def stats(self) -> dict:
+        return {"commands": self.commands, "reconnects": self.reconnects}
+
+
+def create_state_store(backend: str, redis_url: str = None, maxsize: int = 10000) -> StateStore:
+    """
+    Хранилище по имени: memory, sqlite или redis
+
+    :raises ValueError: Неизвестное хранилище
+    """
+    if backend == "memory":
+        return MemoryStateStore(maxsize=maxsize)
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    if backend == "redis":
+        return RedisStateStore(redis_url) if redis_url else RedisStateStore()
+    raise ValueError(f"Неизвестное хранилище состояния '{backend}'")
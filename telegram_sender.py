@@ -0,0 +1,134 @@
+"""Исходящие сообщения Telegram: общий и поштучный по чатам лимит частоты, повтор после RetryAfter"""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramSender:
+    """
+    Общий отправитель для всех исходящих сообщений и правок бота
+
+    Каждый вызов берет токен из ведра своего чата (Telegram допускает около сообщения в секунду
+    в один чат) и из общего ведра (около 30 в секунду на бота), поэтому медленный или
+    ограниченный чат не задерживает остальных. После TelegramRetryAfter вызов ждет указанное
+    время и повторяется, а не теряется. Рассылка нескольким чатам идет параллельно.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float = 25, chat_rate: float = 1, chat_burst: float = 3,
+                 max_retries: int = 3, max_retry_after: float = 60, idle_chat_seconds: float = 600):
+        """
+        :param bot: Бот, через которого идут вызовы
+        :param global_rate: Вызовов в секунду на весь бот (0 - без ограничения)
+        :param chat_rate: Вызовов в секунду в один чат (0 - без ограничения)
+        :param chat_burst: Допустимый всплеск вызовов в один чат
+        :param max_retries: Сколько раз повторять вызов после RetryAfter
+        :param max_retry_after: Дольше этого после RetryAfter не ждем - ошибка передается вызывающему, с
+        :param idle_chat_seconds: Через сколько секунд без вызовов ведро чата удаляется
+        """
+        self.bot = bot
+        self.global_bucket = TokenBucket(global_rate, max(global_rate, 1))
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.idle_chat_seconds = idle_chat_seconds
+        self._chat_buckets = {}  # chat_id -> (TokenBucket, время последнего вызова)
+
+        # Метрики
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.retry_after_seconds = 0.0
+        self.waiting = 0  # Вызовы, ожидающие токен
+        self._latencies = deque(maxlen=1000)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        now = time.monotonic()
+        entry = self._chat_buckets.get(chat_id)
+        if entry is None:
+            if len(self._chat_buckets) >= 1000:
+                self._prune(now)
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+        else:
+            bucket = entry[0]
+        self._chat_buckets[chat_id] = (bucket, now)
+        return bucket
+
+    def _prune(self, now: float):
+        idle = [chat_id for chat_id, (bucket, used) in self._chat_buckets.items()
+                if now - used > self.idle_chat_seconds and not bucket.locked()]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    async def call(self, chat_id: int, method: str, retries: int = None, **kwargs):
+        """
+        Вызывает метод бота (send_message, edit_message_text, ...) с соблюдением лимитов
+
+        :param retries: Повторов после RetryAfter (None - max_retries, 0 - сразу передать ошибку)
+        :raises TelegramRetryAfter: Повторы исчерпаны или ждать дольше max_retry_after
+        """
+        retries = self.max_retries if retries is None else retries
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            self.waiting += 1
+            try:
+                await self._chat_bucket(chat_id).acquire()
+                await self.global_bucket.acquire()
+            finally:
+                self.waiting -= 1
+
+            try:
+                result = await getattr(self.bot, method)(chat_id=chat_id, **kwargs)
+            except TelegramRetryAfter as e:
+                if attempt >= retries or e.retry_after > self.max_retry_after:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retried += 1
+                self.retry_after_seconds += e.retry_after
+                logger.warning(f"Telegram: {method} в чат {chat_id} ограничен, повтор через {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                self.failed += 1
+                raise
+
+            self.sent += 1
+            self._latencies.append(time.perf_counter() - started)
+            return result
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        return await self.call(chat_id, "send_message", text=text, **kwargs)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs):
+        return await self.call(chat_id, "edit_message_text", message_id=message_id, text=text, **kwargs)
+
+    async def fan_out(self, chat_ids, text: str, **kwargs) -> dict:
+        """Параллельно отправляет сообщение в несколько чатов; {chat_id: Message или исключение}"""
+        chat_ids = list(chat_ids)
+        results = await asyncio.gather(*(self.send_message(chat_id, text, **kwargs) for chat_id in chat_ids),
+                                       return_exceptions=True)
+        return dict(zip(chat_ids, results))
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "retry_after_seconds_total": round(self.retry_after_seconds, 3),
+            "queue_depth": self.waiting,
+            "chats": len(self._chat_buckets),
+            "latency_p50": round(latencies[len(latencies) // 2], 4) if latencies else 0.0,
+            "latency_p95": round(latencies[int(len(latencies) * 0.95)], 4) if latencies else 0.0,
+            "global_throttled": self.global_bucket.throttled,
+        }
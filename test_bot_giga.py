@@ -5,7 +5,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from gigachat_client import GigaChatClient
-from config import GIGACHAT_AUTH_KEY, GIGACHAT_SCOPE
+from config import GIGACHAT_AUTH_KEY, GIGACHAT_SCOPE, GIGACHAT_BASE_URL
 
 
 async def test_bot_integration():
@@ -15,7 +15,8 @@ async def test_bot_integration():
 
     client = GigaChatClient(
         auth_key=GIGACHAT_AUTH_KEY,
-        scope=GIGACHAT_SCOPE
+        scope=GIGACHAT_SCOPE,
+        base_url=GIGACHAT_BASE_URL
     )
 
     # Тестовые вопросы
@@ -41,6 +42,8 @@ async def test_bot_integration():
         except Exception as e:
             print(f"Ошибка: {e}")
 
+    await client.close()
+
 
 if __name__ == "__main__":
     asyncio.run(test_bot_integration())
\ No newline at end of file
@@ -5,18 +5,16 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from gigachat_client import GigaChatClient
+from config import GIGACHAT_AUTH_KEY, GIGACHAT_SCOPE, GIGACHAT_BASE_URL
 
 
 async def test_gigachat():
-    # Ваш ключ авторизации
-    AUTH_KEY = "MDE5YjFkNDgtNWI4Mi03NTkyLTk5MDMtOGU5N2VmYjU4YjA3OjMyMDVjNTUyLWI1NWEtNDQzNi1iODQxLWQyZjhjZGE1NWVkNA=="
-    SCOPE = "GIGACHAT_API_PERS"
-
     print("=" * 50)
     print("Тестирование GigaChat API")
     print("=" * 50)
 
-    client = GigaChatClient(auth_key=AUTH_KEY, scope=SCOPE)
+    # Ключ берется из .env; с GIGACHAT_BASE_URL запросы идут в локальную заглушку (gigachat_stub.py)
+    client = GigaChatClient(auth_key=GIGACHAT_AUTH_KEY, scope=GIGACHAT_SCOPE, base_url=GIGACHAT_BASE_URL)
 
     # Тестовые вопросы
     test_questions = [
@@ -35,6 +33,8 @@ async def test_gigachat():
         except Exception as e:
             print(f"Ошибка: {e}")
 
+    await client.close()
+
 
 if __name__ == "__main__":
     asyncio.run(test_gigachat())
\ No newline at end of file
@@ -0,0 +1,137 @@
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasickMatcher:
+    """Многошаблонный поиск подстрок (Ахо-Корасик): все словари за один проход по тексту"""
+
+    def __init__(self, vocabularies: dict):
+        """
+        Компилирует словари в автомат
+
+        :param vocabularies: Словарь {категория: список шаблонов}
+        """
+        self.categories = tuple(vocabularies)
+
+        # Бор: переходы, ссылки-неудачи и выходы (шаблон, категории) для каждого состояния
+        goto = [{}]
+        outputs = [[]]
+        pattern_categories = {}
+
+        for category, patterns in vocabularies.items():
+            for pattern in patterns:
+                if not pattern:
+                    continue
+                pattern_categories.setdefault(pattern, set()).add(category)
+
+        for pattern in pattern_categories:
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append([])
+                state = nxt
+            outputs[state].append((pattern, tuple(sorted(pattern_categories[pattern]))))
+
+        # Детерминированные переходы: храним только те, что отличаются от переходов корня,
+        # остальные при поиске берутся из корня
+        root = goto[0]
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = {}
+
+        queue = deque(root.values())
+
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                fail_state = fail[state]
+                while fail_state and ch not in goto[fail_state]:
+                    fail_state = fail[fail_state]
+                fail[nxt] = goto[fail_state].get(ch, 0)
+                outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+            # Переходы ссылки-неудачи уже посчитаны (BFS), наследуем их и дополняем своими
+            transitions = dict(delta[fail[state]])
+            transitions.update(goto[state])
+            delta[state] = {ch: nxt for ch, nxt in transitions.items() if root.get(ch) != nxt}
+
+        self._root = root
+        self._delta = delta
+        self._outputs = [tuple(out) for out in outputs]
+        self.size = len(goto)
+
+        logger.debug(f"Автомат построен: {len(pattern_categories)} шаблонов, {self.size} состояний")
+
+    def iter_matches(self, text: str):
+        """Выдаёт все вхождения: (позиция начала, шаблон, категории)"""
+        root_get = self._root.get
+        delta = self._delta
+        outputs = self._outputs
+        state = 0
+
+        for i, ch in enumerate(text):
+            nxt = delta[state].get(ch)
+            state = nxt if nxt is not None else root_get(ch, 0)
+            out = outputs[state]
+            if out:
+                for pattern, categories in out:
+                    yield i - len(pattern) + 1, pattern, categories
+
+    def find(self, text: str) -> dict:
+        """Возвращает найденные шаблоны по категориям: {категория: set(шаблонов)}"""
+        root_get = self._root.get
+        delta = self._delta
+        outputs = self._outputs
+        hits = {category: set() for category in self.categories}
+        seen = set()
+        state = 0
+
+        for ch in text:
+            nxt = delta[state].get(ch)
+            state = nxt if nxt is not None else root_get(ch, 0)
+            if outputs[state] and state not in seen:
+                seen.add(state)
+                for pattern, categories in outputs[state]:
+                    for category in categories:
+                        hits[category].add(pattern)
+
+        return hits
+
+
+class PhraseTrie:
+    """Префиксное дерево фраз по словам: поиск самой длинной фразы, начинающейся с данного слова"""
+
+    _END = object()
+
+    def __init__(self, phrases):
+        """
+        :param phrases: Фразы (слова разделены пробелами), сравниваются в нижнем регистре
+        """
+        self._root = {}
+        for phrase in phrases:
+            tokens = phrase.lower().split()
+            if not tokens:
+                continue
+            node = self._root
+            for token in tokens:
+                node = node.setdefault(token, {})
+            node[self._END] = True
+
+    def match(self, tokens: list, start: int = 0) -> int:
+        """Возвращает число слов самой длинной фразы, начинающейся с tokens[start] (0 - нет совпадения)"""
+        node = self._root
+        longest = 0
+        for i in range(start, len(tokens)):
+            node = node.get(tokens[i])
+            if node is None:
+                break
+            if self._END in node:
+                longest = i - start + 1
+        return longest
@@ -0,0 +1,144 @@
+import logging
+import re
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Слово: буквы/цифры, допускается "+" в конце (VMG+)
+_TOKEN_RE = re.compile(r'[^\W_]+\+?')
+
+
+class RussianStemmer:
+    """Легкий стеммер: отрезает одно самое длинное окончание, оставляя основу не короче min_stem"""
+
+    REFLEXIVE = ('ся', 'сь')
+
+    SUFFIXES = (
+        # Прилагательные и причастия
+        'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+        'ый', 'ий', 'ой', 'ей', 'ую', 'юю', 'ым', 'им', 'ых', 'их',
+        # Существительные
+        'иями', 'ями', 'ами', 'ием', 'ией', 'иях', 'ах', 'ях', 'ов', 'ев', 'ам', 'ям',
+        'ом', 'ем', 'ия', 'ию', 'ии', 'ь', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю',
+        # Глаголы
+        'ить', 'ать', 'ять', 'еть', 'уть', 'ешь', 'ишь', 'ете', 'ите', 'ет', 'ит',
+        'ют', 'ут', 'ят', 'ат', 'ил', 'ила', 'ило', 'или', 'ал', 'ала', 'али', 'ть',
+    )
+
+    def __init__(self, min_stem: int = 3, cache_size: int = 50000):
+        self.min_stem = min_stem
+        # Окончания по длине, от длинных к коротким: одна проверка по множеству на длину
+        lengths = sorted({len(suffix) for suffix in self.SUFFIXES}, reverse=True)
+        self._suffixes_by_length = [
+            (length, frozenset(suffix for suffix in self.SUFFIXES if len(suffix) == length))
+            for length in lengths
+        ]
+        self.stem = lru_cache(maxsize=cache_size)(self._stem)
+
+    def _stem(self, word: str) -> str:
+        word = word.lower().replace('ё', 'е')
+        min_stem = self.min_stem
+
+        for ending in self.REFLEXIVE:
+            if word.endswith(ending) and len(word) - len(ending) >= min_stem:
+                word = word[:-len(ending)]
+                break
+
+        for length, suffixes in self._suffixes_by_length:
+            if len(word) - length >= min_stem and word[-length:] in suffixes:
+                return word[:-length]
+        return word
+
+
+def tokenize(text: str) -> list:
+    """Разбивает текст на слова в нижнем регистре (ё -> е)"""
+    return _TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+class TokenIndexClassifier:
+    """
+    Поиск словарных шаблонов по словам, а не по подстрокам
+
+    Каждое слово текста стеммируется один раз. Короткие основы (< prefix_min символов)
+    должны совпасть с основой слова целиком, длинные - быть началом слова.
+    Так 'эм', 'мл', 'доз', 'прав' больше не срабатывают внутри посторонних слов.
+    Результат find() совпадает по форме с AhoCorasickMatcher.find().
+    """
+
+    def __init__(self, vocabularies: dict, prefix_min: int = 5, stemmer: RussianStemmer = None):
+        """
+        :param vocabularies: Словарь {категория: список шаблонов}
+        :param prefix_min: Минимальная длина основы для сопоставления по началу слова
+        :param stemmer: Стеммер (по умолчанию RussianStemmer)
+        """
+        self.categories = tuple(vocabularies)
+        self.prefix_min = prefix_min
+        self.stemmer = stemmer or RussianStemmer()
+
+        # Индексы по первому слову шаблона: основа -> [(шаблон, категории, остальные части)]
+        self._exact = {}
+        self._prefix = {}
+
+        pattern_categories = {}
+        for category, patterns in vocabularies.items():
+            for pattern in patterns:
+                if pattern.strip():
+                    pattern_categories.setdefault(pattern, set()).add(category)
+
+        for pattern, categories in pattern_categories.items():
+            parts = [self._part(token) for token in tokenize(pattern)]
+            if not parts:
+                continue
+            (is_prefix, key), rest = parts[0], tuple(parts[1:])
+            index = self._prefix if is_prefix else self._exact
+            index.setdefault(key, []).append((pattern, tuple(sorted(categories)), rest))
+
+        # Длинные основы группируем по первым prefix_min символам: одна проверка по словарю на слово
+        self._prefix_heads = {}
+        for key, entries in self._prefix.items():
+            self._prefix_heads.setdefault(key[:prefix_min], []).append((key, entries))
+
+        logger.debug(f"Индекс слов построен: {len(self._exact)} точных, {len(self._prefix)} префиксных основ")
+
+    def _part(self, token: str) -> tuple:
+        """Часть шаблона: (по началу слова?, основа)"""
+        stem = self.stemmer.stem(token)
+        return len(stem) >= self.prefix_min, stem
+
+    def _matches(self, part: tuple, token: str, stem: str) -> bool:
+        is_prefix, key = part
+        return token.startswith(key) if is_prefix else stem == key
+
+    def find(self, text: str) -> dict:
+        """Возвращает найденные шаблоны по категориям: {категория: set(шаблонов)}"""
+        hits = {category: set() for category in self.categories}
+        tokens = tokenize(text)
+        stem = self.stemmer.stem
+        stems = [stem(token) for token in tokens]
+        exact = self._exact
+        prefix_heads = self._prefix_heads
+        prefix_min = self.prefix_min
+
+        for i, token in enumerate(tokens):
+            candidates = exact.get(stems[i])
+            if candidates:
+                self._collect(hits, candidates, i, tokens, stems)
+            heads = prefix_heads.get(token[:prefix_min])
+            if heads:
+                for key, candidates in heads:
+                    if token.startswith(key):
+                        self._collect(hits, candidates, i, tokens, stems)
+
+        return hits
+
+    def _collect(self, hits: dict, candidates: list, i: int, tokens: list, stems: list):
+        """Добавляет шаблоны, начинающиеся со слова i (многословные - если совпали и следующие слова)"""
+        for pattern, categories, rest in candidates:
+            if rest:
+                end = i + 1 + len(rest)
+                if end > len(tokens) or not all(
+                        self._matches(part, tokens[j], stems[j])
+                        for part, j in zip(rest, range(i + 1, end))):
+                    continue
+            for category in categories:
+                hits[category].add(pattern)
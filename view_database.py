@@ -1,4 +1,4 @@
-from database import session, UserRequest, DraftAnswer
+from database import session, UserRequest, DraftAnswer, GenerationJob, get_active_draft
 from datetime import datetime
 
 def view_all_data():
@@ -19,9 +19,14 @@ def view_all_data():
         print(f"   📊 Статус: {r.status}")
         print(f"   🕒 Время: {r.timestamp}")
         print(f"   ❓ Вопрос: {r.question}")
+        if r.model:
+            print(f"   🧠 Модель: {r.model}, max_tokens {r.max_tokens} ({r.route_reason})")
+        if r.prompt_tokens_saved is not None:
+            print(f"   🔑 Ключевые слова: {r.keywords or '-'}")
+            print(f"   📝 Разделы промпта: {r.prompt_sections or '-'} (сэкономлено ~{r.prompt_tokens_saved} токенов)")
 
         # Находим соответствующий черновик
-        draft = session.query(DraftAnswer).filter_by(request_id=r.id).first()
+        draft = get_active_draft(r.id)
         if draft:
             print(f"   🤖 Ответ ИИ: {draft.llm_response[:100]}...")
             if draft.expert_edited_response:
@@ -51,6 +56,11 @@ def view_statistics():
     print(f"✅ Одобрены: {approved}")
     print(f"❌ Отклонены: {rejected}")
 
+    # Очередь генерации черновиков
+    queued = session.query(GenerationJob).filter(GenerationJob.status.in_(('queued', 'running'))).count()
+    failed = session.query(GenerationJob).filter_by(status='failed').count()
+    print(f"🔄 В очереди генерации: {queued}, не удалось сгенерировать: {failed}")
+
     # Самый старый незавершенный запрос
     oldest_waiting = session.query(UserRequest).filter_by(status='waiting').order_by(UserRequest.timestamp).first()
     if oldest_waiting:
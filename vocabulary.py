@@ -0,0 +1,174 @@
+"""Словари классификатора вопросов: загрузка из файла и сборка неизменяемого снимка"""
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from collections import Counter
+
+from text_matcher import AhoCorasickMatcher, PhraseTrie
+from token_classifier import TokenIndexClassifier
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOCABULARY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocabulary.json")
+
+# Списки, которые должны быть в файле словарей
+LIST_KEYS = (
+    "greetings", "addresses", "medical_patterns", "trigger_patterns", "medical_procedures",
+    "context_phrases", "non_medical", "thanks_phrases", "special_cases", "strong_indicators",
+)
+
+
+class VocabularyError(ValueError):
+    """Файл словарей не прочитан или содержит ошибку"""
+
+
+def _flatten(name: str, value) -> tuple:
+    """Список шаблонов или {раздел: список} -> кортеж шаблонов в порядке файла (повторы сохраняются)"""
+    sections = value.values() if isinstance(value, dict) else [value]
+    patterns = []
+    for section in sections:
+        if not isinstance(section, list) or not all(isinstance(item, str) for item in section):
+            raise VocabularyError(f"'{name}': ожидается список строк")
+        patterns.extend(section)
+    return tuple(patterns)
+
+
+def read_vocabulary(path: str) -> tuple:
+    """
+    Читает и проверяет файл словарей
+
+    :return: (словари {имя: кортеж шаблонов}, отпечаток содержимого sha1)
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw.decode("utf-8"))
+    except (OSError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise VocabularyError(f"Не удалось прочитать {path}: {e}") from e
+
+    if not isinstance(data, dict):
+        raise VocabularyError("Файл словарей должен содержать объект")
+
+    missing = [key for key in LIST_KEYS + ("special_combinations",) if key not in data]
+    if missing:
+        raise VocabularyError(f"В файле словарей нет разделов: {', '.join(missing)}")
+
+    vocabulary = {key: _flatten(key, data[key]) for key in LIST_KEYS}
+
+    combinations = []
+    for item in data["special_combinations"]:
+        try:
+            keywords = _flatten("special_combinations", item["keywords"])
+            combinations.append((keywords, int(item["threshold"]), str(item["description"])))
+        except (KeyError, TypeError, ValueError) as e:
+            raise VocabularyError(f"Неверная специальная комбинация {item!r}: {e}") from e
+    vocabulary["special_combinations"] = tuple(combinations)
+
+    return vocabulary, hashlib.sha1(raw).hexdigest()
+
+
+class VocabularySnapshot:
+    """
+    Скомпилированные словари одной версии
+
+    После сборки не изменяется: обработчик читает ссылку на снимок один раз за вызов,
+    а новая версия подменяет её целиком, поэтому читателям не нужны блокировки.
+    """
+
+    def __init__(self, vocabulary: dict, engine: str, version: int = 0, fingerprint: str = "",
+                 path: str = None):
+        """
+        :param vocabulary: Словари из read_vocabulary()
+        :param engine: Движок поиска шаблонов: substring или token
+        :param version: Номер версии (растет при каждой подмене)
+        :param fingerprint: Отпечаток файла, из которого собраны словари
+        :param path: Путь к файлу словарей
+        """
+        started = time.perf_counter()
+
+        self.engine = engine
+        self.version = version
+        self.fingerprint = fingerprint
+        self.path = path
+        self.vocabulary = vocabulary
+
+        self.greetings = vocabulary["greetings"]
+        self.addresses = vocabulary["addresses"]
+        self.medical_patterns = vocabulary["medical_patterns"]
+        self.trigger_patterns = vocabulary["trigger_patterns"]
+        self.medical_procedures = vocabulary["medical_procedures"]
+        self.context_phrases = vocabulary["context_phrases"]
+        self.non_medical = vocabulary["non_medical"]
+        self.thanks_phrases = vocabulary["thanks_phrases"]
+        self.special_combinations = vocabulary["special_combinations"]
+        self.special_cases = vocabulary["special_cases"]
+        self.strong_indicators = vocabulary["strong_indicators"]
+
+        self._compile_greetings()
+        self._compile_matcher()
+        self._compile_triggers()
+
+        self.build_seconds = time.perf_counter() - started
+
+    def _compile_greetings(self):
+        """Деревья фраз приветствий и обращений (многословные фразы - 'добрый день')"""
+        self.greeting_trie = PhraseTrie(self.greetings)
+        self.address_trie = PhraseTrie(self.addresses)
+        self.single_greetings = frozenset(g for g in self.greetings if ' ' not in g)
+        self.greeting_starts = frozenset(g.split()[0] for g in self.greetings if g.strip())
+        self.address_starts = frozenset(a.split()[0] for a in self.addresses if a.strip())
+
+    def vocabularies(self) -> dict:
+        """Все словари, которые ищутся одним проходом: {категория: список шаблонов}"""
+        return {
+            'medical': self.medical_patterns,
+            'procedure': self.medical_procedures,
+            'context': self.context_phrases,
+            'non_medical': self.non_medical,
+            'thanks': self.thanks_phrases,
+            'combination': [kw for keywords, _, _ in self.special_combinations for kw in keywords],
+            'strong': self.strong_indicators,
+        }
+
+    def _compile_matcher(self):
+        """Все словари в одном автомате Ахо-Корасик или индексе по словам"""
+        if self.engine == "token":
+            self.matcher = TokenIndexClassifier(self.vocabularies())
+        else:
+            self.matcher = AhoCorasickMatcher(self.vocabularies())
+        # Некоторые паттерны повторяются в списке - каждый повтор добавляет к оценке
+        self.medical_weights = Counter(self.medical_patterns)
+
+    def _compile_triggers(self):
+        """
+        Триггеры и специальные случаи в одном регулярном выражении с именованными группами
+
+        Объединенное выражение - только быстрый отсев текстов без триггеров; сами паттерны проверяются
+        по отдельности (trigger_compiled), чтобы перекрывающиеся совпадения не терялись.
+        """
+        self.trigger_groups = {}
+        self.trigger_compiled = {}
+        alternatives = []
+        for kind, patterns in (('trigger', self.trigger_patterns), ('special', self.special_cases)):
+            for i, pattern in enumerate(patterns):
+                group = f"{kind}_{i}"
+                try:
+                    self.trigger_compiled[group] = re.compile(pattern)
+                except re.error as e:
+                    raise VocabularyError(f"Неверное регулярное выражение '{pattern}': {e}") from e
+                self.trigger_groups[group] = (kind, pattern)
+                # Пустая группа-метка в конце: альтернатива начинается с литерала
+                # (быстрый отсев в sre), а lastgroup указывает, какой паттерн сработал
+                alternatives.append(f"(?:{pattern})(?P<{group}>)")
+        self.trigger_regex = re.compile('|'.join(alternatives))
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "build_seconds": round(self.build_seconds, 6),
+            "medical_patterns": len(self.medical_patterns),
+            "trigger_patterns": len(self.trigger_patterns),
+        }
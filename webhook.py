@@ -0,0 +1,170 @@
+"""Прием обновлений Telegram через вебхук: aiohttp-сервер, проверка секрета и очередь обработки"""
+import asyncio
+import logging
+import re
+import secrets
+import time
+from collections import deque
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик вебхука с ограниченной очередью обновлений
+
+    Запрос Telegram проверяется по секретному заголовку, обновление кладется в очередь,
+    и сразу возвращается 200 - обработка идет в фоновых воркерах. Если очередь заполнена,
+    возвращается 503: Telegram повторит доставку позже, а память бота не растет без предела.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str = None,
+                 queue_size: int = 1000, workers: int = 8, **data):
+        """
+        :param dispatcher: Диспетчер aiogram
+        :param bot: Бот, от имени которого обрабатываются обновления
+        :param secret_token: Ожидаемый заголовок X-Telegram-Bot-Api-Secret-Token (None - без проверки)
+        :param queue_size: Максимум обновлений, ожидающих обработки
+        :param workers: Число воркеров, передающих обновления диспетчеру
+        """
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.workers = workers
+        self._workers = []
+
+        # Метрики
+        self.received = 0
+        self.rejected = 0  # Неверный секрет или тело запроса
+        self.dropped = 0   # Очередь заполнена - 503
+        self.processed = 0
+        self.failed = 0
+        self._waits = deque(maxlen=1000)  # Время от приема до начала обработки, с
+
+    def register(self, app: web.Application, /, path: str, **kwargs):
+        app.on_startup.append(self._handle_start)
+        super().register(app, path, **kwargs)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            self.rejected += 1
+            return web.Response(body="Unauthorized", status=401)
+        return await self._handle_request_background(bot=self.bot, request=request)
+
+    __call__ = handle
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        try:
+            update = await request.json(loads=bot.session.json_loads)
+        except ValueError:
+            self.rejected += 1
+            return web.Response(body="Bad Request", status=400)
+
+        try:
+            self.queue.put_nowait((time.perf_counter(), update))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Очередь вебхука заполнена ({self.queue.maxsize}), обновление отклонено")
+            return web.Response(body="Busy", status=503)
+
+        self.received += 1
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def _worker(self):
+        while True:
+            received_at, update = await self.queue.get()
+            self._waits.append(time.perf_counter() - received_at)
+            try:
+                await self._background_feed_update(bot=self.bot, update=update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e!r}")
+            finally:
+                self.queue.task_done()
+
+    async def _handle_start(self, app: web.Application):
+        await self.start()
+
+    async def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, drain_timeout: float = 10.0):
+        """Дорабатывает принятые обновления (не дольше drain_timeout), останавливает воркеров и закрывает бота"""
+        if self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не обработано обновлений вебхука при остановке: {self.queue.qsize()}")
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+        await super().close()
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            "received": self.received,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "failed": self.failed,
+            "queue_depth": self.queue.qsize(),
+            "queue_wait_p95": round(waits[int(len(waits) * 0.95)], 4) if waits else 0.0,
+        }
+
+
+async def run_webhook(dispatcher: Dispatcher, bot: Bot, handler: QueuedRequestHandler, url: str,
+                      path: str = "/webhook", host: str = "0.0.0.0", port: int = 8080):
+    """
+    Регистрирует вебхук в Telegram и обслуживает его до отмены
+
+    :param url: Публичный адрес бота (https://...), к нему добавляется path
+    """
+    app = web.Application()
+    handler.register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Вебхук слушает {host}:{port}{path}")
+
+    try:
+        await bot.set_webhook(
+            url.rstrip("/") + path,
+            secret_token=handler.secret_token,
+            allowed_updates=dispatcher.resolve_used_update_types()
+        )
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+def check_webhook_settings(url: str, secret_token: str):
+    """
+    Проверяет настройки вебхука до запуска
+
+    Секрет должен быть общим для всех процессов бота: каждый из них регистрирует вебхук,
+    и случайный секрет последнего запущенного процесса заставил бы остальные отвечать 401.
+
+    :raises ValueError: Не задан адрес или секрет, либо в секрете недопустимые символы
+    """
+    if not url:
+        raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_URL - публичный https-адрес бота")
+    if not secret_token:
+        raise ValueError("Для BOT_MODE=webhook нужен WEBHOOK_SECRET, общий для всех процессов бота "
+                         "(сгенерировать: python -c \"import webhook; print(webhook.new_secret_token())\")")
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", secret_token):
+        raise ValueError("WEBHOOK_SECRET: от 1 до 256 символов A-Z, a-z, 0-9, _ и -")
+
+
+def new_secret_token() -> str:
+    """Случайный секрет вебхука (Telegram допускает A-Z, a-z, 0-9, _ и -)"""
+    return secrets.token_urlsafe(32)